@@ -23,144 +23,357 @@
 #    SOFTWARE.
 
 
-from pathlib import Path
+
+import argparse
+import sys
 import yaml
-import torch
-from input import DataSplit, InputData
-from embedding import EmbeddingCalculation
-from net import RNNCalculation
-from evaluation import Terminal
 
-# check if twitter module is available
-try:
-    from tweet_retriever import TweetRetriever
-    can_use_live_tweets = True
-except ImportError:
-    can_use_live_tweets = False
+# every command imports only the modules it needs inside its function,
+# e.g. classify imports neither the training code nor the twitter client
 
 
-def main():
-    
-    ##############
-    # PARAMETERS #
-    ##############
-    
-    # USER PARAMETER
-    # (only set this and the parameters in the corresponding YAML settings file;
-    # True for SystemParametersCluster.yaml, False for SystemParameters.yaml)
-    use_cluster_params = False
-    
-    
-    ###########################################################################
+COMMANDS = ['run', 'split', 'preprocess', 'train-embed', 'train-rnn', 'train-ngram', 'eval', 'compare', 'export', 'classify', 'classify-bulk', 'serve', 'daemon', 'terminal']
+
+
+def load_system_param_dict(config_rel_path, overrides):
+    """
+    Reads the YAML settings file and applies the command line overrides.
     
-    # automatically determined parameters
-    if(use_cluster_params):
-        yaml_file = 'SystemParametersCluster.yaml'
-    else:
-        yaml_file = 'SystemParameters.yaml'
-    with open(yaml_file, 'r') as stream:
+    Args:
+        config_rel_path: Relative path of the YAML settings file.
+        overrides: List of 'key=value' strings; the values are parsed as YAML (e.g. 'null', 'True', '[de, en]').
+
+    Returns:
+        system_param_dict: The system parameters, or None if an override is invalid.
+    """
+    with open(config_rel_path, 'r') as stream:
         system_param_dict = yaml.load(stream)
-        
-    system_param_dict['can_use_live_tweets'] = can_use_live_tweets
-    if (system_param_dict['can_use_live_tweets']):
-        print('!!! TERMINAL LIVE TWEETS ON !!!')
-    else:
-        print('!!! TERMINAL LIVE TWEETS OFF !!!')
+    for override in overrides:
+        key, separator, value = override.partition('=')
+        if (not separator):
+            print('ERROR: Override "%s" is not of the form key=value.' % override, file=sys.stderr)
+            return None
+        if (key not in system_param_dict):
+            print('ERROR: Unknown parameter "%s" in %s.' % (key, config_rel_path), file=sys.stderr)
+            return None
+        system_param_dict[key] = yaml.safe_load(value)
+    return system_param_dict
+
+
+def set_cuda_is_avail(system_param_dict):
+    """
+    Determines whether CUDA is used (only needed by the commands that import torch).
+    The status is printed to stderr, so it does not mix with results written to stdout.
+    """
+    import torch
     system_param_dict['cuda_is_avail'] = torch.cuda.is_available()
     if (system_param_dict['cuda_is_avail']):
-        print('!!! CUDA ON !!!')
+        print('!!! CUDA ON !!!', file=sys.stderr)
     else:
-        print('!!! CUDA OFF !!!')
-        
-    ############
-    # TERMINAL #
-    ############    
+        print('!!! CUDA OFF !!!', file=sys.stderr)
+
+
+def split_data(system_param_dict, force):
+    """
+    Splits the original file into training, validation and test set files.
     
+    Args:
+        system_param_dict: contains system parameters
+        force: If False, only splits if one of the files does not exist yet.
+    """
+    from pathlib import Path
+    from input import DataSplit
+    out_filenames = [system_param_dict['out_tr_data_rel_path'], system_param_dict['out_va_data_rel_path'], system_param_dict['out_te_data_rel_path']] #same size as ratios
+    files_exist = all([Path(out_filename).is_file() for out_filename in out_filenames])
+    if (force or not files_exist):
+        data_splitter = DataSplit.DataSplit()
+        data_splitter.split_percent_of_languages(input_file=system_param_dict['input_tr_va_te_data_rel_path'],
+                                                 ratio=system_param_dict['tr_va_te_split_ratios'],
+                                                 out_filenames=out_filenames,
+                                                 shuffle_seed=system_param_dict['split_shuffle_seed'])
+
+
+def get_indexed_data(system_param_dict):
+    """
+    Retrieves, preprocesses and transforms the data for readily use for embedding and RNN (splits the original
+    file first if the set files do not exist yet).
+    
+    Returns:
+        train_set_indexed, val_set_indexed, test_set_indexed, real_test_set_indexed, vocab_chars, vocab_lang
+    """
+    import random
+    from input import InputData
+    split_data(system_param_dict, force=False)
+    # a fixed seed makes the data order reproducible, which is needed to resume an interrupted training
+    if (system_param_dict['data_shuffle_seed'] != None):
+        random.seed(system_param_dict['data_shuffle_seed'])
+    input_data = InputData.InputData()
+    return input_data.get_indexed_data(
+        train_data_rel_path=system_param_dict['out_tr_data_rel_path'],
+        validation_data_rel_path=system_param_dict['out_va_data_rel_path'],
+        test_data_rel_path=system_param_dict['out_te_data_rel_path'],
+        real_test_data_rel_path=system_param_dict['input_rt_data_rel_path'],
+        min_char_frequency=system_param_dict['min_char_frequency'],
+        fetch_only_langs=system_param_dict['fetch_only_langs'],
+        fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets'])
+
+
+def run_split(system_param_dict, args):
+    split_data(system_param_dict, force=True)
+
+
+def run_preprocess(system_param_dict, args):
+    train_set_indexed, val_set_indexed, test_set_indexed, real_test_set_indexed, vocab_chars, vocab_lang = get_indexed_data(system_param_dict)
+    print('Tweets (training/validation/test/real test):', len(train_set_indexed), len(val_set_indexed), len(test_set_indexed), len(real_test_set_indexed))
+    print('Characters:', len(vocab_chars), 'Languages:', len(vocab_lang))
+
+
+def run_train_embed(system_param_dict, args):
+    from embedding import EmbeddingCalculation
+    set_cuda_is_avail(system_param_dict)
+    train_set_indexed, val_set_indexed, _, _, vocab_chars, vocab_lang = get_indexed_data(system_param_dict)
+    # the loss-based best embedding model checkpoint and its weights are saved to file
+    embedding_calculation = EmbeddingCalculation.EmbeddingCalculation()
+    embedding_calculation.train_embed(train_set_indexed=train_set_indexed,
+                                      val_set_indexed=val_set_indexed,
+                                      vocab_chars=vocab_chars,
+                                      vocab_lang=vocab_lang,
+                                      system_param_dict=system_param_dict)
+
+
+def run_train_rnn(system_param_dict, args):
+    from net import RNNCalculation
+    set_cuda_is_avail(system_param_dict)
+    train_set_indexed, val_set_indexed, _, _, vocab_chars, vocab_lang = get_indexed_data(system_param_dict)
+    # the loss-based best model checkpoint is saved to file
+    rnn_calculation = RNNCalculation.RNNCalculation(system_param_dict)
+    rnn_calculation.train_rnn(data_sets=[train_set_indexed, val_set_indexed],
+                              vocab_chars=vocab_chars,
+                              vocab_lang=vocab_lang)
+
+
+def run_train_ngram(system_param_dict, args):
+    from net import NgramClassifier
+    train_set_indexed, val_set_indexed, _, _, vocab_chars, vocab_lang = get_indexed_data(system_param_dict)
+    # stored alongside the RNN model checkpoint, which is trained on the same indexed data
+    ngram_classifier = NgramClassifier.NgramClassifier(vocab_chars, vocab_lang, system_param_dict)
+    ngram_classifier.train(train_set_indexed)
+    print('N-gram classifier validation accuracy: %.4f' % ngram_classifier.evaluate(val_set_indexed))
+    ngram_classifier.save(NgramClassifier.NgramClassifier.rel_path_for(system_param_dict['rnn_model_checkpoint_rel_path']))
+
+
+def run_eval(system_param_dict, args):
+    from net import RNNCalculation
+    set_cuda_is_avail(system_param_dict)
+    rnn_calculation = RNNCalculation.RNNCalculation(system_param_dict)
+    # the streamed evaluation reads the test set with the vocabularies of the checkpoint
+    if (system_param_dict['stream_test_set_rnn']):
+        rnn_calculation.test_rnn(data_sets=None, vocab_chars=None, vocab_lang=None)
+        return
+    _, _, test_set_indexed, _, vocab_chars, vocab_lang = get_indexed_data(system_param_dict)
+    rnn_calculation.test_rnn(data_sets=[test_set_indexed],
+                             vocab_chars=vocab_chars,
+                             vocab_lang=vocab_lang)
+
+
+def run_compare(system_param_dict, args):
+    from evaluation import CheckpointComparison
+    set_cuda_is_avail(system_param_dict)
+    checkpoint_comparison = CheckpointComparison.CheckpointComparison(system_param_dict)
+    checkpoint_comparison.compare(system_param_dict['compare_rnn_checkpoints'])
+
+
+def run_export(system_param_dict, args):
+    from net import InferenceArtifact
+    from evaluation import LanguageIdentifier
+    set_cuda_is_avail(system_param_dict)
+    # the artifact always stores the unmodified float32 model
+    export_param_dict = dict(system_param_dict)
+    export_param_dict['inference_precision'] = 'float32'
+    language_identifier = LanguageIdentifier.LanguageIdentifier(export_param_dict)
+    inference_artifact = InferenceArtifact.InferenceArtifact()
+    inference_artifact.export(language_identifier,
+                              system_param_dict['export_inference_artifact_rel_path'],
+                              system_param_dict['inference_artifact_weights_dtype'])
+
+
+def run_classify(system_param_dict, args):
+    from evaluation import LanguageIdentifier
+    set_cuda_is_avail(system_param_dict)
+    texts = args.texts
+    if (not texts):
+        texts = [line.rstrip('\n') for line in sys.stdin]
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    lang_predictions = language_identifier.classify(texts, args.top)
+    for text, text_predictions in zip(texts, lang_predictions):
+        print('\t'.join(['%s %.4f' % (lang, prob) for lang, prob in text_predictions] + [text]))
+
+
+def run_classify_bulk(system_param_dict, args):
+    from evaluation import LanguageIdentifier, BulkClassifier
+    set_cuda_is_avail(system_param_dict)
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    bulk_classifier = BulkClassifier.BulkClassifier(system_param_dict, language_identifier)
+    num_records = bulk_classifier.classify_to_file(input_rel_paths=args.inputs,
+                                                   output_rel_path=args.output,
+                                                   input_format=args.input_format,
+                                                   output_format=args.format,
+                                                   n_highest_probs=args.top,
+                                                   resume=not args.restart)
+    if (num_records is None):
+        return 1
+    # stdout may carry the results (--output -)
+    print('Classified records:', num_records, file=sys.stderr)
+    if (language_identifier.prediction_cache is not None):
+        print('Prediction cache:', language_identifier.prediction_cache.stats(), file=sys.stderr)
+    return 0
+
+
+def run_serve(system_param_dict, args):
+    from evaluation import LanguageIdentifier
+    from service import ClassificationServer
+    set_cuda_is_avail(system_param_dict)
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    classification_server = ClassificationServer.ClassificationServer(system_param_dict, language_identifier)
+    classification_server.start()
+    classification_server.serve_forever()
+
+
+def run_daemon(system_param_dict, args):
+    from service import ClassifierDaemon
+    set_cuda_is_avail(system_param_dict)
+    classifier_daemon = ClassifierDaemon.ClassifierDaemon(system_param_dict)
+    if (not classifier_daemon.serve_forever()):
+        return 1
+
+
+def run_terminal(system_param_dict, args):
+    from evaluation import Terminal
+    # check if twitter module is available
+    try:
+        from tweet_retriever import TweetRetriever
+        system_param_dict['can_use_live_tweets'] = True
+        print('!!! TERMINAL LIVE TWEETS ON !!!')
+    except ImportError:
+        system_param_dict['can_use_live_tweets'] = False
+        print('!!! TERMINAL LIVE TWEETS OFF !!!')
+    set_cuda_is_avail(system_param_dict)
     # terminal for interactive testing on arbitrary input text or live tweets
+    terminal = Terminal.Terminal(system_param_dict)
+    terminal.run_terminal(system_param_dict['can_use_live_tweets'])
+
+
+def run_all(system_param_dict, args):
+    """
+    Runs the procedure selected by the boolean flags of the YAML settings file (the behaviour without a command).
+    """
+    if (system_param_dict['export_inference_artifact_rel_path'] != None):
+        run_export(system_param_dict, args)
     if (system_param_dict['run_terminal']):
-        terminal = Terminal.Terminal(system_param_dict)
-        terminal.run_terminal(system_param_dict['can_use_live_tweets'])
-    else:
+        run_terminal(system_param_dict, args)
+        return
+    from net import RNNCalculation
+    set_cuda_is_avail(system_param_dict)
+    split_data(system_param_dict, force=system_param_dict['create_splitted_data_files'])
+    train_set_indexed, val_set_indexed, test_set_indexed, real_test_set_indexed, vocab_chars, vocab_lang = get_indexed_data(system_param_dict)
+    if (system_param_dict['train_embed']):
+        from embedding import EmbeddingCalculation
+        embedding_calculation = EmbeddingCalculation.EmbeddingCalculation()
+        embedding_calculation.train_embed(train_set_indexed=train_set_indexed,
+                                          val_set_indexed=val_set_indexed,
+                                          vocab_chars=vocab_chars,
+                                          vocab_lang=vocab_lang,
+                                          system_param_dict=system_param_dict)
+    rnn_calculation = RNNCalculation.RNNCalculation(system_param_dict)
+    if (system_param_dict['train_rnn']):
+        rnn_calculation.train_rnn(data_sets=[train_set_indexed, val_set_indexed],
+                                  vocab_chars=vocab_chars,
+                                  vocab_lang=vocab_lang)
+    if (system_param_dict['train_ngram']):
+        from net import NgramClassifier
+        ngram_classifier = NgramClassifier.NgramClassifier(vocab_chars, vocab_lang, system_param_dict)
+        ngram_classifier.train(train_set_indexed)
+        print('N-gram classifier validation accuracy: %.4f' % ngram_classifier.evaluate(val_set_indexed))
+        ngram_classifier.save(NgramClassifier.NgramClassifier.rel_path_for(system_param_dict['rnn_model_checkpoint_rel_path']))
+    if (system_param_dict['eval_test_set']):
+        rnn_calculation.test_rnn(data_sets=[test_set_indexed],
+                                 vocab_chars=vocab_chars,
+                                 vocab_lang=vocab_lang)
+    if (system_param_dict['compare_rnn_checkpoints'] != None):
+        run_compare(system_param_dict, args)
+    # print saved model checkpoint from file (RNN or embedding)
+    # note: some parameters in the YAML settings file have to be the same as in the checkpoint
+    # (e.g. input_tr_va_te_data_rel_path and hidden_size_rnn)
+    if (system_param_dict['print_model_checkpoint_embed_weights'] != None and system_param_dict['print_rnn_model_checkpoint'] != None):
+        rnn_calculation.print_model_checkpoint(vocab_chars=vocab_chars,
+                                               vocab_lang=vocab_lang,
+                                               is_rnn_model=True)
+    elif (system_param_dict['print_model_checkpoint_embed_weights'] != None and system_param_dict['print_embed_model_checkpoint'] != None):
+        rnn_calculation.print_model_checkpoint(vocab_chars=vocab_chars,
+                                               vocab_lang=vocab_lang,
+                                               is_rnn_model=False)
 
-    ########################
-    # DATA FILES SPLITTING #
-    ########################
-
-        # split into training, validation and test set files from an original file
-        files_exist = Path(system_param_dict['out_tr_data_rel_path']).is_file() and Path(system_param_dict['out_va_data_rel_path']).is_file() and Path(system_param_dict['out_te_data_rel_path']).is_file()
-        if (system_param_dict['create_splitted_data_files'] or not files_exist):
-            out_filenames = [system_param_dict['out_tr_data_rel_path'], system_param_dict['out_va_data_rel_path'], system_param_dict['out_te_data_rel_path']] #same size as ratios
-            data_splitter = DataSplit.DataSplit()
-            splitted_data = data_splitter.split_percent_of_languages(input_file=system_param_dict['input_tr_va_te_data_rel_path'],
-                                                                     ratio=system_param_dict['tr_va_te_split_ratios'],
-                                                                     out_filenames=out_filenames,
-                                                                     shuffle_seed=system_param_dict['split_shuffle_seed'])
-
-    ##################################################
-    # DATA RETRIEVAL, PREPROCESSING & TRANSFORMATION #
-    ##################################################
-
-        # retrieve, preprocess and transform data for readily use for embedding and RNN,
-        # and get the vocabularies
-        input_data = InputData.InputData()
-        train_set_indexed, val_set_indexed, test_set_indexed, real_test_set_indexed, vocab_chars, vocab_lang = input_data.get_indexed_data(
-            train_data_rel_path=system_param_dict['out_tr_data_rel_path'],
-            validation_data_rel_path=system_param_dict['out_va_data_rel_path'],
-            test_data_rel_path=system_param_dict['out_te_data_rel_path'],
-            real_test_data_rel_path=system_param_dict['input_rt_data_rel_path'],
-            min_char_frequency=system_param_dict['min_char_frequency'],
-            fetch_only_langs=system_param_dict['fetch_only_langs'],
-            fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets'])
-
-    ######################
-    # EMBEDDING TRAINING #
-    ######################
-
-        # train character embedding (Skip-Gram with Negative Sampling) to get embedding weights;
-        # the loss-based best embedding model checkpoint and its weights are saved to file
-        if (system_param_dict['train_embed']):
-            embedding_calculation = EmbeddingCalculation.EmbeddingCalculation()
-            embedding_calculation.train_embed(train_set_indexed=train_set_indexed,
-                                              val_set_indexed=val_set_indexed,
-                                              vocab_chars=vocab_chars,
-                                              vocab_lang=vocab_lang,
-                                              system_param_dict=system_param_dict)
-
-    ################
-    # RNN TRAINING #
-    ################
-
-        rnn_calculation = RNNCalculation.RNNCalculation(system_param_dict)
-        
-        # train RNN model (uni- or bidirectional GRU) with character embeddings;
-        # the loss-based best model checkpoint is saved to file
-        if (system_param_dict['train_rnn']):
-            rnn_calculation.train_rnn(data_sets=[train_set_indexed, val_set_indexed],
-                                      vocab_chars=vocab_chars,
-                                      vocab_lang=vocab_lang)
-
-    ##############
-    # EVALUATION #
-    ##############
-
-        # evaluate RNN model checkpoint on test set
-        if (system_param_dict['eval_test_set']):
-            rnn_calculation.test_rnn(data_sets=[test_set_indexed],
-                                     vocab_chars=vocab_chars,
-                                     vocab_lang=vocab_lang)
-
-        # print saved model checkpoint from file (RNN or embedding)
-        # note: some parameters in the YAML settings file have to be the same as in the checkpoint
-        # (e.g. input_tr_va_te_data_rel_path and hidden_size_rnn)
-        if (system_param_dict['print_model_checkpoint_embed_weights'] != None and system_param_dict['print_rnn_model_checkpoint'] != None):
-            rnn_calculation.print_model_checkpoint(vocab_chars=vocab_chars,
-                                                   vocab_lang=vocab_lang,
-                                                   is_rnn_model=True)
-        elif (system_param_dict['print_model_checkpoint_embed_weights'] != None and system_param_dict['print_embed_model_checkpoint'] != None):
-            rnn_calculation.print_model_checkpoint(vocab_chars=vocab_chars,
-                                                   vocab_lang=vocab_lang,
-                                                   is_rnn_model=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Character-level language identification of tweets.')
+    parser.add_argument('--config', default='SystemParameters.yaml',
+                        help='YAML settings file (e.g. SystemParametersCluster.yaml)')
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='KEY=VALUE',
+                        help='overrides a parameter of the settings file; the value is parsed as YAML (repeatable)')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.add_parser('run', help='run what the boolean flags of the settings file select (default)')
+    subparsers.add_parser('split', help='split the original file into training, validation and test set files')
+    subparsers.add_parser('preprocess', help='index the data sets and print their sizes')
+    subparsers.add_parser('train-embed', help='train the character embedding')
+    subparsers.add_parser('train-rnn', help='train the RNN')
+    subparsers.add_parser('train-ngram', help='train the n-gram classifier of the cascade (stored alongside the RNN model checkpoint)')
+    subparsers.add_parser('eval', help='evaluate the trained RNN model checkpoint on the test set')
+    subparsers.add_parser('compare', help='compare the RNN model checkpoints of compare_rnn_checkpoints on the test set')
+    subparsers.add_parser('export', help='export the trained model as an inference artifact')
+    classify_parser = subparsers.add_parser('classify', help='classify texts given as arguments or one per line on stdin')
+    classify_parser.add_argument('texts', nargs='*', help='texts to classify')
+    classify_parser.add_argument('--top', type=int, default=1, help='number of most probable languages printed per text')
+    bulk_parser = subparsers.add_parser('classify-bulk', help='classify texts from files, shards or stdin in batches and stream the results to a file')
+    bulk_parser.add_argument('inputs', nargs='+', help='input files, directories or glob patterns of shards (- for stdin)')
+    bulk_parser.add_argument('--output', required=True, help='output file (- for stdout); resumed after an interruption')
+    bulk_parser.add_argument('--input-format', choices=['text', 'tsv', 'tweets'], default='text',
+                             help='one text per line, one id<TAB>text per line, or the ;-separated tweet files')
+    bulk_parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help='output format')
+    bulk_parser.add_argument('--top', type=int, default=1, help='number of most probable languages written per text')
+    bulk_parser.add_argument('--restart', action='store_true', help='overwrite the output instead of resuming')
+    subparsers.add_parser('serve', help='serve the classification over HTTP on service_host:service_port')
+    subparsers.add_parser('daemon', help='keep the models resident and serve them on the Unix socket daemon_socket_path')
+    subparsers.add_parser('terminal', help='interactive testing on arbitrary input text or live tweets')
+    args = parser.parse_args(argv)
+    
+    system_param_dict = load_system_param_dict(args.config, args.overrides)
+    if (system_param_dict is None):
+        return 2
+    command_functions = {
+        None: run_all,
+        'run': run_all,
+        'split': run_split,
+        'preprocess': run_preprocess,
+        'train-embed': run_train_embed,
+        'train-rnn': run_train_rnn,
+        'train-ngram': run_train_ngram,
+        'eval': run_eval,
+        'compare': run_compare,
+        'export': run_export,
+        'classify': run_classify,
+        'classify-bulk': run_classify_bulk,
+        'serve': run_serve,
+        'daemon': run_daemon,
+        'terminal': run_terminal,
+    }
+    exit_code = command_functions[args.command](system_param_dict, args)
+    if (exit_code is None):
+        return 0
+    return exit_code
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
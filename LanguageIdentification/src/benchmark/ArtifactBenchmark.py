@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import copy
+import os
+import tempfile
+import time
+import yaml
+from input import InputData
+from net import InferenceArtifact
+from evaluation import LanguageIdentifier
+
+
+def main():
+    """
+    Load time and size benchmark for the slim inference artifact.
+    
+    Exports the trained model checkpoint and embedding weights (trained_model_checkpoint_rel_path and
+    trained_embed_weights_rel_path in SystemParameters.yaml) as float32, float16 and int8 artifacts to a temporary directory.
+    Prints the file sizes, the time to load a LanguageIdentifier from the two files and from each artifact (the files are
+    in the page cache after the first load, so the times mostly show the parsing and copying), and the maximum absolute
+    difference of the predicted probabilities on the first 1000 test set tweets.
+    Run from the src directory: python -m benchmark.ArtifactBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    system_param_dict['inference_precision'] = 'float32'
+    
+    input_data = InputData.InputData()
+    texts = []
+    for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                batch_size=1000,
+                                                                fetch_only_first_x_tweets=1000):
+        texts += [text for text, _ in filtered_batch]
+    
+    start_time = time.time()
+    checkpoint_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict)
+    checkpoint_seconds = time.time() - start_time
+    checkpoint_probs, _ = checkpoint_identifier.predict_indexed(checkpoint_identifier.prepare_texts(texts))
+    checkpoint_bytes = os.path.getsize(system_param_dict['trained_model_checkpoint_rel_path']) + os.path.getsize(system_param_dict['trained_embed_weights_rel_path'])
+    
+    results = []
+    temp_dir = tempfile.mkdtemp()
+    inference_artifact = InferenceArtifact.InferenceArtifact()
+    for weights_dtype in ['float32', 'float16', 'int8']:
+        artifact_rel_path = os.path.join(temp_dir, 'inference_artifact_%s.bin' % weights_dtype)
+        inference_artifact.export(checkpoint_identifier, artifact_rel_path, weights_dtype)
+        start_time = time.time()
+        artifact_identifier = LanguageIdentifier.LanguageIdentifier(copy.deepcopy(system_param_dict), artifact_rel_path=artifact_rel_path)
+        seconds = time.time() - start_time
+        artifact_probs, _ = artifact_identifier.predict_indexed(artifact_identifier.prepare_texts(texts))
+        max_diff = max([float((checkpoint_prob - artifact_prob).abs().max())
+                        for checkpoint_prob, artifact_prob in zip(checkpoint_probs, artifact_probs) if checkpoint_prob is not None])
+        results.append((weights_dtype, os.path.getsize(artifact_rel_path), seconds, max_diff))
+    
+    print('========================================')
+    print('Model files\t\tMB\tLoad seconds\tMax. abs. prob. difference')
+    print('checkpoint + weights\t%.2f\t%.3f' % (checkpoint_bytes / 1e6, checkpoint_seconds))
+    for weights_dtype, artifact_bytes, seconds, max_diff in results:
+        print('artifact %s\t%.2f\t%.3f\t\t%.2e' % (weights_dtype, artifact_bytes / 1e6, seconds, max_diff))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import copy
+import filecmp
+import os
+import shutil
+import tempfile
+import time
+import yaml
+from evaluation import LanguageIdentifier, BulkClassifier
+
+
+def main():
+    """
+    Scaling benchmark for the bulk classification on the CPU.
+    
+    Classifies the test set file specified in SystemParameters.yaml (in the 'tweets' input format) with 1, 2, 4 and 8
+    worker processes into temporary CSV files and prints the throughput including reading and writing, the speedup
+    relative to one worker and whether the output equals the one of one worker.
+    Run from the src directory: python -m benchmark.BulkClassificationBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    system_param_dict['prediction_cache_size'] = 0
+    
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    temp_dir = tempfile.mkdtemp()
+    results = []
+    for num_workers in [1, 2, 4, 8]:
+        bench_param_dict = copy.deepcopy(system_param_dict)
+        bench_param_dict['num_bulk_workers'] = num_workers
+        bulk_classifier = BulkClassifier.BulkClassifier(bench_param_dict, language_identifier)
+        output_rel_path = os.path.join(temp_dir, 'bulk_%d.csv' % num_workers)
+        start_time = time.time()
+        num_records = bulk_classifier.classify_to_file(input_rel_paths=[system_param_dict['out_te_data_rel_path']],
+                                                       output_rel_path=output_rel_path,
+                                                       input_format='tweets',
+                                                       output_format='csv',
+                                                       n_highest_probs=3,
+                                                       resume=False)
+        results.append((num_workers, time.time() - start_time, num_records, output_rel_path))
+    
+    print('========================================')
+    print('Workers\tSeconds\tTexts/s\t\tSpeedup\tSame output')
+    for num_workers, seconds, num_records, output_rel_path in results:
+        if (num_records is None):
+            print('%d\tfailed' % num_workers)
+            continue
+        is_same = filecmp.cmp(results[0][3], output_rel_path, shallow=False)
+        print('%d\t%.2f\t%.1f\t\t%.2fx\t%s' % (num_workers, seconds, num_records / seconds, results[0][1] / seconds, is_same))
+    print('========================================')
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+from __future__ import division
+import copy
+import time
+import yaml
+from input import InputData
+from evaluation import LanguageIdentifier
+
+
+def main():
+    """
+    Accuracy/latency trade-off benchmark for the early exit of unidirectional models (early_exit_threshold, early_exit_patience).
+    
+    Classifies the test set specified in SystemParameters.yaml with the trained model checkpoint (trained_model_checkpoint_rel_path,
+    has to be unidirectional) without early exit and with several thresholds. Prints the accuracy, the latency per tweet,
+    the share of tweets exiting before their last character and the mean exit position (absolute and relative to the tweet length).
+    Run from the src directory: python -m benchmark.EarlyExitBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    
+    input_data = InputData.InputData()
+    embed_and_num_classes = input_data.create_embed_from_weights_file(system_param_dict['trained_embed_weights_rel_path'])
+    texts = []
+    langs = []
+    for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                batch_size=system_param_dict['test_batch_size_rnn'],
+                                                                fetch_only_langs=system_param_dict['fetch_only_langs'],
+                                                                fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets']):
+        texts += [text for text, _ in filtered_batch]
+        langs += [lang for _, lang in filtered_batch]
+    
+    print('========================================')
+    print('Patience:', system_param_dict['early_exit_patience'])
+    print('Threshold\tAccuracy\tms/tweet\tExited early\tMean exit position\tMean relative exit position')
+    for early_exit_threshold in [None, 0.99, 0.95, 0.9, 0.8]:
+        bench_param_dict = copy.deepcopy(system_param_dict)
+        bench_param_dict['early_exit_threshold'] = early_exit_threshold
+        language_identifier = LanguageIdentifier.LanguageIdentifier(bench_param_dict, embed_and_num_classes=embed_and_num_classes)
+        if (language_identifier.model.is_bidirectional):
+            print('ERROR: The early exit benchmark needs a unidirectional model checkpoint!')
+            return
+        indexed_texts = language_identifier.prepare_texts(texts)
+        start_time = time.time()
+        mean_probs, _, exit_positions = language_identifier.predict_indexed(indexed_texts, return_exit_positions=True)
+        seconds = time.time() - start_time
+        # only tweets of languages known to the model with at least one vocabulary character count
+        evaluated = [i for i in range(len(texts)) if mean_probs[i] is not None and langs[i] in language_identifier.lang2index]
+        accuracy = sum([int(int(mean_probs[i].max(0)[1]) == language_identifier.lang2index[langs[i]]) for i in evaluated]) / len(evaluated)
+        exited_early = sum([int(exit_positions[i] < len(indexed_texts[i])) for i in evaluated]) / len(evaluated)
+        mean_exit_position = sum([exit_positions[i] for i in evaluated]) / len(evaluated)
+        mean_relative_exit_position = sum([exit_positions[i] / len(indexed_texts[i]) for i in evaluated]) / len(evaluated)
+        print('%s\t\t%.4f\t\t%.3f\t\t%.4f\t\t%.1f\t\t\t%.3f' % (early_exit_threshold, accuracy, 1000 * seconds / len(texts),
+                                                             exited_early, mean_exit_position, mean_relative_exit_position))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
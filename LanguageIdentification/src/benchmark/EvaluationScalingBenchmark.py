@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import copy
+import time
+import yaml
+from input import InputData
+from evaluation import LanguageIdentifier, ParallelEvaluator
+
+
+def main():
+    """
+    Scaling benchmark for the sharded test set evaluation on the CPU.
+    
+    Evaluates the model checkpoint in rnn_model_checkpoint_rel_path (with the embedding weights in embed_weights_rel_path)
+    on the test set specified in SystemParameters.yaml with 1, 2, 4 and 8 worker processes and prints the evaluation
+    throughput, the speedup relative to one worker and whether the metrics equal the ones of one worker.
+    The test set is read and preprocessed once before the runs, so only the evaluation is timed.
+    Run from the src directory: python -m benchmark.EvaluationScalingBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                model_checkpoint_rel_path=system_param_dict['rnn_model_checkpoint_rel_path'],
+                                                                embed_weights_rel_path=system_param_dict['embed_weights_rel_path'])
+    input_data = InputData.InputData()
+    indexed_batches = list(input_data.iter_indexed_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                vocab_chars=language_identifier.vocab_chars,
+                                                                vocab_lang=language_identifier.vocab_lang,
+                                                                batch_size=system_param_dict['test_batch_size_rnn'],
+                                                                fetch_only_langs=system_param_dict['fetch_only_langs'],
+                                                                fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets']))
+    num_test_tweets = sum([len(indexed_batch) for indexed_batch in indexed_batches])
+    num_classes = len(language_identifier.vocab_lang)
+    
+    results = []
+    for num_workers in [1, 2, 4, 8]:
+        bench_param_dict = copy.deepcopy(system_param_dict)
+        bench_param_dict['num_eval_workers_rnn'] = num_workers
+        parallel_evaluator = ParallelEvaluator.ParallelEvaluator(bench_param_dict)
+        start_time = time.time()
+        accumulator = parallel_evaluator.accumulate_metrics(language_identifier.model, language_identifier.embed, indexed_batches, num_classes)
+        results.append((num_workers, time.time() - start_time, accumulator))
+    
+    print('========================================')
+    print('Workers\tSeconds\tTweets/s\tSpeedup\tAccuracy\tMean loss\tSame confusion matrix')
+    for num_workers, seconds, accumulator in results:
+        if (accumulator is None):
+            print('%d\tfailed' % num_workers)
+            continue
+        is_same = results[0][2] is not None and (accumulator.confusion_matrix == results[0][2].confusion_matrix).all()
+        print('%d\t%.2f\t%.1f\t\t%.2fx\t%.4f\t\t%.6f\t%s' % (num_workers, seconds, num_test_tweets / seconds, results[0][1] / seconds,
+                                                           accumulator.accuracy(), accumulator.mean_loss(), is_same))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+from __future__ import division
+import copy
+import io
+import time
+import yaml
+import torch
+from input import InputData
+from evaluation import LanguageIdentifier
+
+
+def main():
+    """
+    Accuracy, latency and memory benchmark for the inference precisions (inference_precision) on the CPU.
+    
+    Classifies the test set specified in SystemParameters.yaml with the trained model checkpoint
+    (trained_model_checkpoint_rel_path) in float32, int8 and bfloat16. Prints the accuracy, its delta to float32,
+    the share of tweets with the same prediction as float32, the latency per tweet and the serialized size of the model weights.
+    Run from the src directory: python -m benchmark.InferencePrecisionBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    
+    input_data = InputData.InputData()
+    embed_and_num_classes = input_data.create_embed_from_weights_file(system_param_dict['trained_embed_weights_rel_path'])
+    texts = []
+    langs = []
+    for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                batch_size=system_param_dict['test_batch_size_rnn'],
+                                                                fetch_only_langs=system_param_dict['fetch_only_langs'],
+                                                                fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets']):
+        texts += [text for text, _ in filtered_batch]
+        langs += [lang for _, lang in filtered_batch]
+    
+    results = []
+    for inference_precision in ['float32', 'int8', 'bfloat16']:
+        bench_param_dict = copy.deepcopy(system_param_dict)
+        bench_param_dict['inference_precision'] = inference_precision
+        language_identifier = LanguageIdentifier.LanguageIdentifier(bench_param_dict, embed_and_num_classes=embed_and_num_classes)
+        indexed_texts = language_identifier.prepare_texts(texts)
+        start_time = time.time()
+        lang_predictions = language_identifier.classify_indexed(indexed_texts)
+        seconds = time.time() - start_time
+        predicted_langs = [lang_prediction[0][0] if lang_prediction != [] else None for lang_prediction in lang_predictions]
+        weights_file = io.BytesIO()
+        torch.save(language_identifier.model.state_dict(), weights_file)
+        # an unsupported precision falls back to float32
+        results.append((language_identifier.inference_precision, predicted_langs, seconds, len(weights_file.getvalue())))
+    
+    # only tweets of languages known to the model with at least one vocabulary character count
+    evaluated = [i for i in range(len(texts)) if results[0][1][i] is not None and langs[i] in language_identifier.lang2index]
+    float_accuracy = sum([int(results[0][1][i] == langs[i]) for i in evaluated]) / len(evaluated)
+    print('========================================')
+    print('Tweets:', len(evaluated))
+    print('Precision\tAccuracy\tDelta\t\tSame as float32\tms/tweet\tWeights MB')
+    for inference_precision, predicted_langs, seconds, weights_bytes in results:
+        accuracy = sum([int(predicted_langs[i] == langs[i]) for i in evaluated]) / len(evaluated)
+        agreement = sum([int(predicted_langs[i] == results[0][1][i]) for i in evaluated]) / len(evaluated)
+        print('%s\t\t%.4f\t\t%+.4f\t\t%.4f\t\t%.3f\t\t%.2f' % (inference_precision, accuracy, accuracy - float_accuracy, agreement,
+                                                             1000 * seconds / len(texts), weights_bytes / 1e6))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
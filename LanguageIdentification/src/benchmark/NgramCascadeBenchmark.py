@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import time
+import yaml
+from input import InputData
+from evaluation import LanguageIdentifier
+
+
+def main():
+    """
+    Throughput and accuracy benchmark for the n-gram classifier cascade in front of the GRU.
+    
+    Classifies the test set specified in SystemParameters.yaml with the GRU alone, with the n-gram classifier alone and
+    with the cascade for several margins, and prints the end-to-end throughput (including the cleaning), the accuracy
+    and the share of tweets passed on to the GRU. The n-gram classifier is loaded from the file alongside the model
+    (see ngram_cascade; train it with: python Main.py train-ngram).
+    Run from the src directory: python -m benchmark.NgramCascadeBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    system_param_dict['prediction_cache_size'] = 0
+    system_param_dict['script_fast_path'] = False
+    system_param_dict['ngram_cascade'] = True
+    
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    ngram_classifier = language_identifier.ngram_classifier
+    if (ngram_classifier is None):
+        return
+    input_data = InputData.InputData()
+    texts = []
+    target_langs = []
+    for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                batch_size=system_param_dict['test_batch_size_rnn'],
+                                                                fetch_only_langs=system_param_dict['fetch_only_langs'],
+                                                                fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets']):
+        texts += [text for text, _ in filtered_batch]
+        target_langs += [lang for _, lang in filtered_batch]
+    
+    def run(name, margin):
+        language_identifier.ngram_classifier = ngram_classifier if margin is not None else None
+        language_identifier.ngram_margin = margin
+        start_time = time.time()
+        lang_predictions = language_identifier.classify(texts)
+        seconds = time.time() - start_time
+        num_correct = sum([lang_prediction != [] and lang_prediction[0][0] == target_lang
+                           for lang_prediction, target_lang in zip(lang_predictions, target_langs)])
+        if (margin is None):
+            num_forwarded = len(texts)
+        else:
+            ngram_lang_predictions = language_identifier.classify_indexed_ngram(language_identifier.prepare_texts(texts))
+            num_forwarded = sum([lang_prediction is None for lang_prediction in ngram_lang_predictions])
+        return (name, len(texts) / seconds, num_correct / max(1, len(texts)), num_forwarded / max(1, len(texts)))
+    
+    results = [run('GRU only', None)]
+    # a margin of 0 answers every text with the n-gram classifier
+    results.append(run('N-gram only', 0.0))
+    for margin in [0.5, 0.9, 0.99, 0.999]:
+        results.append(run('Cascade %g' % margin, margin))
+    
+    print('========================================')
+    print('Classifier\tTweets/s\tSpeedup\tAccuracy\tTo GRU')
+    for name, tweets_per_second, accuracy, forwarded_share in results:
+        print('%s\t%.1f\t\t%.2fx\t%.4f\t\t%.4f' % (name.ljust(12), tweets_per_second, tweets_per_second / results[0][1], accuracy, forwarded_share))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import collections
+import time
+import yaml
+from input import InputData
+from evaluation import LanguageIdentifier, ScriptClassifier
+
+
+def main():
+    """
+    Routing and accuracy benchmark for the Unicode script fast path.
+    
+    Routes the tweets of the test set specified in SystemParameters.yaml by their script and prints for every routed
+    language the number of routed tweets and the accuracy of the fast path and of the network on them, the routing rate
+    and the classification time of the whole test set with and without the fast path.
+    Run from the src directory: python -m benchmark.ScriptFastPathBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    system_param_dict['prediction_cache_size'] = 0
+    system_param_dict['script_fast_path'] = False
+    
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    input_data = InputData.InputData()
+    texts = []
+    target_langs = []
+    for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                batch_size=system_param_dict['test_batch_size_rnn'],
+                                                                fetch_only_langs=system_param_dict['fetch_only_langs'],
+                                                                fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets']):
+        texts += [text for text, _ in filtered_batch]
+        target_langs += [lang for _, lang in filtered_batch]
+    
+    script_classifier = ScriptClassifier.ScriptClassifier(system_param_dict, language_identifier.vocab_lang)
+    routed_langs = script_classifier.route([language_identifier.clean_text(text) for text in texts])
+    routed_indices = [i for i in range(len(texts)) if routed_langs[i] is not None]
+    network_langs = [lang_prediction[0][0] if lang_prediction != [] else None
+                     for lang_prediction in language_identifier.classify([texts[i] for i in routed_indices])]
+    counts = collections.Counter()
+    fast_path_correct = collections.Counter()
+    network_correct = collections.Counter()
+    for i, network_lang in zip(routed_indices, network_langs):
+        counts[routed_langs[i]] += 1
+        fast_path_correct[routed_langs[i]] += routed_langs[i] == target_langs[i]
+        network_correct[routed_langs[i]] += network_lang == target_langs[i]
+    
+    start_time = time.time()
+    language_identifier.classify(texts)
+    network_seconds = time.time() - start_time
+    language_identifier.script_classifier = ScriptClassifier.ScriptClassifier(system_param_dict, language_identifier.vocab_lang)
+    start_time = time.time()
+    language_identifier.classify(texts)
+    fast_path_seconds = time.time() - start_time
+    
+    print('========================================')
+    print('Script languages of the model:', script_classifier.routed_langs)
+    print('Routed lang\tTweets\tFast path acc.\tNetwork acc.')
+    for lang in sorted(counts.keys()):
+        print('%s\t\t%d\t%.4f\t\t%.4f' % (lang, counts[lang], fast_path_correct[lang] / counts[lang], network_correct[lang] / counts[lang]))
+    num_routed = len(routed_indices)
+    print('All\t\t%d\t%.4f\t\t%.4f' % (num_routed, sum(fast_path_correct.values()) / max(1, num_routed), sum(network_correct.values()) / max(1, num_routed)))
+    print('Routing rate: %.4f (%d of %d tweets)' % (num_routed / max(1, len(texts)), num_routed, len(texts)))
+    print('Seconds without / with fast path: %.2f / %.2f (%.2fx)' % (network_seconds, fast_path_seconds, network_seconds / fast_path_seconds))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
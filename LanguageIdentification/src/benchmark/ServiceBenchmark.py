@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import copy
+import http.client
+import json
+import threading
+import time
+import yaml
+from input import InputData
+from evaluation import LanguageIdentifier
+from service import ClassificationServer
+
+
+def run_clients(port, texts, num_clients, num_requests_per_client):
+    """
+    Sends single-text requests from concurrent clients, each with its own keep-alive connection.
+    
+    Returns:
+        latencies: Sorted latencies in seconds of the successful requests.
+        num_rejected: Number of requests answered with 503.
+        seconds: Wall time of all requests.
+    """
+    latencies = []
+    num_rejected = [0]
+    lock = threading.Lock()
+    
+    def run_client(client_i):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        client_latencies = []
+        client_num_rejected = 0
+        for request_i in range(num_requests_per_client):
+            body = json.dumps({'text': texts[(client_i * num_requests_per_client + request_i) % len(texts)], 'top': 1})
+            start_time = time.time()
+            connection.request('POST', '/classify', body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if (response.status == 200):
+                client_latencies.append(time.time() - start_time)
+            elif (response.status == 503):
+                client_num_rejected += 1
+        connection.close()
+        with lock:
+            latencies.extend(client_latencies)
+            num_rejected[0] += client_num_rejected
+    
+    threads = [threading.Thread(target=run_client, args=(client_i,)) for client_i in range(num_clients)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), num_rejected[0], time.time() - start_time
+
+
+def main():
+    """
+    Throughput and latency benchmark for the HTTP classification service.
+    
+    Starts the service in this process on a free local port, once without batching (service_max_batch_size 1) and once
+    with the batching parameters specified in SystemParameters.yaml, and sends 200 single-text requests per client
+    (texts of the test set) from 1, 8 and 32 concurrent clients. Prints the requests per second, the median and
+    99th percentile latency, the mean batch size and the number of rejected requests.
+    Run from the src directory: python -m benchmark.ServiceBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    system_param_dict['prediction_cache_size'] = 0
+    system_param_dict['service_host'] = '127.0.0.1'
+    system_param_dict['service_port'] = 0
+    num_requests_per_client = 200
+    
+    language_identifier = LanguageIdentifier.LanguageIdentifier(system_param_dict,
+                                                                artifact_rel_path=system_param_dict['trained_inference_artifact_rel_path'])
+    input_data = InputData.InputData()
+    texts = []
+    for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=system_param_dict['out_te_data_rel_path'],
+                                                                batch_size=1000,
+                                                                fetch_only_first_x_tweets=1000):
+        texts += [text for text, _ in filtered_batch]
+    
+    results = []
+    for max_batch_size in [1, system_param_dict['service_max_batch_size']]:
+        bench_param_dict = copy.deepcopy(system_param_dict)
+        bench_param_dict['service_max_batch_size'] = max_batch_size
+        for num_clients in [1, 8, 32]:
+            classification_server = ClassificationServer.ClassificationServer(bench_param_dict, language_identifier)
+            classification_server.start()
+            server_thread = threading.Thread(target=classification_server.serve_forever)
+            server_thread.start()
+            latencies, num_rejected, seconds = run_clients(classification_server.port, texts, num_clients, num_requests_per_client)
+            classification_server.shutdown()
+            server_thread.join()
+            micro_batcher = classification_server.micro_batcher
+            mean_batch_size = micro_batcher.num_batched_texts / max(1, micro_batcher.num_batches)
+            results.append((max_batch_size, num_clients, len(latencies) / seconds,
+                            latencies[len(latencies) // 2] if latencies else float('nan'),
+                            latencies[int(len(latencies) * 0.99)] if latencies else float('nan'),
+                            mean_batch_size, num_rejected))
+    
+    print('========================================')
+    print('Max. batch\tClients\tRequests/s\tp50 ms\tp99 ms\tMean batch\tRejected')
+    for max_batch_size, num_clients, requests_per_second, p50, p99, mean_batch_size, num_rejected in results:
+        print('%d\t\t%d\t%.1f\t\t%.2f\t%.2f\t%.1f\t\t%d' % (max_batch_size, num_clients, requests_per_second,
+                                                           p50 * 1000, p99 * 1000, mean_batch_size, num_rejected))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import copy
+import os
+import tempfile
+import time
+import yaml
+import torch
+from input import InputData
+from net import RNNCalculation
+
+
+def main():
+    """
+    Scaling benchmark for the data-parallel RNN training on the CPU.
+    
+    Trains one epoch on the training set specified in SystemParameters.yaml with 1, 2, 4 and 8
+    worker processes and prints the training throughput and the speedup relative to one worker.
+    Validation checks are reduced to the one at the first batch, and checkpoints are written to a temporary directory.
+    Run from the src directory: python -m benchmark.TrainingScalingBenchmark
+    """
+    with open('SystemParameters.yaml', 'r') as stream:
+        system_param_dict = yaml.load(stream)
+    system_param_dict['cuda_is_avail'] = False
+    system_param_dict['max_num_epochs_rnn'] = 1
+    system_param_dict['eval_every_num_batches_rnn'] = float('inf')
+    
+    input_data = InputData.InputData()
+    train_set_indexed, val_set_indexed, _, _, vocab_chars, vocab_lang = input_data.get_indexed_data(
+        train_data_rel_path=system_param_dict['out_tr_data_rel_path'],
+        validation_data_rel_path=system_param_dict['out_va_data_rel_path'],
+        test_data_rel_path=system_param_dict['out_te_data_rel_path'],
+        real_test_data_rel_path=system_param_dict['out_te_data_rel_path'],
+        min_char_frequency=system_param_dict['min_char_frequency'],
+        fetch_only_langs=system_param_dict['fetch_only_langs'],
+        fetch_only_first_x_tweets=system_param_dict['fetch_only_first_x_tweets'])
+    # keep the single validation check at the first batch cheap
+    val_set_indexed = val_set_indexed[:system_param_dict['batch_size_rnn']]
+    num_train_tweets = len(train_set_indexed) - len(train_set_indexed) % system_param_dict['batch_size_rnn']
+    
+    results = []
+    temp_dir = tempfile.mkdtemp()
+    for num_workers in [1, 2, 4, 8]:
+        bench_param_dict = copy.deepcopy(system_param_dict)
+        bench_param_dict['num_train_workers_rnn'] = num_workers
+        bench_param_dict['rnn_model_checkpoint_rel_path'] = os.path.join(temp_dir, 'rnn_model_checkpoint_%d.pth' % num_workers)
+        # the same initial weights for every run
+        torch.manual_seed(0)
+        rnn_calculation = RNNCalculation.RNNCalculation(bench_param_dict)
+        start_time = time.time()
+        rnn_calculation.train_rnn(data_sets=[train_set_indexed, val_set_indexed],
+                                  vocab_chars=vocab_chars,
+                                  vocab_lang=vocab_lang)
+        results.append((num_workers, time.time() - start_time))
+    
+    print('========================================')
+    print('Workers\tSeconds\tTweets/s\tSpeedup')
+    for num_workers, seconds in results:
+        print('%d\t%.2f\t%.1f\t\t%.2fx' % (num_workers, seconds, num_train_tweets / seconds, results[0][1] / seconds))
+    print('========================================')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -24,6 +24,7 @@
 
 
 import math
+from pathlib import Path
 import torch
 from torch.autograd import Variable
 from input import InputData
@@ -71,9 +72,25 @@ class EmbeddingCalculation(object):
         if (system_param_dict['cuda_is_avail']):
             skip_gram_model.cuda()
         
+        # continue an interrupted training from the last saved training state
+        training_state = None
+        if (system_param_dict['resume_training_embed']):
+            if (Path(system_param_dict['embed_resume_checkpoint_rel_path']).is_file()):
+                if (system_param_dict['data_shuffle_seed'] == None):
+                    print('ERROR: Resuming the embedding training needs a fixed data_shuffle_seed (the vocabulary indices depend on the data order)!')
+                    return
+                training_state = skip_gram_model.load_training_state_from_file(system_param_dict['embed_resume_checkpoint_rel_path'])
+                if (not input_data.have_same_indices(training_state['vocab_chars'], vocab_chars)
+                    or not input_data.have_same_indices(training_state['vocab_lang'], vocab_lang)):
+                    print('ERROR: The vocabularies of the resumed embedding training differ from the current ones, the training is not resumed!')
+                    return
+            else:
+                print('No embedding training state to resume from found, starting a new training.')
+        
         # train skip-gram with negative sampling
         skip_gram_model.train(train_batched_pairs=train_batched_pairs,
-                              val_batched_pairs=val_batched_pairs)
+                              val_batched_pairs=val_batched_pairs,
+                              training_state=training_state)
                              
         ###########
         # TESTING #
@@ -24,6 +24,7 @@
 
 
 import math
+import random
 import numpy as np
 import torch
 import torch.optim as optim
@@ -31,6 +32,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch.autograd import Variable
 from evaluation import EmbeddingEvaluator
+from net import CheckpointWriter
 
 
 class SkipGramModel(nn.Module):
@@ -70,6 +72,8 @@ class SkipGramModel(nn.Module):
         # no weight_decay and momentum set because they
         # "require the global calculation on embedding matrix, which is extremely time-consuming"
         self.optimizer = optim.SGD(params=self.parameters(), lr=self.lr)
+        self.checkpoint_writer = CheckpointWriter.CheckpointWriter(is_async=system_param_dict['async_checkpoint_writing'],
+                                                                   keep_last_num_checkpoints=system_param_dict['keep_last_num_checkpoints'])
         
     def __init_embed(self):
         """
@@ -166,15 +170,20 @@ class SkipGramModel(nn.Module):
         # and normalize the loss by dividing by the batch size
         return (-1 * sum(losses)) / len(targets_1_pos)
     
-    def train(self, train_batched_pairs, val_batched_pairs):
+    def train(self, train_batched_pairs, val_batched_pairs, training_state=None):
         """Model's training method.
         
         Iterates over epochs and batches and updates weights after each batch.
         Saves the best model and its embedding weights to file and decays learning rate when learning stagnates.
+        
+        At every validation check the whole training state is saved to embed_resume_checkpoint_rel_path,
+        so an interrupted training can be resumed with a training_state loaded via load_training_state_from_file.
 
         Args:
             train_batched_pairs: The batched pairs used for training.
             val_batched_pairs: The batched pairs used for the validation checks.
+            training_state: If not 'None', the training continues from this training state
+                (the weights, optimizer and RNG states have to be already restored).
         """
         num_neg_samples = self.system_param_dict['num_neg_samples']
         max_eval_checks_not_improved = self.system_param_dict['max_eval_checks_not_improved_embed']
@@ -183,6 +192,7 @@ class SkipGramModel(nn.Module):
         lr_decay_factor = self.system_param_dict['lr_decay_factor_embed']
         embed_weights_rel_path = self.system_param_dict['embed_weights_rel_path']
         embed_model_checkpoint_rel_path = self.system_param_dict['embed_model_checkpoint_rel_path']
+        embed_resume_checkpoint_rel_path = self.system_param_dict['embed_resume_checkpoint_rel_path']
         num_train_batched_pairs_minus_one = len(train_batched_pairs) - 1
         max_eval_checks_not_improved_minus_one = max_eval_checks_not_improved - 1
         best_val_mean_loss = float('inf')
@@ -195,9 +205,24 @@ class SkipGramModel(nn.Module):
         embedding_evaluator = EmbeddingEvaluator.EmbeddingEvaluator(self)
         # increase the learning rate variable as in the first iteration it will be immediately decreased
         self.lr = self.lr * (1.0 / lr_decay_factor)
+        # batches before this one in the first epoch were already trained before the training was resumed
+        resume_batch_i = 0
+        if (training_state is not None):
+            if (training_state['num_train_batches'] != len(train_batched_pairs)):
+                print('ERROR: The training set differs from the one of the resumed training, the data order cannot be restored!')
+            epoch = training_state['epoch']
+            resume_batch_i = training_state['next_batch_i']
+            total_trained_batches_counter = training_state['total_trained_batches_counter']
+            best_val_mean_loss = training_state['best_val_mean_loss']
+            eval_checks_not_improved_counter = training_state['eval_checks_not_improved_counter']
+            continue_training = training_state['continue_training']
+            self.lr = training_state['lr']
+            print('[EMBEDDING] Resuming training at epoch', epoch, '| Batch', resume_batch_i, '| Total batches trained:', total_trained_batches_counter)
         # train until stopping criterium is satisfied or max_num_epochs is reached
         while continue_training and epoch < max_num_epochs:
             for batch_i, batch in enumerate(train_batched_pairs):
+                if (batch_i < resume_batch_i):
+                    continue
                 if (continue_training):
                     batch_size = len(batch)
                     
@@ -216,7 +241,7 @@ class SkipGramModel(nn.Module):
                     self.optimizer.zero_grad()
                     batch_mean_loss = self.forward(targets_1_pos, contexts_1_pos, contexts_0_pos_samples)
                     if (batch_i % 100 == 0):
-                        print('[EMBEDDING] Epoch', epoch, '| Batch', batch_i, '/', num_train_batched_pairs_minus_one, '| Training mean loss: ', batch_mean_loss.data[0])
+                        print('[EMBEDDING] Epoch', epoch, '| Batch', batch_i, '/', num_train_batched_pairs_minus_one, '| Training mean loss: ', batch_mean_loss.item())
                     batch_mean_loss.backward()
                     self.optimizer.step()
                     
@@ -262,41 +287,73 @@ class SkipGramModel(nn.Module):
                             # stop training when maximum of not improved eval checks is reached
                             if (eval_checks_not_improved_counter == max_eval_checks_not_improved):
                                 continue_training = False
+                        # save the whole training state to be able to resume from here
+                        self.save_model_checkpoint_to_file({
+                                                            'system_param_dict': self.system_param_dict,
+                                                            'training_state': {
+                                                                              'epoch': epoch,
+                                                                              'next_batch_i': batch_i + 1,
+                                                                              'num_train_batches': len(train_batched_pairs),
+                                                                              'total_trained_batches_counter': total_trained_batches_counter + 1,
+                                                                              'best_val_mean_loss': best_val_mean_loss,
+                                                                              'eval_checks_not_improved_counter': eval_checks_not_improved_counter,
+                                                                              'continue_training': continue_training,
+                                                                              'lr': self.lr,
+                                                                              'rng_states': self.__get_rng_states(),
+                                                                              'state_dict': self.state_dict(),
+                                                                              'optimizer': self.optimizer.state_dict(),
+                                                                              'vocab_chars': self.vocab_chars,
+                                                                              'vocab_lang': self.vocab_lang,
+                                                                              },
+                                                            },
+                                                            embed_resume_checkpoint_rel_path)
                 total_trained_batches_counter += 1
             epoch += 1
+            resume_batch_i = 0
+        self.flush_checkpoints()
     
     def __save_embed_weights_to_file(self, relative_path_to_file):
         """
         Saves the embedding weights to file together with the vocabulary size,
         the embedding dimension and the number of languages occured.
+        The weights are copied and the file is written by the checkpoint writer (see save_model_checkpoint_to_file).
         
         Args:
             relative_path_to_file: Relative path to the save file.
         """
         # transfer back from GPU to CPU if GPU available
         if (self.cuda_is_avail):
-            weights_array = self.embed_hidden.weight.cpu().data.numpy()
+            weights_array = self.embed_hidden.weight.cpu().data.numpy().copy()
         else:
-            weights_array = self.embed_hidden.weight.data.numpy()
-        writer = open(relative_path_to_file, 'w')
-        # write vocabulary size, embedding dimension and number of classes to file
-        writer.write('%d %d %d' % (self.vocab_chars_size, self.embed_dim, self.vocab_lang_size))
-        # write weights to file (one row for each char of the vocabulary)
-        for i in range(self.vocab_chars_size):
-            line = ' '.join([str(x) for x in weights_array[i]])
-            writer.write('\n%s' % line)
-        print('Embedding weights saved to file:', relative_path_to_file)
+            weights_array = self.embed_hidden.weight.data.numpy().copy()
+        header = '%d %d %d' % (self.vocab_chars_size, self.embed_dim, self.vocab_lang_size)
+        
+        def write_weights(file):
+            # write vocabulary size, embedding dimension and number of classes to file
+            lines = [header]
+            # write weights to file (one row for each char of the vocabulary)
+            for i in range(len(weights_array)):
+                lines.append(' '.join([str(x) for x in weights_array[i]]))
+            file.write('\n'.join(lines).encode('utf-8'))
+        self.checkpoint_writer.submit(write_weights, relative_path_to_file)
        
     def save_model_checkpoint_to_file(self, state, relative_path_to_file):
         """
         Saves a model state (checkpoint) to file.
+        With async_checkpoint_writing, the state is snapshotted and written in the background;
+        call flush_checkpoints to wait until it is on disk.
         
         Args:
             state: Dict containing the model state to be saved.
             relative_path_to_file: Relative path for the save file.
         """
-        torch.save(state, relative_path_to_file)
-        print('Model checkpoint saved to file:', relative_path_to_file)
+        self.checkpoint_writer.save(state, relative_path_to_file)
+        
+    def flush_checkpoints(self):
+        """
+        Blocks until all saved model states (checkpoints) are written to file.
+        """
+        self.checkpoint_writer.flush()
         
     def load_model_checkpoint_from_file(self, relative_path_to_file):
         """
@@ -317,4 +374,49 @@ class SkipGramModel(nn.Module):
         self.vocab_lang = results_dict['vocab_lang']
 #        self.eval()
         print('Model checkpoint loaded from file:', relative_path_to_file)
-        return state
\ No newline at end of file
+        return state
+
+    def load_training_state_from_file(self, relative_path_to_file):
+        """
+        Loads a training state saved during the training from file, restores the model, the optimizer
+        and the RNG states with it and returns it to be passed to the train method.
+        
+        Args:
+            relative_path_to_file: Relative path to the resume checkpoint file.
+
+        Returns:
+            training_state: The loaded training state.
+        """
+        training_state = torch.load(relative_path_to_file)['training_state']
+        self.load_state_dict(training_state['state_dict'])
+        self.optimizer.load_state_dict(training_state['optimizer'])
+        self.vocab_chars = training_state['vocab_chars']
+        self.vocab_lang = training_state['vocab_lang']
+        self.__set_rng_states(training_state['rng_states'])
+        print('Training state loaded from file:', relative_path_to_file)
+        return training_state
+
+    def __get_rng_states(self):
+        """
+        Returns:
+            rng_states: The states of all random number generators used in the training.
+        """
+        rng_states = {
+                      'python': random.getstate(),
+                      'numpy': np.random.get_state(),
+                      'torch': torch.get_rng_state(),
+                      }
+        if (self.cuda_is_avail):
+            rng_states['torch_cuda'] = torch.cuda.get_rng_state()
+        return rng_states
+
+    def __set_rng_states(self, rng_states):
+        """
+        Args:
+            rng_states: The states of all random number generators used in the training.
+        """
+        random.setstate(rng_states['python'])
+        np.random.set_state(rng_states['numpy'])
+        torch.set_rng_state(rng_states['torch'])
+        if (self.cuda_is_avail and 'torch_cuda' in rng_states):
+            torch.cuda.set_rng_state(rng_states['torch_cuda'])
\ No newline at end of file
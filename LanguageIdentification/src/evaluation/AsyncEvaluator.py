@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import queue
+import torch.multiprocessing as mp
+
+
+class AsyncEvaluator(object):
+    """Class for evaluating snapshots of a model's weights in a separate process while the training continues.
+    
+    The evaluation process is forked from the training process, so it owns a copy of the model and of the data
+    used by the evaluation function. For every submitted snapshot it loads the snapshot's weights into its copy
+    of the model, calls the evaluation function and sends the result back. If the process dies (e.g. killed for
+    lack of memory), the result of the pending snapshot is lost and a new process is forked.
+    """
+    
+    def __init__(self, model, evaluate_function):
+        """
+        Args:
+            model: The model to evaluate.
+            evaluate_function: Function without arguments evaluating the model and returning the result.
+        """
+        self.model = model
+        self.evaluate_function = evaluate_function
+        self.context = mp.get_context('fork')
+        self.pending_snapshot = None
+        self.process = None
+
+    def start(self):
+        """
+        Forks the evaluation process.
+        """
+        # new queues, a killed process may have left the old ones in an inconsistent state
+        self.snapshot_queue = self.context.Queue()
+        self.result_queue = self.context.Queue()
+        self.process = self.context.Process(target=self.__run)
+        self.process.daemon = True
+        self.process.start()
+
+    def stop(self):
+        """
+        Stops the evaluation process.
+        """
+        self.snapshot_queue.put(None)
+        self.process.join()
+
+    def submit(self, snapshot):
+        """
+        Submits a snapshot for evaluation. Only one snapshot may be evaluated at a time.
+        
+        Args:
+            snapshot: Dict containing at least the 'state_dict' to evaluate.
+        """
+        if (self.pending_snapshot is not None):
+            print('ERROR: The previous snapshot is still being evaluated!')
+            return
+        self.pending_snapshot = snapshot
+        self.snapshot_queue.put(snapshot['state_dict'])
+
+    def poll_result(self):
+        """
+        Returns:
+            result: Tuple of the evaluation result and the evaluated snapshot,
+                or 'None' if no snapshot is pending or its evaluation has not finished yet.
+        """
+        if (self.pending_snapshot is None):
+            return None
+        if (self.result_queue.empty()):
+            if (not self.process.is_alive()):
+                self.__restart_dead_process()
+            return None
+        return self.__take_result()
+
+    def wait_for_result(self):
+        """
+        Returns:
+            result: Tuple of the evaluation result and the evaluated snapshot (blocks until it is available),
+                or 'None' if no snapshot is pending or the evaluation process died.
+        """
+        if (self.pending_snapshot is None):
+            return None
+        return self.__take_result()
+
+    def __take_result(self):
+        """
+        Returns:
+            result: Tuple of the evaluation result and the evaluated snapshot, or 'None' if the evaluation failed.
+        """
+        while True:
+            try:
+                val_result = self.result_queue.get(timeout=1)
+                break
+            except queue.Empty:
+                # a process killed from outside never sends its result
+                if (not self.process.is_alive()):
+                    self.__restart_dead_process()
+                    return None
+        snapshot = self.pending_snapshot
+        self.pending_snapshot = None
+        if (val_result is None):
+            print('ERROR: The asynchronous evaluation of a snapshot failed!')
+            return None
+        return val_result, snapshot
+
+    def __restart_dead_process(self):
+        """
+        Drops the pending snapshot of a dead evaluation process and forks a new one.
+        """
+        print('ERROR: The asynchronous evaluation process died (exit code %s), its validation check is skipped!' % self.process.exitcode)
+        self.pending_snapshot = None
+        self.start()
+
+    def __run(self):
+        """
+        Loop of the evaluation process.
+        """
+        while True:
+            state_dict = self.snapshot_queue.get()
+            if (state_dict is None):
+                break
+            try:
+                self.model.load_state_dict(state_dict)
+                self.result_queue.put(self.evaluate_function())
+            except Exception as e:
+                print('ERROR: Evaluation failed:', e)
+                self.result_queue.put(None)
\ No newline at end of file
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import csv
+import glob
+import io
+import json
+import os
+import queue
+import sys
+import torch
+import torch.multiprocessing as mp
+
+
+INPUT_FORMATS = ['text', 'tsv', 'tweets']
+OUTPUT_FORMATS = ['csv', 'jsonl']
+
+
+class BulkClassifier(object):
+    """Class for the non-interactive classification of large amounts of texts.
+    
+    Texts are read lazily from files, shards of a data set (a directory or a glob pattern) or stdin, classified
+    in batches of bulk_batch_size texts and written in input order as CSV or JSON Lines rows of the form
+    (id, top-k languages, probabilities). With num_bulk_workers > 1 (CPU only), the batches are classified by forked
+    worker processes, which share the read-only weights of the model with the parent (copy-on-write). At most
+    2 * num_bulk_workers batches are in flight at once, so the memory stays bounded for arbitrarily large inputs.
+    
+    After every written batch, the number of written records and the size of the output file are stored atomically
+    in the sidecar file '<output>.offset'. An interrupted run started again with the same input and output resumes
+    after the last written batch: the output is truncated to the stored size and the already written records are skipped.
+    """
+    
+    def __init__(self, system_param_dict, language_identifier):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+            language_identifier: LanguageIdentifier used for the classification.
+        """
+        self.language_identifier = language_identifier
+        self.batch_size = system_param_dict['bulk_batch_size']
+        self.num_workers = system_param_dict['num_bulk_workers']
+        if (self.num_workers > 1 and system_param_dict['cuda_is_avail']):
+            print('ERROR: Bulk classification worker processes are only supported on the CPU, classifying in one process instead.', file=sys.stderr)
+            self.num_workers = 1
+
+    def classify_to_file(self, input_rel_paths, output_rel_path, input_format='text', output_format='csv', n_highest_probs=1, resume=True):
+        """
+        Classifies all texts of the inputs and streams the results to the output.
+        
+        Args:
+            input_rel_paths: List of input files, directories or glob patterns of shards ('-' for stdin).
+            output_rel_path: Output file ('-' for stdout, which can not be resumed).
+            input_format: 'text' (one text per line, the id is the record number),
+                'tsv' (one 'id<TAB>text' per line) or 'tweets' (the ';'-separated tweet files with id, text, language).
+            output_format: 'csv' or 'jsonl'.
+            n_highest_probs: Number of most probable languages written for each text.
+            resume: If True, continue after the records written by an interrupted run (according to the sidecar file).
+
+        Returns:
+            num_records: Number of records in the output ('None' if the classification failed).
+        """
+        if (input_format not in INPUT_FORMATS or output_format not in OUTPUT_FORMATS):
+            print('ERROR: Unknown input format "%s" or output format "%s".' % (input_format, output_format), file=sys.stderr)
+            return None
+        num_done_records = 0
+        if (output_rel_path == '-'):
+            output_file = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', line_buffering=False)
+            offset_rel_path = None
+        else:
+            offset_rel_path = output_rel_path + '.offset'
+            num_done_bytes = 0
+            if (resume and os.path.isfile(offset_rel_path) and os.path.isfile(output_rel_path)):
+                with open(offset_rel_path, 'r') as offset_file:
+                    offset = json.load(offset_file)
+                num_done_records = offset['records']
+                num_done_bytes = offset['bytes']
+                print('Resuming after', num_done_records, 'records.', file=sys.stderr)
+            # drop a partially written batch of an interrupted run
+            with open(output_rel_path, 'ab') as output_file:
+                output_file.truncate(num_done_bytes)
+            output_file = open(output_rel_path, 'a', encoding='utf-8', newline='')
+        
+        try:
+            writer = self.__create_writer(output_file, output_format, n_highest_probs, is_new_file=num_done_records == 0)
+            records = self.__iter_records(input_rel_paths, input_format)
+            # the records of the interrupted run are read again, but not classified
+            for _ in range(num_done_records):
+                if (next(records, None) is None):
+                    break
+            num_records = num_done_records
+            for ids, lang_predictions in self.__iter_classified_batches(self.__iter_batches(records), n_highest_probs):
+                for record_id, lang_prediction in zip(ids, lang_predictions):
+                    writer(record_id, lang_prediction)
+                num_records += len(ids)
+                output_file.flush()
+                if (offset_rel_path is not None):
+                    os.fsync(output_file.fileno())
+                    self.__write_offset(offset_rel_path, num_records, os.fstat(output_file.fileno()).st_size)
+            return num_records
+        except Exception as e:
+            print('ERROR: Bulk classification failed (rerun to resume):', e, file=sys.stderr)
+            return None
+        finally:
+            if (output_rel_path == '-'):
+                output_file.detach()
+            else:
+                output_file.close()
+
+    def __iter_records(self, input_rel_paths, input_format):
+        """
+        Lazily reads the records of all inputs in order.
+        
+        Yields:
+            Tuples in the form: (record_id, text).
+        """
+        record_i = 0
+        for input_rel_path in self.__expand_input_rel_paths(input_rel_paths):
+            if (input_rel_path == '-'):
+                input_file = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', errors='replace', newline='')
+            else:
+                input_file = open(input_rel_path, 'r', encoding='utf-8', errors='replace', newline='')
+            try:
+                if (input_format == 'tweets'):
+                    for row in csv.reader(input_file, delimiter=';'):
+                        if (len(row) >= 2):
+                            yield (row[0], row[1])
+                else:
+                    for line in input_file:
+                        line = line.rstrip('\r\n')
+                        if (input_format == 'tsv'):
+                            record_id, _, text = line.partition('\t')
+                        else:
+                            record_id, text = str(record_i), line
+                        record_i += 1
+                        yield (record_id, text)
+            finally:
+                if (input_rel_path == '-'):
+                    input_file.detach()
+                else:
+                    input_file.close()
+
+    def __expand_input_rel_paths(self, input_rel_paths):
+        """
+        Replaces directories and glob patterns by their files in sorted order, so the shards are always read in the same order.
+        """
+        expanded_rel_paths = []
+        for input_rel_path in input_rel_paths:
+            if (input_rel_path == '-' or os.path.isfile(input_rel_path)):
+                expanded_rel_paths.append(input_rel_path)
+            elif (os.path.isdir(input_rel_path)):
+                expanded_rel_paths += sorted([os.path.join(input_rel_path, file_name) for file_name in os.listdir(input_rel_path)
+                                              if os.path.isfile(os.path.join(input_rel_path, file_name))])
+            else:
+                matching_rel_paths = sorted(glob.glob(input_rel_path))
+                if (matching_rel_paths == []):
+                    print('ERROR: No input files found for', input_rel_path, file=sys.stderr)
+                expanded_rel_paths += matching_rel_paths
+        return expanded_rel_paths
+
+    def __iter_batches(self, records):
+        """
+        Groups the records into batches of bulk_batch_size.
+        
+        Yields:
+            Tuples in the form: (ids, texts).
+        """
+        ids = []
+        texts = []
+        for record_id, text in records:
+            ids.append(record_id)
+            texts.append(text)
+            if (len(texts) == self.batch_size):
+                yield (ids, texts)
+                ids = []
+                texts = []
+        if (texts != []):
+            yield (ids, texts)
+
+    def __iter_classified_batches(self, batches, n_highest_probs):
+        """
+        Classifies the batches in one process or with the worker processes.
+        
+        Yields:
+            Tuples in the form: (ids, lang_predictions), in the order of the batches.
+        """
+        if (self.num_workers <= 1):
+            for ids, texts in batches:
+                yield (ids, self.language_identifier.classify(texts, n_highest_probs))
+            return
+        
+        # share the threads of the machine between the workers, so they do not oversubscribe the cores
+        num_threads_per_worker = max(1, torch.get_num_threads() // self.num_workers)
+        context = mp.get_context('fork')
+        task_queue = context.Queue()
+        result_queue = context.Queue()
+        workers = []
+        for rank in range(self.num_workers):
+            worker = context.Process(target=self.__run_worker,
+                                     args=(rank, num_threads_per_worker, n_highest_probs, task_queue, result_queue))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        
+        try:
+            # the window of batches in flight bounds the memory, the results are reordered into input order
+            max_in_flight = 2 * self.num_workers
+            pending_ids = {}
+            finished_results = {}
+            next_submit_i = 0
+            next_yield_i = 0
+            is_input_done = False
+            while (not is_input_done or next_yield_i < next_submit_i):
+                while (not is_input_done and next_submit_i - next_yield_i < max_in_flight):
+                    batch = next(batches, None)
+                    if (batch is None):
+                        is_input_done = True
+                    else:
+                        ids, texts = batch
+                        pending_ids[next_submit_i] = ids
+                        task_queue.put((next_submit_i, texts))
+                        next_submit_i += 1
+                if (next_yield_i == next_submit_i):
+                    break
+                try:
+                    batch_i, lang_predictions = result_queue.get(timeout=1)
+                except queue.Empty:
+                    # a worker process killed from outside never sends its result
+                    if (not all([worker.is_alive() for worker in workers])):
+                        raise RuntimeError('bulk classification worker process died')
+                    continue
+                if (lang_predictions is None):
+                    raise RuntimeError('bulk classification worker process failed')
+                finished_results[batch_i] = lang_predictions
+                while (next_yield_i in finished_results):
+                    yield (pending_ids.pop(next_yield_i), finished_results.pop(next_yield_i))
+                    next_yield_i += 1
+        finally:
+            for worker in workers:
+                if (worker.is_alive()):
+                    task_queue.put(None)
+            for worker in workers:
+                worker.join(timeout=10)
+                if (worker.is_alive()):
+                    worker.terminate()
+
+    def __run_worker(self, rank, num_threads, n_highest_probs, task_queue, result_queue):
+        """
+        Entry point of one worker process.
+        
+        Args:
+            rank: Rank of the worker process.
+            num_threads: Number of threads the worker may use for intra-op parallelism.
+            n_highest_probs: Number of most probable languages returned for each text.
+            task_queue: Queue of (batch_i, texts), terminated by 'None'.
+            result_queue: Queue the (batch_i, lang_predictions) are put into ('None' predictions on failure).
+        """
+        torch.set_num_threads(num_threads)
+        task = task_queue.get()
+        while (task is not None):
+            batch_i, texts = task
+            try:
+                result_queue.put((batch_i, self.language_identifier.classify(texts, n_highest_probs)))
+            except Exception as e:
+                print('ERROR: Bulk classification worker', rank, 'failed:', e, file=sys.stderr)
+                result_queue.put((batch_i, None))
+                return
+            task = task_queue.get()
+
+    def __create_writer(self, output_file, output_format, n_highest_probs, is_new_file):
+        """
+        Creates the function writing one result row.
+        
+        Returns:
+            write_row: Function of (record_id, lang_prediction), where lang_prediction is a list of (language_tag, probability).
+        """
+        if (output_format == 'jsonl'):
+            def write_row(record_id, lang_prediction):
+                output_file.write(json.dumps({'id': record_id,
+                                              'langs': [lang for lang, _ in lang_prediction],
+                                              'probs': [round(prob, 6) for _, prob in lang_prediction]}) + '\n')
+            return write_row
+        
+        csv_writer = csv.writer(output_file, lineterminator='\n')
+        if (is_new_file):
+            header = ['id']
+            for i in range(1, n_highest_probs + 1):
+                header += ['lang_%d' % i, 'prob_%d' % i]
+            csv_writer.writerow(header)
+        
+        def write_row(record_id, lang_prediction):
+            row = [record_id]
+            for lang, prob in lang_prediction:
+                row += [lang, '%.6f' % prob]
+            # texts without any known character have no prediction
+            row += [''] * (1 + 2 * n_highest_probs - len(row))
+            csv_writer.writerow(row)
+        return write_row
+
+    def __write_offset(self, offset_rel_path, num_records, num_bytes):
+        """
+        Atomically replaces the sidecar file with the number of written records and the size of the output file.
+        """
+        temp_rel_path = offset_rel_path + '.tmp'
+        with open(temp_rel_path, 'w') as offset_file:
+            json.dump({'records': num_records, 'bytes': num_bytes}, offset_file)
+        os.replace(temp_rel_path, offset_rel_path)
\ No newline at end of file
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+from __future__ import division
+import copy
+import os
+import time
+from input import InputData
+from evaluation import LanguageIdentifier, MetricsAccumulator, RNNEvaluator
+
+
+class CheckpointComparison(object):
+    """Class comparing several RNN model checkpoints on one data set in a single pass over the data.
+    
+    The data set file is read and filtered only once, lazily batch by batch. Every batch is indexed once
+    per vocabulary and embedded once per embedding weights file, and then evaluated by every model
+    sharing this vocabulary and embedding. Every embedding weights file is loaded only once.
+    """
+    
+    def __init__(self, system_param_dict):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+        """
+        self.system_param_dict = system_param_dict
+        self.cuda_is_avail = system_param_dict['cuda_is_avail']
+
+    def compare(self, checkpoint_and_embed_rel_paths, data_rel_path=None):
+        """
+        Evaluates the checkpoints on the data set and prints a comparison table.
+        
+        Args:
+            checkpoint_and_embed_rel_paths: List of [RNN model checkpoint path, embedding weights path] pairs.
+            data_rel_path: Relative path to the tweet file (default: out_te_data_rel_path).
+
+        Returns:
+            results: List of dicts with the results of each checkpoint (checkpoint, embed_weights, num_tweets,
+                mean_loss, accuracy, f1_score as dict of {language: f1 score}, tweets_per_second), in the order of the checkpoints.
+        """
+        if (data_rel_path is None):
+            data_rel_path = self.system_param_dict['out_te_data_rel_path']
+        input_data = InputData.InputData()
+        embeds = {}
+        input_embeds = {}
+        language_identifiers = []
+        # the inputs are float32 embeddings, so the checkpoints are compared in float32
+        # (a reduced inference_precision is compared by benchmark.InferencePrecisionBenchmark)
+        comparison_param_dict = dict(self.system_param_dict)
+        comparison_param_dict['inference_precision'] = 'float32'
+        for checkpoint_rel_path, embed_rel_path in checkpoint_and_embed_rel_paths:
+            if (embed_rel_path not in embeds):
+                embeds[embed_rel_path] = input_data.create_embed_from_weights_file(embed_rel_path)
+                # the inputs are embedded on the CPU and moved to the GPU afterwards
+                input_embeds[embed_rel_path] = copy.deepcopy(embeds[embed_rel_path][0])
+            language_identifiers.append(LanguageIdentifier.LanguageIdentifier(comparison_param_dict,
+                                                                              model_checkpoint_rel_path=checkpoint_rel_path,
+                                                                              embed_weights_rel_path=embed_rel_path,
+                                                                              embed_and_num_classes=embeds[embed_rel_path]))
+        groups = self.__group_by_vocab_and_embed(language_identifiers, [embed_rel_path for _, embed_rel_path in checkpoint_and_embed_rel_paths])
+        rnn_evaluators = [RNNEvaluator.RNNEvaluator(language_identifier.model) for language_identifier in language_identifiers]
+        accumulators = [MetricsAccumulator.MetricsAccumulator(len(language_identifier.vocab_lang)) for language_identifier in language_identifiers]
+        eval_seconds = [0.0] * len(language_identifiers)
+        
+        start_time = time.time()
+        for filtered_batch in input_data.iter_filtered_data_batches(data_rel_path=data_rel_path,
+                                                                    batch_size=self.system_param_dict['test_batch_size_rnn'],
+                                                                    fetch_only_langs=self.system_param_dict['fetch_only_langs'],
+                                                                    fetch_only_first_x_tweets=self.system_param_dict['fetch_only_first_x_tweets']):
+            for vocab_chars, vocab_lang, embed_groups in groups:
+                indexed_batch = input_data.get_single_indexed_data(filtered_batch, vocab_lang, vocab_chars)
+                if (indexed_batch == []):
+                    continue
+                for embed_rel_path, identifier_indices in embed_groups:
+                    inputs, targets = input_data.create_embed_input_and_target_tensors(indexed_texts_and_lang=indexed_batch,
+                                                                                       embed_weights_rel_path=None,
+                                                                                       embed=input_embeds[embed_rel_path])
+                    if (self.cuda_is_avail):
+                        inputs = [tensor.cuda() for tensor in inputs]
+                        targets = [tensor.cuda() for tensor in targets]
+                    for i in identifier_indices:
+                        eval_start_time = time.time()
+                        rnn_evaluators[i].accumulate_metrics([(inputs, targets)], len(language_identifiers[i].vocab_lang), accumulators[i])
+                        eval_seconds[i] += time.time() - eval_start_time
+        total_seconds = time.time() - start_time
+        
+        results = []
+        for i, language_identifier in enumerate(language_identifiers):
+            accumulator = accumulators[i]
+            if (accumulator.num_samples == 0):
+                print('ERROR: No tweet of the data set could be evaluated with checkpoint', language_identifier.model_checkpoint_rel_path)
+                continue
+            f1_score = accumulator.f1_score()
+            results.append({'checkpoint': language_identifier.model_checkpoint_rel_path,
+                            'embed_weights': language_identifier.embed_weights_rel_path,
+                            'num_tweets': accumulator.num_samples,
+                            'mean_loss': accumulator.mean_loss(),
+                            'accuracy': accumulator.accuracy(),
+                            'f1_score': {language_identifier.index2lang[lang_i]: f1_score[lang_i] for lang_i in range(len(f1_score))},
+                            'tweets_per_second': accumulator.num_samples / max(eval_seconds[i], 1e-9)})
+        self.__print_table(results, total_seconds, sum(eval_seconds))
+        return results
+
+    def __group_by_vocab_and_embed(self, language_identifiers, embed_rel_paths):
+        """
+        Groups the models by their vocabularies and, within a vocabulary, by their embedding weights file.
+        
+        Args:
+            language_identifiers: The loaded models.
+            embed_rel_paths: Embedding weights path of each model.
+
+        Returns:
+            groups: List of (vocab_chars, vocab_lang, embed_groups) tuples,
+                with embed_groups being a list of (embed_rel_path, model indices) tuples.
+        """
+        groups = []
+        for i, language_identifier in enumerate(language_identifiers):
+            group = None
+            for vocab_chars, vocab_lang, embed_groups in groups:
+                if (vocab_chars == language_identifier.vocab_chars and vocab_lang == language_identifier.vocab_lang):
+                    group = embed_groups
+                    break
+            if (group is None):
+                group = []
+                groups.append((language_identifier.vocab_chars, language_identifier.vocab_lang, group))
+            for embed_rel_path, identifier_indices in group:
+                if (embed_rel_path == embed_rel_paths[i]):
+                    identifier_indices.append(i)
+                    break
+            else:
+                group.append((embed_rel_paths[i], [i]))
+        return groups
+
+    def __print_table(self, results, total_seconds, eval_seconds):
+        """
+        Prints the comparison table to the console.
+        
+        Args:
+            results: Results of each checkpoint (see compare).
+            total_seconds: Duration of the whole pass over the data.
+            eval_seconds: Summed up duration of the evaluations of all models.
+        """
+        langs = sorted(set([lang for result in results for lang in result['f1_score']]))
+        print('========================================')
+        print('Checkpoint comparison:')
+        print('#\tTweets\tMean loss\tAccuracy\tTweets/s\tCheckpoint (embedding weights)')
+        for i, result in enumerate(results):
+            print('%d\t%d\t%.4f\t\t%.4f\t\t%.1f\t\t%s (%s)' % (i, result['num_tweets'], result['mean_loss'], result['accuracy'],
+                                                              result['tweets_per_second'], os.path.basename(result['checkpoint']),
+                                                              os.path.basename(result['embed_weights'])))
+        print('========================================')
+        print('F1 score:')
+        print('#\t' + '\t'.join(langs))
+        for i, result in enumerate(results):
+            print('%d\t' % i + '\t'.join([('%.3f' % result['f1_score'][lang]) if lang in result['f1_score'] else '-' for lang in langs]))
+        print('========================================')
+        print('Seconds: %.2f (reading and preprocessing the data: %.2f)' % (total_seconds, total_seconds - eval_seconds))
\ No newline at end of file
@@ -65,4 +65,4 @@ class EmbeddingEvaluator(object):
                 contexts_0_pos_samples = contexts_0_pos_samples.cuda()         
 
             batch_mean_loss = self.model.forward(targets_1_pos, contexts_1_pos, contexts_0_pos_samples)
-        return batch_mean_loss.data[0]
\ No newline at end of file
+        return batch_mean_loss.item()
\ No newline at end of file
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+import collections
+import sys
+import threading
+import time
+import torch
+
+
+class IncrementalClassifier(object):
+    """Class for classifying texts that grow over time (typing, streamed message fragments, thread continuations).
+    
+    For every session the hidden state of the unidirectional GRU and the running sums needed by the classification
+    head (probability and log probability sums for per_char, the state sum for mean_pool) are kept, so an update
+    only feeds the characters appended since the previous update through the network.
+    The filter for hashtags, @-names and URLs starts over after every space, so the raw text up to the last space
+    is cleaned and consumed for good: the session keeps the state at that boundary and only the raw text after it
+    (the tail) is cleaned and indexed again by an update. If the cleaned and indexed tail does not continue the
+    characters consumed so far (e.g. a completed URL is now filtered out), the session goes back to the state at
+    the boundary; if the text before the boundary was edited, the session starts over from the initial hidden state.
+    Sessions idle for more than session_max_idle_seconds are evicted, and the least recently updated session is
+    evicted beyond session_max_count sessions.
+    """
+    
+    def __init__(self, system_param_dict, language_identifier):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+            language_identifier: LanguageIdentifier with a unidirectional model.
+        """
+        self.language_identifier = language_identifier
+        self.model = language_identifier.model
+        self.max_sessions = system_param_dict['session_max_count']
+        self.max_idle_seconds = system_param_dict['session_max_idle_seconds']
+        self.__sessions = collections.OrderedDict()
+        # guards only the session dict; the forward pass of a session holds the session's own lock
+        self.__lock = threading.Lock()
+        # the bidirectional fallback keeps no sessions and is reported once, on its first use
+        self.__fallback_reported = False
+
+    def update(self, session_id, text, n_highest_probs=1):
+        """
+        Classifies the current text of a session (a bidirectional model classifies the whole text every time).
+        
+        Args:
+            session_id: Hashable id of the session (a new session is created for an unknown id).
+            text: The whole raw text of the session so far.
+            n_highest_probs: Number of most probable languages returned.
+
+        Returns:
+            The n most probable (language_tag, probability) pairs (empty if the text has no vocabulary character).
+        """
+        if (self.model.is_bidirectional):
+            return self.__classify_whole_text(text, n_highest_probs)
+        session = self.__get_session(session_id)
+        with session['lock']:
+            raw_prefix = self.__raw_prefix(session)
+            if (text.startswith(raw_prefix)):
+                raw_tail = text[len(raw_prefix):]
+            else:
+                self.__reset(session)
+                raw_tail = text
+            self.__advance(session, raw_tail)
+            return self.__top_langs(session['state'], n_highest_probs)
+
+    def append(self, session_id, text_fragment, n_highest_probs=1):
+        """
+        Appends a fragment to the raw text of a session and classifies the result (see update).
+        """
+        if (self.model.is_bidirectional):
+            return self.__classify_whole_text(text_fragment, n_highest_probs)
+        session = self.__get_session(session_id)
+        with session['lock']:
+            self.__advance(session, session['raw_tail'] + text_fragment)
+            return self.__top_langs(session['state'], n_highest_probs)
+
+    def end(self, session_id):
+        """
+        Removes a session.
+        """
+        with self.__lock:
+            self.__sessions.pop(session_id, None)
+
+    def num_sessions(self):
+        with self.__lock:
+            return len(self.__sessions)
+
+    def __classify_whole_text(self, text, n_highest_probs):
+        if (not self.__fallback_reported):
+            self.__fallback_reported = True
+            print('ERROR: Incremental classification needs a unidirectional model, every update classifies the whole text instead.', file=sys.stderr)
+        return self.language_identifier.classify([text], n_highest_probs)[0]
+
+    def __get_session(self, session_id):
+        """
+        Returns:
+            The session of the id (created if unknown), moved to the end of the eviction order.
+        """
+        with self.__lock:
+            now = time.time()
+            session = self.__sessions.pop(session_id, None)
+            self.__evict(now)
+            if (session is None):
+                session = {'lock': threading.Lock()}
+                self.__reset(session)
+            session['last_used'] = now
+            self.__sessions[session_id] = session
+            return session
+
+    def __reset(self, session):
+        """
+        Starts the session over from the initial hidden state and an empty text.
+        """
+        initial_state = {'hidden': None,
+                         'prob_sums': torch.zeros(self.model.num_classes),
+                         'log_prob_sums': torch.zeros(self.model.num_classes),
+                         'state_sum': None,
+                         'last_output': None,
+                         'num_chars': 0}
+        session['state'] = initial_state
+        # state after the raw text up to the boundary (the last consumed space)
+        session['boundary_state'] = initial_state
+        # raw text up to the boundary, in the pieces it was consumed in (joined on the next update)
+        session['raw_prefix_parts'] = []
+        session['raw_tail'] = ''
+        session['tail_indexed'] = []
+
+    def __raw_prefix(self, session):
+        raw_prefix_parts = session['raw_prefix_parts']
+        if (len(raw_prefix_parts) > 1):
+            raw_prefix_parts[:] = [''.join(raw_prefix_parts)]
+        return raw_prefix_parts[0] if raw_prefix_parts != [] else ''
+
+    def __advance(self, session, raw_tail):
+        """
+        Cleans and indexes the raw text after the boundary and consumes the characters not consumed yet;
+        moves the boundary behind the last space of the tail.
+        """
+        language_identifier = self.language_identifier
+        cut = raw_tail.rfind(' ') + 1
+        boundary_indexed = language_identifier.index_text(language_identifier.clean_text(raw_tail[:cut]))
+        tail_indexed = language_identifier.index_text(language_identifier.clean_text(raw_tail[cut:]))
+        indexed = boundary_indexed + tail_indexed
+        num_consumed = len(session['tail_indexed'])
+        if (indexed[:num_consumed] != session['tail_indexed']
+            or (cut > 0 and num_consumed > len(boundary_indexed))):
+            session['state'] = session['boundary_state']
+            num_consumed = 0
+        if (cut > 0):
+            self.__consume(session, boundary_indexed[num_consumed:])
+            session['boundary_state'] = session['state']
+            session['raw_prefix_parts'].append(raw_tail[:cut])
+            num_consumed = 0
+        self.__consume(session, tail_indexed[num_consumed:])
+        session['raw_tail'] = raw_tail[cut:]
+        session['tail_indexed'] = tail_indexed
+
+    def __consume(self, session, new_indices):
+        """
+        Feeds the new characters through the GRU, starting from the session's hidden state.
+        The state is replaced instead of updated in place, so the boundary state stays valid.
+        """
+        if (new_indices == []):
+            return
+        language_identifier = self.language_identifier
+        state = dict(session['state'])
+        indices = torch.LongTensor(new_indices).view(-1, 1)
+        if (language_identifier.cuda_is_avail):
+            indices = indices.cuda()
+        with torch.no_grad():
+            embedded = language_identifier.embed(indices)
+            if (language_identifier.input_dtype is not None):
+                embedded = embedded.to(language_identifier.input_dtype)
+            if (state['hidden'] is None):
+                output, hidden = self.model.gru_layer(embedded)
+            else:
+                output, hidden = self.model.gru_layer(embedded, state['hidden'])
+            state['hidden'] = hidden
+            state['num_chars'] += len(new_indices)
+            if (self.model.classification_head == 'per_char'):
+                log_probs, _ = self.model.classify_states(output)
+                log_probs = log_probs[:, 0].float().cpu()
+                state['prob_sums'] = state['prob_sums'] + log_probs.exp().sum(0)
+                state['log_prob_sums'] = state['log_prob_sums'] + log_probs.sum(0)
+            elif (self.model.classification_head == 'mean_pool'):
+                state_sum = output[:, 0].float().sum(0)
+                if (state['state_sum'] is not None):
+                    state_sum += state['state_sum']
+                state['state_sum'] = state_sum
+            else:
+                state['last_output'] = output[-1:]
+        session['state'] = state
+
+    def __top_langs(self, state, n_highest_probs):
+        """
+        Returns:
+            The n most probable (language_tag, probability) pairs of the session's text.
+        """
+        if (state['num_chars'] == 0):
+            return []
+        if (self.model.classification_head == 'per_char'):
+            probs = state['prob_sums'] / state['num_chars']
+        else:
+            # a single state is classified by the tweet-level heads like a text of one character
+            if (self.model.classification_head == 'mean_pool'):
+                state_mean = (state['state_sum'] / state['num_chars']).view(1, 1, -1).to(state['hidden'].dtype)
+            else:
+                state_mean = state['last_output']
+            with torch.no_grad():
+                log_probs, _ = self.model.classify_states(state_mean)
+            probs = log_probs[0, 0].float().cpu().exp()
+        top_probs, top_indices = self.language_identifier.evaluator.top_langs(probs.unsqueeze(0), n_highest_probs)
+        return [(self.language_identifier.index2lang[lang_i], prob)
+                for prob, lang_i in zip(top_probs[0].tolist(), top_indices[0].tolist())]
+
+    def __evict(self, now):
+        """
+        Evicts the idle sessions and the least recently updated ones beyond max_sessions.
+        The sessions are ordered by their last update, so only the front has to be checked.
+        """
+        while (self.__sessions):
+            oldest_id = next(iter(self.__sessions))
+            if (now - self.__sessions[oldest_id]['last_used'] <= self.max_idle_seconds
+                and len(self.__sessions) < self.max_sessions):
+                break
+            del self.__sessions[oldest_id]
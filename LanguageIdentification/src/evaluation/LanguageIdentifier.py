@@ -0,0 +1,527 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+from __future__ import division
+import collections
+import os
+import sys
+import torch
+from torch import nn
+from input import InputData
+from net import GRUModel, InferenceArtifact, NgramClassifier
+from evaluation import RNNEvaluator, PredictionCache, ScriptClassifier
+
+
+class LanguageIdentifier(object):
+    """Class for the batched language identification of raw texts with a trained RNN model checkpoint.
+    
+    The model, the embedding and the vocabularies are loaded once. Texts are cleaned and indexed,
+    sorted by length and packed into batches, so every batch is classified in one forward pass without autograd.
+    """
+    
+    def __init__(self, system_param_dict, model_checkpoint_rel_path=None, embed_weights_rel_path=None, embed_and_num_classes=None,
+                 artifact_rel_path=None, prediction_cache=None):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+            model_checkpoint_rel_path: Relative path to the RNN model checkpoint
+                (default: trained_model_checkpoint_rel_path).
+            embed_weights_rel_path: Relative path to the embedding weights used by the checkpoint
+                (default: trained_embed_weights_rel_path).
+            embed_and_num_classes: If not 'None', the (embed, num_classes) tuple already loaded from embed_weights_rel_path
+                (see InputData.create_embed_from_weights_file), so models with the same embedding share it.
+            artifact_rel_path: If not 'None', the model, the embedding and the vocabularies are loaded from this
+                inference artifact (see InferenceArtifact) instead of the checkpoint and the embedding weights file.
+            prediction_cache: If not 'None', the PredictionCache used by classify (may be shared by several models);
+                else one is created if prediction_cache_size > 0.
+        """
+        if (model_checkpoint_rel_path is None):
+            model_checkpoint_rel_path = system_param_dict['trained_model_checkpoint_rel_path']
+        if (embed_weights_rel_path is None):
+            embed_weights_rel_path = system_param_dict['trained_embed_weights_rel_path']
+        self.system_param_dict = system_param_dict
+        self.model_checkpoint_rel_path = model_checkpoint_rel_path
+        self.embed_weights_rel_path = embed_weights_rel_path
+        self.batch_size = system_param_dict['inference_batch_size']
+        self.cuda_is_avail = system_param_dict['cuda_is_avail']
+        self.input_data = InputData.InputData()
+        if (artifact_rel_path is not None):
+            self.model_checkpoint_rel_path = artifact_rel_path
+            self.embed_weights_rel_path = artifact_rel_path
+            self.__load_artifact(artifact_rel_path)
+        else:
+            self.__load_checkpoint(model_checkpoint_rel_path, embed_weights_rel_path, embed_and_num_classes)
+        self.model.eval()
+        if (self.cuda_is_avail):
+            self.model.cuda()
+            self.embed.cuda()
+        self.vocab_chars = self.model.vocab_chars
+        self.vocab_lang = self.model.vocab_lang
+        self.char2index, _ = self.input_data.get_string2index_and_index2string(self.vocab_chars)
+        self.lang2index, self.index2lang = self.input_data.get_string2index_and_index2string(self.vocab_lang)
+        self.input_dtype = None
+        self.inference_precision = 'float32'
+        self.__apply_inference_precision(system_param_dict['inference_precision'])
+        self.evaluator = RNNEvaluator.RNNEvaluator(self.model)
+        # stop consuming the characters of a text once its language is settled
+        self.early_exit_threshold = system_param_dict['early_exit_threshold']
+        self.early_exit_patience = system_param_dict['early_exit_patience']
+        if (self.early_exit_threshold is not None
+            and (self.model.is_bidirectional or self.model.classification_head != 'per_char')):
+            print('ERROR: Early exit needs a unidirectional model with the per_char classification head, classifying whole texts instead.', file=sys.stderr)
+            self.early_exit_threshold = None
+        self.script_classifier = None
+        if (system_param_dict['script_fast_path']):
+            self.script_classifier = ScriptClassifier.ScriptClassifier(system_param_dict, self.vocab_lang)
+        # confidently classified texts of the n-gram classifier stored alongside the model do not need the GRU
+        self.ngram_classifier = None
+        self.ngram_margin = system_param_dict['ngram_margin']
+        if (system_param_dict['ngram_cascade']):
+            self.ngram_classifier = self.__load_ngram_classifier(NgramClassifier.NgramClassifier.rel_path_for(self.model_checkpoint_rel_path))
+        # predictions of duplicate texts are taken from the cache
+        if (prediction_cache is None and system_param_dict['prediction_cache_size'] > 0):
+            prediction_cache = PredictionCache.PredictionCache(system_param_dict['prediction_cache_size'],
+                                                               system_param_dict['prediction_cache_rel_path'])
+        self.prediction_cache = prediction_cache
+        # everything that changes the predictions of the model, so a cache file of another model or setting is not used
+        # (the script fast path and the n-gram cascade do not matter, only predictions of the GRU are cached)
+        self.model_id = '|'.join([self.__file_stamp(self.model_checkpoint_rel_path),
+                                  self.__file_stamp(self.embed_weights_rel_path),
+                                  self.inference_precision,
+                                  str(system_param_dict['max_eval_chunk_len_rnn']),
+                                  str(self.early_exit_threshold),
+                                  str(self.early_exit_patience)])
+
+    def __file_stamp(self, rel_path):
+        """
+        Returns:
+            String of the absolute path, the modification time in nanoseconds and the size of a file.
+        """
+        stat = os.stat(rel_path)
+        return '%s:%d:%d' % (os.path.abspath(rel_path), stat.st_mtime_ns, stat.st_size)
+
+    def __load_checkpoint(self, model_checkpoint_rel_path, embed_weights_rel_path, embed_and_num_classes):
+        """
+        Loads the model from a training checkpoint and the embedding from its weights file.
+        
+        Args:
+            model_checkpoint_rel_path: Relative path to the RNN model checkpoint.
+            embed_weights_rel_path: Relative path to the embedding weights used by the checkpoint.
+            embed_and_num_classes: If not 'None', the (embed, num_classes) tuple already loaded from embed_weights_rel_path.
+        """
+        if (embed_and_num_classes is None):
+            embed_and_num_classes = self.input_data.create_embed_from_weights_file(embed_weights_rel_path)
+        self.embed, num_classes = embed_and_num_classes
+        
+        # checkpoints trained on the GPU can also be loaded on the CPU
+        if (self.cuda_is_avail):
+            state = torch.load(model_checkpoint_rel_path)
+        else:
+            state = torch.load(model_checkpoint_rel_path, map_location=lambda storage, location: storage)
+        # the architecture is taken from the checkpoint, so it does not have to match the YAML settings file
+        model_param_dict = dict(self.system_param_dict)
+        for key in ['hidden_size_rnn', 'num_layers_rnn', 'is_bidirectional']:
+            model_param_dict[key] = state['system_param_dict'][key]
+        # checkpoints from before the classification head option have the per_char head
+        model_param_dict['classification_head_rnn'] = state['system_param_dict'].get('classification_head_rnn', 'per_char')
+        self.model = GRUModel.GRUModel(vocab_chars={},
+                                       vocab_lang={},
+                                       input_size=self.embed.weight.size()[1],    # equals embedding dimension
+                                       num_classes=num_classes,
+                                       system_param_dict=model_param_dict,
+                                       with_optimizer=False)
+        self.model.load_model_checkpoint(state)
+        print('Model checkpoint loaded from file:', model_checkpoint_rel_path, file=sys.stderr)
+        self.results_dict = state['results_dict']
+
+    def __load_artifact(self, artifact_rel_path):
+        """
+        Loads the model, the embedding and the vocabularies from an inference artifact.
+        The float32 weights are used directly from the memory mapped file.
+        
+        Args:
+            artifact_rel_path: Relative path to the inference artifact.
+        """
+        header, tensors = InferenceArtifact.InferenceArtifact().load(artifact_rel_path)
+        if (header is None):
+            raise ValueError('Cannot load the inference artifact: ' + artifact_rel_path)
+        model_param_dict = dict(self.system_param_dict)
+        for key in ['hidden_size_rnn', 'num_layers_rnn', 'is_bidirectional', 'classification_head_rnn']:
+            model_param_dict[key] = header['model'][key]
+        embed_weight = tensors.pop('embed.weight')
+        self.embed = nn.Embedding.from_pretrained(embed_weight, freeze=True)
+        # the artifact has no character frequencies
+        self.model = GRUModel.GRUModel(vocab_chars={char: (index, 0) for index, char in enumerate(header['index2char'])},
+                                       vocab_lang={lang: (index, 0) for index, lang in enumerate(header['index2lang'])},
+                                       input_size=embed_weight.size()[1],
+                                       num_classes=header['model']['num_classes'],
+                                       system_param_dict=model_param_dict,
+                                       with_optimizer=False)
+        # replace the parameters instead of copying into them
+        for name, param in self.model.named_parameters():
+            param.data = tensors[name]
+        self.model.gru_layer.flatten_parameters()
+        print('Inference artifact loaded from file:', artifact_rel_path, file=sys.stderr)
+        self.results_dict = {}
+
+    def __apply_inference_precision(self, inference_precision):
+        """
+        Converts the model to the precision used for the inference.
+        The embedding itself stays in float32 (it may be shared with other models), its output is converted.
+        
+        Args:
+            inference_precision: 'float32', 'int8' (dynamic quantization of the GRU and the output layer weights,
+                the activations are quantized on the fly; CPU only) or 'bfloat16'.
+                The precision actually applied is stored in inference_precision; an unsupported one falls back to float32.
+        """
+        if (inference_precision == 'int8'):
+            if (self.cuda_is_avail):
+                print('ERROR: int8 inference is only supported on the CPU, using float32 instead.', file=sys.stderr)
+                return
+            if (not hasattr(torch, 'quantization') or not hasattr(torch.quantization, 'quantize_dynamic')):
+                print('ERROR: int8 inference needs PyTorch v1.3 or newer (torch.quantization.quantize_dynamic), using float32 instead.', file=sys.stderr)
+                return
+            quantized_model = torch.quantization.quantize_dynamic(self.model, {nn.GRU, nn.Linear}, dtype=torch.qint8)
+            # some releases quantize only the linear layers and leave the GRU in float32
+            if (type(quantized_model.gru_layer) is nn.GRU):
+                print('ERROR: This PyTorch version does not quantize the GRU dynamically, using float32 instead.', file=sys.stderr)
+                return
+            self.model = quantized_model
+        elif (inference_precision == 'bfloat16'):
+            if (not self.__supports_bfloat16()):
+                print('ERROR: bfloat16 inference is not supported by this PyTorch version on this device (no bfloat16 GRU), using float32 instead.', file=sys.stderr)
+                return
+            self.model.to(torch.bfloat16)
+            self.input_dtype = torch.bfloat16
+        elif (inference_precision != 'float32'):
+            print('ERROR: Unknown inference_precision', inference_precision, '(float32, int8 or bfloat16), using float32 instead.', file=sys.stderr)
+            return
+        self.inference_precision = inference_precision
+
+    def __supports_bfloat16(self):
+        """
+        Checks whether the installed PyTorch runs a GRU and a linear layer in bfloat16 on the device of the model,
+        so an unsupported version fails at load time instead of in the middle of a classification.
+
+        Returns:
+            True if a tiny bfloat16 GRU and linear layer can be run, else False.
+        """
+        if (not hasattr(torch, 'bfloat16')):
+            return False
+        gru = nn.GRU(2, 2).to(torch.bfloat16)
+        linear = nn.Linear(2, 2).to(torch.bfloat16)
+        inp = torch.zeros(1, 1, 2, dtype=torch.bfloat16)
+        if (self.cuda_is_avail):
+            gru.cuda()
+            linear.cuda()
+            inp = inp.cuda()
+        try:
+            with torch.no_grad():
+                output, _ = gru(inp)
+                linear(output)
+        except (RuntimeError, TypeError):
+            return False
+        return True
+
+    def classify(self, texts, n_highest_probs=1):
+        """
+        Classifies raw texts.
+        
+        Args:
+            texts: List of raw texts.
+            n_highest_probs: Number of most probable languages returned for each text.
+
+        Returns:
+            List of the n most probable (language_tag, probability) pairs for each text, in the order of the texts.
+            The list is empty for texts without any vocabulary character after the cleaning,
+            and a text routed by its script (see script_fast_path) only has its language with probability 1.
+            With ngram_cascade, the texts are first classified by the n-gram classifier and only the ones
+            with a low margin are classified by the GRU.
+        """
+        cleaned_texts = [self.clean_text(text) for text in texts]
+        lang_predictions = [None] * len(texts)
+        # texts in a script used by only one of the languages do not need the network
+        if (self.script_classifier is not None):
+            lang_predictions = [[(lang, 1.0)] if lang is not None else None for lang in self.script_classifier.route(cleaned_texts)]
+        keys = list(range(len(texts)))
+        if (self.prediction_cache is not None):
+            keys = [self.prediction_cache.key(self.model_id, cleaned_text) for cleaned_text in cleaned_texts]
+            lang_predictions = [lang_prediction if lang_prediction is not None else self.prediction_cache.get(key, n_highest_probs)
+                                for key, lang_prediction in zip(keys, lang_predictions)]
+        # the remaining texts are classified once, even if they occur several times in the texts (with the cache)
+        missing_text_indices = collections.OrderedDict()
+        for text_i, lang_prediction in enumerate(lang_predictions):
+            if (lang_prediction is None and keys[text_i] not in missing_text_indices):
+                missing_text_indices[keys[text_i]] = text_i
+        if (missing_text_indices):
+            missing_keys = list(missing_text_indices.keys())
+            missing_indexed_texts = [self.index_text(cleaned_texts[text_i]) for text_i in missing_text_indices.values()]
+            new_lang_predictions = {}
+            if (self.ngram_classifier is not None):
+                for key, lang_prediction in zip(missing_keys, self.classify_indexed_ngram(missing_indexed_texts, n_highest_probs)):
+                    if (lang_prediction is not None):
+                        new_lang_predictions[key] = lang_prediction
+            gru_positions = [i for i, key in enumerate(missing_keys) if key not in new_lang_predictions]
+            gru_lang_predictions = self.classify_indexed([missing_indexed_texts[i] for i in gru_positions], n_highest_probs)
+            for i, lang_prediction in zip(gru_positions, gru_lang_predictions):
+                if (self.prediction_cache is not None):
+                    self.prediction_cache.put(missing_keys[i], n_highest_probs, lang_prediction)
+                new_lang_predictions[missing_keys[i]] = lang_prediction
+            lang_predictions = [lang_prediction if lang_prediction is not None else new_lang_predictions[key]
+                                for key, lang_prediction in zip(keys, lang_predictions)]
+        return lang_predictions
+
+    def prepare_texts(self, texts):
+        """
+        Cleans the texts the same way as the training data and replaces the characters by their indices;
+        characters not in the vocabulary are dropped.
+        
+        Args:
+            texts: List of raw texts.
+
+        Returns:
+            indexed_texts: List of character index lists, in the order of the texts.
+        """
+        indexed_texts = []
+        for text in texts:
+            indexed_texts.append(self.index_text(self.clean_text(text)))
+        return indexed_texts
+
+    def clean_text(self, text):
+        """
+        Args:
+            text: Raw text.
+
+        Returns:
+            The text with the irrelevant tweet parts filtered out.
+        """
+        # filtered on its own, so the filter state does not carry over from the previous text
+        filtered = self.input_data.filter_out_irrelevant_tweet_parts([(text, None)])
+        if (filtered == []):
+            return ''
+        return filtered[0][0]
+
+    def index_text(self, text):
+        """
+        Args:
+            text: Cleaned text.
+
+        Returns:
+            The indices of the text's vocabulary characters.
+        """
+        char2index = self.char2index
+        return [char2index[char] for char in text if char in char2index]
+
+    def classify_indexed(self, indexed_texts, n_highest_probs=1):
+        """
+        Classifies indexed texts.
+        
+        Args:
+            indexed_texts: List of character index lists.
+            n_highest_probs: Number of most probable languages returned for each text.
+
+        Returns:
+            List of the n most probable (language_tag, probability) pairs for each text, in the order of the texts.
+        """
+        mean_probs, _ = self.predict_indexed(indexed_texts)
+        lang_predictions = [[] for _ in indexed_texts]
+        text_indices = [i for i in range(len(mean_probs)) if mean_probs[i] is not None]
+        if (text_indices == []):
+            return lang_predictions
+        # one top-k over all texts instead of one per text
+        top_probs, top_indices = self.evaluator.top_langs(torch.stack([mean_probs[i] for i in text_indices]),
+                                                          n_highest_probs)
+        top_probs = top_probs.tolist()
+        top_indices = top_indices.tolist()
+        for row, text_i in enumerate(text_indices):
+            lang_predictions[text_i] = [(self.index2lang[lang_i], prob)
+                                        for prob, lang_i in zip(top_probs[row], top_indices[row])]
+        return lang_predictions
+
+    def classify_indexed_ngram(self, indexed_texts, n_highest_probs=1):
+        """
+        First stage of the cascade: classifies indexed texts with the n-gram classifier.
+        
+        Args:
+            indexed_texts: List of character index lists.
+            n_highest_probs: Number of most probable languages returned for each text.
+
+        Returns:
+            For each text the n most probable (language_tag, probability) pairs if the probability of the most probable
+            language exceeds the one of the second most probable by at least ngram_margin, else 'None'
+            (also for empty texts), in the order of the texts.
+        """
+        lang_predictions = [None] * len(indexed_texts)
+        text_indices = [i for i in range(len(indexed_texts)) if len(indexed_texts[i]) > 0]
+        if (text_indices == []):
+            return lang_predictions
+        probs = self.ngram_classifier.predict([indexed_texts[i] for i in text_indices])
+        top_probs, top_indices = torch.topk(probs, min(max(2, n_highest_probs), probs.size()[1]), dim=1)
+        if (top_probs.size()[1] > 1):
+            margins = top_probs[:, 0] - top_probs[:, 1]
+        else:
+            margins = top_probs[:, 0]
+        top_probs = top_probs[:, :n_highest_probs].tolist()
+        top_indices = top_indices[:, :n_highest_probs].tolist()
+        for row in (margins >= self.ngram_margin).nonzero().view(-1).tolist():
+            lang_predictions[text_indices[row]] = [(self.index2lang[lang_i], prob)
+                                                   for prob, lang_i in zip(top_probs[row], top_indices[row])]
+        return lang_predictions
+
+    def __load_ngram_classifier(self, ngram_rel_path):
+        """
+        Returns:
+            The n-gram classifier stored alongside the model ('None' if it does not exist or has other vocabularies).
+        """
+        try:
+            ngram_classifier = NgramClassifier.NgramClassifier({}, {}, self.system_param_dict)
+            ngram_classifier.load(ngram_rel_path)
+        except (OSError, KeyError) as e:
+            print('ERROR: No n-gram classifier found for the cascade, using the GRU only:', e, file=sys.stderr)
+            return None
+        # the n-gram classifier has to use the same character and language indices as the model
+        char2index, _ = self.input_data.get_string2index_and_index2string(ngram_classifier.vocab_chars)
+        lang2index, _ = self.input_data.get_string2index_and_index2string(ngram_classifier.vocab_lang)
+        if (char2index != self.char2index or lang2index != self.lang2index):
+            print('ERROR: The n-gram classifier', ngram_rel_path, 'has other vocabularies than the model, using the GRU only.', file=sys.stderr)
+            return None
+        return ngram_classifier
+
+    def predict_indexed(self, indexed_texts, return_exit_positions=False):
+        """
+        Predicts the language probabilities of indexed texts.
+        The texts are sorted by length and split into batches, each batch is fed through the model in packed forward passes
+        over chunks of max_eval_chunk_len_rnn characters (see RNNEvaluator.forward_padded),
+        or in one step by step pass with early exit (see early_exit_threshold).
+        
+        Args:
+            indexed_texts: List of character index lists.
+            return_exit_positions: If True, the number of characters consumed for each text is returned as well.
+
+        Returns:
+            mean_probs: For each text the probability of each language averaged over its characters
+                ('None' for empty texts), in the order of the texts.
+            mean_log_probs: For each text the log probability of each language averaged over its characters
+                (the mean loss for a target language is its negative value), in the order of the texts.
+            exit_positions: Only if return_exit_positions: For each text the number of consumed characters
+                (its length without early exit, 0 for empty texts), in the order of the texts.
+        """
+        mean_probs = [None] * len(indexed_texts)
+        mean_log_probs = [None] * len(indexed_texts)
+        exit_positions = [0] * len(indexed_texts)
+        order = sorted([i for i in range(len(indexed_texts)) if len(indexed_texts[i]) > 0],
+                       key=lambda i: len(indexed_texts[i]), reverse=True)
+        for batch_start in range(0, len(order), self.batch_size):
+            batch_order = order[batch_start:batch_start + self.batch_size]
+            batch_probs, batch_log_probs, batch_exit_positions = self.__predict_sorted_batch([indexed_texts[i] for i in batch_order])
+            for i, text_i in enumerate(batch_order):
+                mean_probs[text_i] = batch_probs[i]
+                mean_log_probs[text_i] = batch_log_probs[i]
+                exit_positions[text_i] = batch_exit_positions[i]
+        if (return_exit_positions):
+            return mean_probs, mean_log_probs, exit_positions
+        return mean_probs, mean_log_probs
+
+    def __predict_sorted_batch(self, indexed_batch):
+        """
+        Args:
+            indexed_batch: Non-empty character index lists, sorted by decreasing length.
+
+        Returns:
+            mean_probs: Tensor of size (batch_size, num_classes) with the mean probabilities.
+            mean_log_probs: Tensor of size (batch_size, num_classes) with the mean log probabilities.
+            exit_positions: Number of consumed characters of each text.
+        """
+        lengths = [len(indexed_text) for indexed_text in indexed_batch]
+        padded = torch.zeros(lengths[0], len(indexed_batch)).long()
+        for i, indexed_text in enumerate(indexed_batch):
+            padded[:lengths[i], i] = torch.LongTensor(indexed_text)
+        if (self.cuda_is_avail):
+            padded = padded.cuda()
+        with torch.no_grad():
+            if (self.early_exit_threshold is not None):
+                return self.__predict_sorted_batch_early_exit(padded, lengths)
+            mean_probs, mean_log_probs = self.evaluator.forward_padded(padded, lengths, embed=self.__embed_indices)
+        return mean_probs.cpu(), mean_log_probs.cpu(), lengths
+
+    def __embed_indices(self, indices):
+        """
+        Returns:
+            The embedding of character indices in the input precision of the model.
+        """
+        embedded = self.embed(indices)
+        if (self.input_dtype is not None):
+            embedded = embedded.to(self.input_dtype)
+        return embedded
+
+    def __predict_sorted_batch_early_exit(self, padded, lengths):
+        """
+        Step by step forward pass of a unidirectional model over a batch. A text stops consuming characters
+        once the top-1 probability averaged over its characters so far has been at least early_exit_threshold
+        for early_exit_patience consecutive characters; finished texts are left out of the following steps.
+        
+        Args:
+            padded: LongTensor of size (max_seq_len, batch_size) with the character indices.
+            lengths: Number of characters of each text, sorted decreasingly.
+
+        Returns:
+            mean_probs: Tensor of size (batch_size, num_classes) with the probabilities averaged over the consumed characters.
+            mean_log_probs: Tensor of size (batch_size, num_classes) with the log probabilities averaged over the consumed characters.
+            exit_positions: Number of consumed characters of each text.
+        """
+        batch_size = len(lengths)
+        lengths_tensor = torch.LongTensor(lengths)
+        embedded = self.__embed_indices(padded)
+        hidden = embedded.new(self.model.num_layers, batch_size, self.model.hidden_size).zero_()
+        prob_sums = torch.zeros(batch_size, self.model.num_classes).to(embedded.device)
+        log_prob_sums = torch.zeros(batch_size, self.model.num_classes).to(embedded.device)
+        # the bookkeeping of the exits is done on the CPU
+        steps_above_threshold = torch.zeros(batch_size).long()
+        exit_positions = lengths_tensor.clone()
+        is_active = torch.ones(batch_size).byte()
+        for t in range(lengths[0]):
+            # the texts are sorted by decreasing length, so the ones with a character at t are a prefix
+            num_texts_with_char = int((lengths_tensor > t).sum())
+            active_indices = is_active[:num_texts_with_char].nonzero().view(-1)
+            if (len(active_indices) == 0):
+                break
+            device_indices = active_indices.to(embedded.device)
+            output, next_hidden = self.model.gru_layer(embedded[t:t + 1].index_select(1, device_indices),
+                                                       hidden.index_select(1, device_indices))
+            hidden.index_copy_(1, device_indices, next_hidden)
+            log_probs, _ = self.model.classify_states(output)
+            log_probs = log_probs[0].float()
+            prob_sums.index_add_(0, device_indices, log_probs.exp())
+            log_prob_sums.index_add_(0, device_indices, log_probs)
+            top_probs = (prob_sums.index_select(0, device_indices) / (t + 1)).max(1)[0].cpu()
+            # count the consecutive steps above the threshold, a step below resets the count
+            steps = (steps_above_threshold[active_indices] + 1) * (top_probs >= self.early_exit_threshold).long()
+            steps_above_threshold[active_indices] = steps
+            exited_indices = active_indices[steps >= self.early_exit_patience]
+            exit_positions[exited_indices] = t + 1
+            is_active[exited_indices] = 0
+        num_consumed_chars = exit_positions.unsqueeze(1).float().to(embedded.device)
+        return (prob_sums / num_consumed_chars).cpu(), (log_prob_sums / num_consumed_chars).cpu(), exit_positions.tolist()
\ No newline at end of file
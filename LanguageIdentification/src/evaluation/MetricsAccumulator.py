@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+from __future__ import division
+import numpy as np
+
+
+class MetricsAccumulator(object):
+    """Class accumulating the evaluation results of a data set batch by batch.
+    
+    Only the confusion matrix, the summed up loss and the number of tweets are kept,
+    so arbitrarily large data sets can be evaluated in constant memory.
+    Accumulators of shards of a data set can be merged.
+    """
+    
+    def __init__(self, num_classes):
+        """
+        Args:
+            num_classes: The number of languages.
+        """
+        self.num_classes = num_classes
+        # rows: targets, columns: predictions
+        self.confusion_matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.loss_sum = 0.0
+        self.num_samples = 0
+
+    def update(self, predictions, targets, loss_sum):
+        """
+        Adds the results of a batch.
+        
+        Args:
+            predictions: Predicted language index of each tweet of the batch.
+            targets: Target language index of each tweet of the batch.
+            loss_sum: Sum of the mean losses of the tweets of the batch.
+        """
+        predictions = np.asarray(predictions, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        # one bincount over the flattened (target, prediction) cells instead of one increment per tweet
+        cell_counts = np.bincount(targets * self.num_classes + predictions, minlength=self.num_classes * self.num_classes)
+        self.confusion_matrix += cell_counts.reshape(self.num_classes, self.num_classes)
+        self.loss_sum += loss_sum
+        self.num_samples += len(targets)
+
+    def merge(self, other):
+        """
+        Adds the results of another accumulator (e.g. of another shard of the data set).
+        
+        Args:
+            other: MetricsAccumulator with the same number of languages.
+        """
+        self.confusion_matrix += other.confusion_matrix
+        self.loss_sum += other.loss_sum
+        self.num_samples += other.num_samples
+
+    def mean_loss(self):
+        """
+        Returns:
+            mean_loss: Average loss over all tweets.
+        """
+        return self.loss_sum / self.num_samples
+
+    def accuracy(self):
+        """
+        Returns:
+            accuracy: Overall accuracy.
+        """
+        return int(np.trace(self.confusion_matrix)) / self.num_samples
+
+    def precision(self):
+        """
+        precision tells if a language was often predicted although it should not have been
+        (true positives divided by the column sum, 0.0 for never predicted languages)
+        
+        Returns:
+            precision: List of the precision of each language.
+        """
+        return self.__safe_divide(np.diag(self.confusion_matrix), self.confusion_matrix.sum(0)).tolist()
+
+    def recall(self):
+        """
+        recall tells if a language was often classified as another one
+        (true positives divided by the row sum, 0.0 for languages without tweets)
+        
+        Returns:
+            recall: List of the recall of each language.
+        """
+        return self.__safe_divide(np.diag(self.confusion_matrix), self.confusion_matrix.sum(1)).tolist()
+
+    def f1_score(self):
+        """
+        f1 score is the harmonic mean of precision and recall (0.0 if both are 0.0)
+        
+        Returns:
+            f1_score: List of the f1 score of each language.
+        """
+        precision = np.array(self.precision())
+        recall = np.array(self.recall())
+        return self.__safe_divide(2 * (precision * recall), precision + recall).tolist()
+
+    def all_metrics(self):
+        """
+        Returns:
+            mean_loss: Average loss over all tweets.
+            accuracy: Overall accuracy.
+            confusion_matrix: Detailed matrix of how each tweet was evaluated (rows: targets, columns: predictions).
+            precision: List of the precision of each language.
+            recall: List of the recall of each language.
+            f1_score: List of the f1 score of each language.
+        """
+        return (self.mean_loss(),
+                self.accuracy(),
+                self.confusion_matrix.astype(np.float64).tolist(),
+                self.precision(),
+                self.recall(),
+                self.f1_score())
+
+    def __safe_divide(self, numerator, denominator):
+        """
+        Element-wise division which yields 0.0 where the denominator is 0.
+        """
+        numerator = numerator.astype(np.float64)
+        denominator = denominator.astype(np.float64)
+        quotient = np.zeros_like(numerator)
+        np.divide(numerator, denominator, out=quotient, where=(denominator != 0))
+        return quotient
\ No newline at end of file
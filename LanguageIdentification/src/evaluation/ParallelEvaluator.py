@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import queue
+import torch
+import torch.multiprocessing as mp
+from input import InputData
+from evaluation import MetricsAccumulator, RNNEvaluator
+
+
+class ParallelEvaluator(object):
+    """Class for the sharded evaluation of the GRU model on the CPU.
+    
+    Launches num_eval_workers_rnn forked worker processes, which share the read-only weights
+    of the model and the embedding with the parent (copy-on-write). The parent hands out batches
+    of indexed tweets through a bounded queue, every worker embeds and evaluates the batches it takes
+    into its own MetricsAccumulator, and the partial accumulators are merged by the parent.
+    """
+    
+    def __init__(self, system_param_dict):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+        """
+        self.system_param_dict = system_param_dict
+        self.num_workers = system_param_dict['num_eval_workers_rnn']
+
+    def accumulate_metrics(self, gru_model, embed, indexed_batches, num_classes):
+        """
+        Evaluates batches of indexed tweets with num_eval_workers_rnn worker processes.
+        
+        Args:
+            gru_model: The model to evaluate.
+            embed: The embedding object used for the model's inputs.
+            indexed_batches: Iterable of batches of indexed tweets (may be lazy, e.g. InputData.iter_indexed_data_batches).
+            num_classes: Number of languages.
+
+        Returns:
+            accumulator: MetricsAccumulator with the merged results of all workers
+                ('None' if a worker process failed).
+        """
+        # share the threads of the machine between the workers, so they do not oversubscribe the cores
+        num_threads_per_worker = max(1, torch.get_num_threads() // self.num_workers)
+        context = mp.get_context('fork')
+        # bounded, so a lazily read data set is only read ahead by a few batches
+        task_queue = context.Queue(maxsize=2 * self.num_workers)
+        result_queue = context.Queue()
+        workers = []
+        for rank in range(self.num_workers):
+            worker = context.Process(target=self.__run_worker,
+                                     args=(rank, num_threads_per_worker, gru_model, embed,
+                                           task_queue, result_queue, num_classes))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        accumulator = MetricsAccumulator.MetricsAccumulator(num_classes)
+        try:
+            for indexed_batch in indexed_batches:
+                self.__put_task(task_queue, indexed_batch, workers)
+            for _ in workers:
+                self.__put_task(task_queue, None, workers)
+            # get the results before joining, so no worker blocks on a full result queue
+            num_results = 0
+            while (num_results < len(workers)):
+                try:
+                    partial_accumulator = result_queue.get(timeout=1)
+                except queue.Empty:
+                    # a worker process killed from outside never sends its result
+                    self.__check_workers(workers)
+                    continue
+                if (partial_accumulator is None):
+                    raise RuntimeError('evaluation worker process failed')
+                accumulator.merge(partial_accumulator)
+                num_results += 1
+        except RuntimeError as e:
+            print('ERROR: Evaluation failed:', e, [rank for rank, worker in enumerate(workers) if worker.exitcode not in (None, 0)])
+            # the remaining workers may wait for batches that never come
+            for worker in workers:
+                if (worker.is_alive()):
+                    worker.terminate()
+            return None
+        finally:
+            for worker in workers:
+                worker.join(timeout=10)
+                if (worker.is_alive()):
+                    worker.terminate()
+        return accumulator
+
+    def __put_task(self, task_queue, task, workers):
+        """
+        Puts a task into the bounded task queue, waiting while it is full as long as all worker processes are alive.
+        """
+        while (True):
+            try:
+                task_queue.put(task, timeout=1)
+                return
+            except queue.Full:
+                self.__check_workers(workers)
+
+    def __check_workers(self, workers):
+        """
+        Raises a RuntimeError if a worker process terminated abnormally (a finished worker exits with code 0).
+        """
+        if (any([worker.exitcode not in (None, 0) for worker in workers])):
+            raise RuntimeError('evaluation worker process died')
+
+    def __run_worker(self, rank, num_threads, gru_model, embed, task_queue, result_queue, num_classes):
+        """
+        Entry point of one worker process.
+        
+        Args:
+            rank: Rank of the worker process.
+            num_threads: Number of threads the worker may use for intra-op parallelism.
+            gru_model: The model to evaluate (the forked copy of the parent's model).
+            embed: The embedding object (the forked copy of the parent's embedding).
+            task_queue: Queue of batches of indexed tweets, terminated by 'None'.
+            result_queue: Queue the worker's MetricsAccumulator is put into ('None' on failure).
+            num_classes: Number of languages.
+        """
+        torch.set_num_threads(num_threads)
+        input_data = InputData.InputData()
+        rnn_evaluator = RNNEvaluator.RNNEvaluator(gru_model)
+        
+        is_queue_done = [False]
+        
+        def embedded_batches():
+            indexed_batch = task_queue.get()
+            while (indexed_batch is not None):
+                yield input_data.create_embed_input_and_target_tensors(indexed_texts_and_lang=indexed_batch,
+                                                                       embed_weights_rel_path=None,
+                                                                       embed=embed)
+                indexed_batch = task_queue.get()
+            is_queue_done[0] = True
+        
+        try:
+            result_queue.put(rnn_evaluator.accumulate_metrics(embedded_batches(), num_classes))
+        except Exception as e:
+            print('ERROR: Evaluation worker', rank, 'failed:', e)
+            # keep taking the batches, so the parent does not block on the full queue if all workers fail
+            while (not is_queue_done[0]):
+                is_queue_done[0] = task_queue.get() is None
+            result_queue.put(None)
+            raise
\ No newline at end of file
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import atexit
+import collections
+import hashlib
+import os
+import pickle
+import sys
+import threading
+
+
+class PredictionCache(object):
+    """Class for a bounded cache of language predictions with least recently used eviction.
+    
+    Retweets and duplicates are cleaned to the same text, so they only have to be classified once. The key is the
+    SHA-1 digest of the model identity and the cleaned text, so one cache can be shared by several models. An entry holds
+    the n most probable languages of a text and answers every request for at most n languages. The cache is thread-safe
+    (for the service threads) and is optionally loaded from and saved to a file, so it survives restarts.
+    """
+    
+    def __init__(self, max_size, persist_rel_path=None):
+        """
+        Args:
+            max_size: Maximum number of entries; the least recently used entry is evicted beyond.
+            persist_rel_path: If not 'None', the entries are loaded from this file (if it exists)
+                and saved to it when the process exits.
+        """
+        self.max_size = max_size
+        self.persist_rel_path = persist_rel_path
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        if (persist_rel_path is not None):
+            if (os.path.isfile(persist_rel_path)):
+                self.load(persist_rel_path)
+            atexit.register(self.save, persist_rel_path)
+
+    def key(self, model_id, cleaned_text):
+        """
+        Args:
+            model_id: String identifying the model and the settings that influence its predictions.
+            cleaned_text: Text after LanguageIdentifier.clean_text.
+
+        Returns:
+            The cache key.
+        """
+        return hashlib.sha1((model_id + '\0' + cleaned_text).encode('utf-8', 'surrogatepass')).digest()
+
+    def get(self, key, n_highest_probs):
+        """
+        Args:
+            key: The cache key.
+            n_highest_probs: Number of most probable languages needed.
+
+        Returns:
+            The n most probable (language_tag, probability) pairs, or 'None' on a miss
+            (also if the entry holds fewer languages than needed).
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if (entry is None or entry[0] < n_highest_probs):
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[1][:n_highest_probs]
+
+    def put(self, key, n_highest_probs, lang_prediction):
+        """
+        Args:
+            key: The cache key.
+            n_highest_probs: Number of most probable languages the prediction was made for
+                (it may hold fewer if the model knows fewer languages).
+            lang_prediction: The most probable (language_tag, probability) pairs.
+        """
+        # a prediction with fewer languages than requested already holds all of them
+        if (len(lang_prediction) < n_highest_probs):
+            n_highest_probs = float('inf')
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if (entry is not None and entry[0] > n_highest_probs):
+                return
+            self.__entries[key] = (n_highest_probs, list(lang_prediction))
+            self.__entries.move_to_end(key)
+            while (len(self.__entries) > self.max_size):
+                self.__entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def stats(self):
+        """
+        Returns:
+            Dict with the number of entries, hits and misses and the hit rate.
+        """
+        with self.__lock:
+            num_lookups = self.hits + self.misses
+            return {'size': len(self.__entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / num_lookups if num_lookups > 0 else 0.0}
+
+    def save(self, persist_rel_path):
+        """
+        Atomically writes the entries (in least recently used order) to the file.
+        """
+        with self.__lock:
+            entries = list(self.__entries.items())
+        temp_rel_path = persist_rel_path + '.tmp'
+        with open(temp_rel_path, 'wb') as file:
+            pickle.dump(entries, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_rel_path, persist_rel_path)
+
+    def load(self, persist_rel_path):
+        """
+        Adds the entries of the file (the most recently used ones are kept if the file holds more than max_size).
+        """
+        try:
+            with open(persist_rel_path, 'rb') as file:
+                entries = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print('ERROR: Prediction cache could not be loaded from', persist_rel_path, e, file=sys.stderr)
+            return
+        with self.__lock:
+            for key, entry in entries[-self.max_size:]:
+                self.__entries[key] = entry
+            while (len(self.__entries) > self.max_size):
+                self.__entries.popitem(last=False)
+        print('Prediction cache loaded from file:', persist_rel_path, '(%d entries)' % len(entries[-self.max_size:]), file=sys.stderr)
\ No newline at end of file
@@ -24,7 +24,12 @@
 
 
 from __future__ import division
-import numpy as np
+import contextlib
+import math
+import random
+import torch
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence, pad_sequence
+from evaluation import MetricsAccumulator
 
 
 class RNNEvaluator(object):
@@ -38,6 +43,20 @@ class RNNEvaluator(object):
         """
         self.model = model
 
+    @contextlib.contextmanager
+    def inference_mode(self):
+        """
+        Context for evaluating the model: puts it in evaluation mode and disables the graph construction
+        (so no tweet keeps its graph alive), afterwards restores the previous mode.
+        """
+        was_training = self.model.training
+        self.model.eval()
+        try:
+            with torch.no_grad():
+                yield
+        finally:
+            self.model.train(was_training)
+
     def all_metrics(self, input_data, target_data, vocab_lang):
         """
         evaluates a data set and returns all possible metrics
@@ -55,15 +74,35 @@ class RNNEvaluator(object):
             recall: list of recall for each language
             f1_score: list of f1_score for each language
         """
-        mean_loss, predictions, targets = self.__evaluate_data_set_basic(input_data,
-                                                                         target_data,
-                                                                         n_highest_probs=1)
-        accuracy = self.__accuracy(predictions, targets)
-        confusion_matrix = self.__confusion_matrix(predictions, targets, vocab_lang)
-        precision = self.__precision(confusion_matrix)
-        recall = self.__recall(confusion_matrix)
-        f1_score = self.__f1_score(precision, recall)
-        return mean_loss, accuracy, confusion_matrix, precision, recall, f1_score
+        if (len(input_data) != len(target_data)):
+            print("input and target size different for 'all_metrics()'")
+            return -1
+        return self.accumulate_metrics([(input_data, target_data)], len(vocab_lang)).all_metrics()
+
+    def accumulate_metrics(self, batches, num_classes, accumulator=None):
+        """
+        evaluates a data set batch by batch, so the batches can be created lazily
+        and only one batch has to be in memory at a time
+        
+        Args:
+            batches: iterable of (input_data, target_data) batches of tweets
+            num_classes: number of languages
+            accumulator: if not None: MetricsAccumulator the results are added to
+
+        Returns:
+            accumulator: MetricsAccumulator containing the results of all batches
+                (all_metrics() of it returns the same metrics as all_metrics())
+        """
+        if (accumulator is None):
+            accumulator = MetricsAccumulator.MetricsAccumulator(num_classes)
+        with self.inference_mode():
+            for input_data, target_data in batches:
+                for batch_start, batch_end, mean_probs, mean_log_probs in self.__forward_batches(input_data):
+                    targets = self.__tweet_targets(target_data[batch_start:batch_end], mean_probs.device)
+                    _, top_indices = self.top_langs(mean_probs, 1)
+                    loss_sum = -float(mean_log_probs.gather(1, targets.unsqueeze(1)).sum())
+                    accumulator.update(top_indices[:, 0].tolist(), targets.tolist(), loss_sum)
+        return accumulator
 
     def evaluate_data_set(self, input_data, target_data, n_highest_probs=1):
         """
@@ -79,76 +118,83 @@ class RNNEvaluator(object):
             mean_loss: average loss over all tweets
             accuracy: overall accuracy
         """
-        predictions = []
-        target_list = []
-        accumulated_loss = []
-        for input, target in zip(input_data, target_data):
-            hidden = self.model.initHidden()
-            output, hidden = self.model(input, hidden)
-            loss = self.model.criterion(output, target)
-            lang_prediction_probs = np.zeros([output.size()[1]])
-            pred_size = output.size()[0]
-            for pred in output:
-                for i in range(len(lang_prediction_probs)):
-                    lang_prediction_probs[i] += np.exp(pred[i].data[0])
-            lang_prediction_probs = [lang_mean / pred_size for lang_mean in lang_prediction_probs]
-            languages_probs_and_idx = [(lang_prediction_probs[i], i) for i in range(len(lang_prediction_probs))]
-            languages_probs_and_idx.sort(reverse=True)
-            lang_prediction = [languages_probs_and_idx[i] for i in
-                             range(min(n_highest_probs, len(languages_probs_and_idx)))]
-
-            accumulated_loss.append(loss)
-            target_list.append(target.data[0])
-            predictions.append(lang_prediction[0][1])
-        mean_loss = sum(accumulated_loss) / float(len(accumulated_loss))
+        loss_sum = 0.0
         pred_true = 0
-        for pred, target in zip(predictions, target_list):
-            pred_true += int(pred == target)
-        accuracy = pred_true / len(target_list)
-        return mean_loss.data[0], accuracy
+        with self.inference_mode():
+            for batch_start, batch_end, mean_probs, mean_log_probs in self.__forward_batches(input_data):
+                targets = self.__tweet_targets(target_data[batch_start:batch_end], mean_probs.device)
+                _, top_indices = self.top_langs(mean_probs, 1)
+                loss_sum -= float(mean_log_probs.gather(1, targets.unsqueeze(1)).sum())
+                pred_true += int((top_indices[:, 0] == targets).sum())
+        mean_loss = loss_sum / len(input_data)
+        accuracy = pred_true / len(input_data)
+        return mean_loss, accuracy
 
-    def __evaluate_data_set_basic(self, input_data, target_data, n_highest_probs=1):
+    def evaluate_data_set_with_confidence(self, input_data, target_data, population_size=None, z_value=1.96):
         """
-        evaluates a data set
+        evaluates a (sampled) data set and computes confidence intervals
+        for the mean loss and the accuracy (default: 95% with the normal approximation)
         
         Args:
             input_data: tweets to evaluate
             target_data: target languages of each char in each tweet
-            n_highest_probs: n highest probability predictions for each tweet
+            population_size: if not None: size of the data set the tweets were sampled from
+                (applies the finite population correction)
+            z_value: z-score of the confidence level
 
         Returns:
-            mean_loss: average loss over all tweets
-            predictions: predictions for each tweet
-            target_list: target for each tweet
+            result: dict containing mean_loss, mean_loss_ci, accuracy and accuracy_ci,
+                with the confidence intervals as +/- half widths
         """
-        if (len(input_data) != len(target_data)):
-            print("input and target size different for 'evaluate_data_set_basic()'")
-            return -1
-        predictions = []
-        target_list = []
-        accumulated_loss = []
+        losses = []
+        pred_true = []
         for input, target in zip(input_data, target_data):
-            hidden = self.model.initHidden()
-            output, hidden = self.model(input, hidden)
-#            if target is not None:
-            loss = self.model.criterion(output, target)
-#            else:
-#                loss = 0
-            lang_prediction_probs = np.zeros([output.size()[1]])
-            pred_size = output.size()[0]
-            for pred in output:
-                for i in range(len(lang_prediction_probs)):
-                    lang_prediction_probs[i] += np.exp(pred[i].data[0])
-            lang_prediction_probs = [lang_mean / pred_size for lang_mean in lang_prediction_probs]
-            languages_probs_and_idx = [(lang_prediction_probs[i], i) for i in range(len(lang_prediction_probs))]
-            languages_probs_and_idx.sort(reverse=True)
-            lang_prediction = [languages_probs_and_idx[i] for i in range(min(n_highest_probs, len(languages_probs_and_idx)))]
-            
-            accumulated_loss.append(loss)
-            target_list.append(target.data[0])
-            predictions.append(lang_prediction[0][1])
-        mean_loss = sum(accumulated_loss) / float(len(accumulated_loss))
-        return mean_loss.data[0], predictions, target_list
+            lang_prediction, loss = self.evaluate_single_date(input, 1, target)
+            losses.append(loss)
+            pred_true.append(int(lang_prediction[0][1] == int(target.data[0])))
+        num_samples = len(losses)
+        mean_loss = sum(losses) / num_samples
+        accuracy = sum(pred_true) / num_samples
+        if (num_samples > 1):
+            loss_std = math.sqrt(sum([(loss - mean_loss) ** 2 for loss in losses]) / (num_samples - 1))
+        else:
+            loss_std = 0.0
+        accuracy_std = math.sqrt(accuracy * (1 - accuracy))
+        # sampling without replacement from a finite set: the intervals shrink to 0 for the whole set
+        correction = 1.0
+        if (population_size is not None and population_size > 1):
+            correction = math.sqrt(max(0.0, (population_size - num_samples) / (population_size - 1)))
+        return {
+                'mean_loss': mean_loss,
+                'mean_loss_ci': z_value * loss_std / math.sqrt(num_samples) * correction,
+                'accuracy': accuracy,
+                'accuracy_ci': z_value * accuracy_std / math.sqrt(num_samples) * correction,
+                }
+
+    def get_stratified_sample_indices(self, target_data, sample_size, seed):
+        """
+        gets the indices of a fixed sample of a data set with the same language distribution as the whole set
+        (every language gets at least one tweet)
+        
+        Args:
+            target_data: target languages of each char in each tweet
+            sample_size: number of tweets to sample
+            seed: seed for the sampling, so the same sample is drawn every time
+
+        Returns:
+            sample_indices: sorted indices of the sampled tweets
+        """
+        indices_by_lang = {}
+        for i, target in enumerate(target_data):
+            indices_by_lang.setdefault(int(target.data[0]), []).append(i)
+        rnd = random.Random(seed)
+        sample_indices = []
+        for lang in sorted(indices_by_lang):
+            lang_indices = indices_by_lang[lang]
+            num_lang_samples = max(1, int(round(sample_size * len(lang_indices) / len(target_data))))
+            sample_indices += rnd.sample(lang_indices, min(num_lang_samples, len(lang_indices)))
+        sample_indices.sort()
+        return sample_indices
 
     def evaluate_single_date(self, input, n_highest_probs, target=None):
         """
@@ -160,170 +206,160 @@ class RNNEvaluator(object):
             target: tweet's target
         Returns:
             lang_predictions: list of highest probability-language pairs for n languages
-            loss: loss of prediction to target
+            loss: loss of prediction to target (0 if no target is given)
         """
-        hidden = self.model.initHidden()
-        output, hidden = self.model(input, hidden)
-        if target is not None:
-            loss = self.model.criterion(output, target)
-        else:
-            loss = 0
-        lang_prediction_probs = self.__evaluate_prediction(output, n_highest_probs)
+        with self.inference_mode():
+            mean_probs, loss = self.__forward(input, target)
+            top_probs, top_indices = self.top_langs(mean_probs, n_highest_probs)
+        lang_prediction_probs = [(float(prob), int(lang_i)) for prob, lang_i in zip(top_probs[0], top_indices[0])]
         return lang_prediction_probs, loss
     
-    def __evaluate_prediction(self, prediction, n_highest_probs):
+    def aggregate_lang_probs(self, output, lengths=None):
         """
-        Given a prediction, computes the most likely languages
+        Averages the predictions of the model over the chars of each tweet in one tensor operation
+        (replaces summing up the probabilities of every char and language one by one).
         
         Args:
-            prediction: tensor of languages-dimensional entries containing log softmax probabilities
-            n_highest_probs: n highest probabilities of languages to return
-        Returns:
-            highest_probs: list of highest probability-language pairs for n languages
-        """
-        lang_prediction_probs = np.zeros([prediction.size()[1]])
-        pred_size = prediction.size()[0]
-        for pred in prediction:
-            for i in range(len(lang_prediction_probs)):
-                lang_prediction_probs[i] += np.exp(pred[i].data[0])
-        lang_prediction_probs = [lang_mean / pred_size for lang_mean in lang_prediction_probs]
-        languages_probs_and_idx = [(lang_prediction_probs[i], i) for i in range(len(lang_prediction_probs))]
-        languages_probs_and_idx.sort(reverse=True)
-        highest_probs = [languages_probs_and_idx[i] for i in range(min(n_highest_probs, len(languages_probs_and_idx)))]
-        return highest_probs
-    
-    def __accuracy(self, predictions, targets):
-        """
-        computes the accuracy over all prediction-target pairs
-        
-        Args:
-            predictions: predictions for each tweet
-            target_list: target for each tweet
+            output: log softmax output of the model, of size (seq_len, num_classes) for one tweet
+                or (seq_len, batch_size, num_classes) for a padded batch
+            lengths: number of predictions of each tweet in the batch (chars, or 1 for a tweet-level classification head),
+                sorted decreasingly (None: all positions are predictions)
 
         Returns:
-            accuracy: overall accuracy
-        """
-        pred_true = 0
-        for pred, target in zip(predictions, targets):
-            pred_true += int(pred == target)
-        return pred_true / len(targets)
+            mean_probs: probabilities of each language averaged over the chars, of size (batch_size, num_classes)
+            mean_log_probs: log probabilities of each language averaged over the chars,
+                of size (batch_size, num_classes); the mean loss for a target language is its negative value
+        """
+        if (output.dim() == 2):
+            output = output.unsqueeze(1)
+        if (lengths is None):
+            return output.exp().mean(0), output.mean(0)
+        # zero the padded positions, then average over the chars of each tweet
+        mask = (torch.arange(lengths[0]).unsqueeze(1) < torch.LongTensor(lengths).unsqueeze(0)).float().unsqueeze(2)
+        if (output.is_cuda):
+            mask = mask.cuda()
+        length_tensor = mask.sum(0)
+        mean_probs = (output.exp() * mask).sum(0) / length_tensor
+        mean_log_probs = (output * mask).sum(0) / length_tensor
+        return mean_probs, mean_log_probs
 
-    def __f1_score(self, precision, recall):
+    def top_langs(self, mean_probs, n_highest_probs):
         """
-        f1 score computes the harmonic mean over precision and recall
+        Gets the most likely languages of each tweet of a batch.
         
         Args:
-            precision: list of precision for each language
-            recall: list of recall for each language
-
-        Returns:
-            f1_score: list of f1_score for each language
-        """
-        f1 = []
-        for p, r in zip(precision, recall):
-            try:
-                f1.append(2 * (p * r) / (p + r))
-            except ZeroDivisionError:
-                f1.append(0.0)
-        return f1
-
-    def __recall(self, confusion_matrix):
-        """
-        recall is a measurement to tell if a language was often predicted although it should not have been
-        
-        Args:
-            confusion_matrix: detailed matrix of how each tweet was evaluated
-
+            mean_probs: averaged probabilities of each language, of size (batch_size, num_classes)
+            n_highest_probs: n highest probabilities of languages to return
         Returns:
-            recall: list of recall for each language
+            top_probs: n highest probabilities of each tweet, of size (batch_size, n), sorted decreasingly
+            top_indices: language indices of the n highest probabilities, of size (batch_size, n)
         """
-        true_positives = self.__true_positives(confusion_matrix)
-        false_negatives = self.__false_negatives(confusion_matrix)
-        recall = []
-        for tp, fn in zip(true_positives, false_negatives):
-            try:
-                recall.append(tp / (tp + sum(fn)))
-            except ZeroDivisionError:
-                recall.append(0.0)
-        return recall
-
-    def __precision(self, confusion_matrix):
+        return torch.topk(mean_probs, min(n_highest_probs, mean_probs.size()[1]), dim=1)
+    
+    def forward_padded(self, padded, lengths, embed=None):
         """
-        precision is a measurement to tell if a language was often classified as another one
+        Forward propagation of a padded batch of tweets in chunks of max_eval_chunk_len_rnn characters,
+        so memory and latency are bounded for long inputs (as GRUModel.forward_chunks does for one tweet).
+        Every chunk is one packed forward pass; only the tweets still longer than the chunk start take part in it.
+        A unidirectional model carries the hidden state of every tweet from one chunk to the next, a bidirectional
+        model classifies every chunk on its own. The predictions of the chunks are weighted with their lengths.
         
         Args:
-            confusion_matrix: detailed matrix of how each tweet was evaluated
+            padded: embedded tweets of size (max_seq_len, batch_size, input_size)
+            lengths: number of chars of each tweet, sorted decreasingly (all > 0)
+            embed: if not None: function applied to every chunk of padded before its forward pass
+                (e.g. the embedding lookup of char indices, so only one chunk is embedded at a time)
 
         Returns:
-            precision: list of precision for each language
-        """
-        true_positives = self.__true_positives(confusion_matrix)
-        false_positives = self.__false_positives(confusion_matrix)
-        precision = []
-        for tp, fp in zip(true_positives, false_positives):
-            try:
-                precision.append(tp/(tp + sum(fp)))
-            except ZeroDivisionError:
-                precision.append(0.0)
-        return precision
+            mean_probs: probabilities of each language averaged over the chars, of size (batch_size, num_classes)
+            mean_log_probs: log probabilities of each language averaged over the chars, of size (batch_size, num_classes)
+        """
+        chunk_len = self.model.system_param_dict['max_eval_chunk_len_rnn']
+        if (chunk_len == None):
+            chunk_len = lengths[0]
+        prob_sums = torch.zeros(len(lengths), self.model.num_classes).to(padded.device)
+        log_prob_sums = torch.zeros(len(lengths), self.model.num_classes).to(padded.device)
+        hidden = None
+        for chunk_start in range(0, lengths[0], chunk_len):
+            # the tweets are sorted by decreasing length, so the ones reaching into the chunk are a prefix
+            chunk_lengths = [min(length - chunk_start, chunk_len) for length in lengths if length > chunk_start]
+            num_tweets = len(chunk_lengths)
+            chunk = padded[chunk_start:chunk_start + chunk_lengths[0], :num_tweets]
+            if (embed is not None):
+                chunk = embed(chunk)
+            if (hidden is not None):
+                hidden = hidden[:, :num_tweets].contiguous()
+            packed_output, hidden = self.model.gru_layer(pack_padded_sequence(chunk, chunk_lengths), hidden)
+            if (self.model.is_bidirectional):
+                hidden = None
+            output, _ = pad_packed_sequence(packed_output)
+            output, output_lengths = self.model.classify_states(output, chunk_lengths)
+            chunk_probs, chunk_log_probs = self.aggregate_lang_probs(output, output_lengths)
+            weights = torch.FloatTensor(chunk_lengths).unsqueeze(1).to(padded.device)
+            prob_sums[:num_tweets] += chunk_probs.float() * weights
+            log_prob_sums[:num_tweets] += chunk_log_probs.float() * weights
+        lengths_tensor = torch.FloatTensor(lengths).unsqueeze(1).to(padded.device)
+        return prob_sums / lengths_tensor, log_prob_sums / lengths_tensor
 
-    def __true_positives(self, confusion_matrix):
+    def __forward_batches(self, input_data):
         """
-        true positives equals the trace of the confusion matrix,
-        i.e. prediction = target
+        Forward propagation of the tweets in batches of inference_batch_size tweets (see forward_padded).
         
         Args:
-            confusion_matrix: detailed matrix of how each tweet was evaluated
+            input_data: embedded tweets, each of size (seq_len, 1, input_size)
 
-        Returns:
-            true_positives: list of all true_positives for each language
-        """
-        return [confusion_matrix[i][i] for i in range(len(confusion_matrix))]
+        Yields:
+            batch_start: index of the first tweet of the batch
+            batch_end: index after the last tweet of the batch
+            mean_probs: probabilities of each language averaged over the chars, of size (batch_size, num_classes)
+            mean_log_probs: log probabilities of each language averaged over the chars, of size (batch_size, num_classes)
+        """
+        batch_size = self.model.system_param_dict['inference_batch_size']
+        for batch_start in range(0, len(input_data), batch_size):
+            batch_inputs = [input.view(input.size()[0], -1) for input in input_data[batch_start:batch_start + batch_size]]
+            order = sorted(range(len(batch_inputs)), key=lambda i: batch_inputs[i].size()[0], reverse=True)
+            lengths = [batch_inputs[i].size()[0] for i in order]
+            sorted_probs, sorted_log_probs = self.forward_padded(pad_sequence([batch_inputs[i] for i in order]), lengths)
+            # back to the order of the tweets
+            order_tensor = torch.LongTensor(order).to(sorted_probs.device)
+            mean_probs = torch.zeros_like(sorted_probs).index_copy_(0, order_tensor, sorted_probs)
+            mean_log_probs = torch.zeros_like(sorted_log_probs).index_copy_(0, order_tensor, sorted_log_probs)
+            yield batch_start, batch_start + len(batch_inputs), mean_probs, mean_log_probs
 
-    def __false_negatives(self, confusion_matrix):
+    def __tweet_targets(self, target_data, device):
         """
-        false negatives equals the sum of one row of the confusion matrix, except i==j
-        
-        Args:
-            confusion_matrix: detailed matrix of how each tweet was evaluated
-
         Returns:
-            false_negatives: list of all false_negatives for each language(row)
+            targets: LongTensor with the target language of each tweet (the target of its first char).
         """
-        return [confusion_matrix[i][:i] + confusion_matrix[i][i + 1:] for i in range(len(confusion_matrix))]
+        return torch.LongTensor([int(target[0]) for target in target_data]).to(device)
 
-    def __false_positives(self, confusion_matrix):
+    def __forward(self, input, target=None):
         """
-        false positives equals the sum one column of the confusion matrix, , except i==j
+        forward propagation of one tweet, in chunks if max_eval_chunk_len_rnn is set
+        (see GRUModel.forward_chunks), so memory and latency are bounded for long inputs
         
         Args:
-            confusion_matrix: detailed matrix of how each tweet was evaluated
-
-        Returns:
-            false_positives: list of all false_positives for each language(column)
-        """
-        matrix_in_columns = list(zip(*confusion_matrix))
-        return [matrix_in_columns[i][:i] + matrix_in_columns[i][i + 1:] for i in range(len(matrix_in_columns))]
-    
-    def __confusion_matrix(self, predictions, targets, vocab_lang):
-        """
-        Confusion matrix has language x language entries, corresponding to predictions(row) and targets(column)
-        
-        Args:
-            predictions: predicted languages
-            targets: target languages
-            vocab_lang: dict containing languages and there unique indices
+            input: input tweet
+            target: tweet's target (may be None)
 
         Returns:
-            conf_matrix: detailed matrix of how each tweet was evaluated
-        """
-        if (len(predictions) != len(targets)):
-            print("predictions and target size different for 'confusion_matrix()'")
-            return []
-        conf_matrix = np.zeros((len(vocab_lang), len(vocab_lang)))
-        for pred, targ in zip(predictions, targets):
-            conf_matrix[targ][pred] += 1
-        return conf_matrix.tolist()
+            mean_probs: probabilities of each language averaged over all chars, of size (1, num_classes)
+            loss: mean loss over all chars as float (0 if no target is given)
+        """
+        pred_size = input.size()[0]
+        mean_probs = 0
+        mean_log_probs = 0
+        for output, chunk_start, chunk_end in self.model.forward_chunks(input):
+            chunk_probs, chunk_log_probs = self.aggregate_lang_probs(output)
+            # weight each chunk's mean with its share of the tweet
+            weight = (chunk_end - chunk_start) / pred_size
+            mean_probs = mean_probs + chunk_probs * weight
+            mean_log_probs = mean_log_probs + chunk_log_probs * weight
+        loss = 0
+        if (target is not None):
+            # equals the criterion's (NLLLoss) mean over all chars, as every char has the tweet's target
+            loss = -float(mean_log_probs[0][int(target.data[0])])
+        return mean_probs, loss
 
     def to_string_confusion_matrix(self, confusion_matrix, vocab_lang, pad):
         """
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import numpy as np
+
+
+# scripts used by few languages: (script, codepoint ranges, languages written in the script)
+SCRIPTS = [
+    ('Greek', [(0x0370, 0x03FF), (0x1F00, 0x1FFF)], ['el']),
+    ('Armenian', [(0x0530, 0x058F), (0xFB13, 0xFB17)], ['hy']),
+    ('Hebrew', [(0x0590, 0x05FF), (0xFB1D, 0xFB4F)], ['he', 'yi']),
+    ('Thaana', [(0x0780, 0x07BF)], ['dv']),
+    ('Bengali', [(0x0980, 0x09FF)], ['bn', 'as']),
+    ('Gurmukhi', [(0x0A00, 0x0A7F)], ['pa']),
+    ('Gujarati', [(0x0A80, 0x0AFF)], ['gu']),
+    ('Oriya', [(0x0B00, 0x0B7F)], ['or']),
+    ('Tamil', [(0x0B80, 0x0BFF)], ['ta']),
+    ('Telugu', [(0x0C00, 0x0C7F)], ['te']),
+    ('Kannada', [(0x0C80, 0x0CFF)], ['kn']),
+    ('Malayalam', [(0x0D00, 0x0D7F)], ['ml']),
+    ('Sinhala', [(0x0D80, 0x0DFF)], ['si']),
+    ('Thai', [(0x0E00, 0x0E7F)], ['th']),
+    ('Lao', [(0x0E80, 0x0EFF)], ['lo']),
+    ('Tibetan', [(0x0F00, 0x0FFF)], ['bo', 'dz']),
+    ('Myanmar', [(0x1000, 0x109F)], ['my']),
+    ('Georgian', [(0x10A0, 0x10FF), (0x1C90, 0x1CBF), (0x2D00, 0x2D2F)], ['ka']),
+    ('Hangul', [(0x1100, 0x11FF), (0x3130, 0x318F), (0xA960, 0xA97F), (0xAC00, 0xD7FF)], ['ko']),
+    ('Ethiopic', [(0x1200, 0x139F), (0x2D80, 0x2DDF)], ['am', 'ti']),
+    ('Khmer', [(0x1780, 0x17FF), (0x19E0, 0x19FF)], ['km']),
+]
+# codepoints that do not belong to the script of a text: digits, punctuation, whitespace, symbols, combining marks, emoji
+NEUTRAL_RANGES = [(0x0000, 0x0040), (0x005B, 0x0060), (0x007B, 0x00BF), (0x02B0, 0x036F), (0x2000, 0x2BFF),
+                  (0x3000, 0x303F), (0xFE00, 0xFE0F), (0x1F000, 0x1FAFF), (0xE0000, 0xE007F)]
+OTHER_ID = 0
+NEUTRAL_ID = 1
+
+
+class ScriptClassifier(object):
+    """Class for identifying the language of texts written in a script that only one language of the model uses.
+    
+    For a batch of cleaned texts, the script of every codepoint is looked up in one vectorized pass
+    (a binary search over the sorted codepoint ranges) and counted per text. A text is routed to the language of
+    a script if at least script_fast_path_min_chars of its non-neutral characters are in the script and they make up
+    at least script_fast_path_min_share of them. A script is only used if exactly one language written in it
+    is in the model's vocab_lang, e.g. Hebrew is not used if the model knows Hebrew and Yiddish.
+    """
+    
+    def __init__(self, system_param_dict, vocab_lang):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+            vocab_lang: Every language occurence as a dict of {language: (index, occurences)}.
+        """
+        self.min_share = system_param_dict['script_fast_path_min_share']
+        self.min_chars = system_param_dict['script_fast_path_min_chars']
+        # the language of every script id ('None' for the other and neutral codepoints and ambiguous scripts)
+        self.script_langs = [None, None]
+        intervals = [(start, end, NEUTRAL_ID) for start, end in NEUTRAL_RANGES]
+        for script, ranges, langs in SCRIPTS:
+            script_id = len(self.script_langs)
+            model_langs = [lang for lang in langs if lang in vocab_lang]
+            self.script_langs.append(model_langs[0] if len(model_langs) == 1 else None)
+            intervals += [(start, end, script_id) for start, end in ranges]
+        self.routed_langs = sorted([lang for lang in self.script_langs if lang is not None])
+        # start codepoints of consecutive intervals covering all codepoints; the gaps belong to the other scripts
+        starts = []
+        ids = []
+        next_start = 0
+        for start, end, script_id in sorted(intervals):
+            if (next_start < start):
+                starts.append(next_start)
+                ids.append(OTHER_ID)
+            starts.append(start)
+            ids.append(script_id)
+            next_start = end + 1
+        starts.append(next_start)
+        ids.append(OTHER_ID)
+        self.starts = np.array(starts, dtype=np.uint32)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.num_texts = 0
+        self.num_routed_texts = 0
+
+    def route(self, cleaned_texts):
+        """
+        Args:
+            cleaned_texts: List of texts after LanguageIdentifier.clean_text.
+
+        Returns:
+            langs: For each text the language tag if the text is routed by its script, else 'None'.
+        """
+        num_scripts = len(self.script_langs)
+        langs = [None] * len(cleaned_texts)
+        self.num_texts += len(cleaned_texts)
+        if (cleaned_texts == [] or self.routed_langs == []):
+            return langs
+        codepoints = np.frombuffer(''.join(cleaned_texts).encode('utf-32-le', 'surrogatepass'), dtype='<u4')
+        if (len(codepoints) == 0):
+            return langs
+        text_indices = np.repeat(np.arange(len(cleaned_texts)), [len(cleaned_text) for cleaned_text in cleaned_texts])
+        script_ids = self.ids[np.searchsorted(self.starts, codepoints, side='right') - 1]
+        histograms = np.bincount(text_indices * num_scripts + script_ids,
+                                 minlength=len(cleaned_texts) * num_scripts).reshape(len(cleaned_texts), num_scripts)
+        num_script_chars = histograms.sum(1) - histograms[:, NEUTRAL_ID]
+        best_script_ids = histograms[:, 2:].argmax(1) + 2
+        best_counts = histograms[np.arange(len(cleaned_texts)), best_script_ids]
+        is_routed = (best_counts >= self.min_chars) & (best_counts >= self.min_share * num_script_chars)
+        for text_i in np.nonzero(is_routed)[0].tolist():
+            langs[text_i] = self.script_langs[best_script_ids[text_i]]
+        self.num_routed_texts += sum([lang is not None for lang in langs])
+        return langs
+
+    def routing_rate(self):
+        """
+        Returns:
+            Share of the texts routed by their script so far.
+        """
+        return self.num_routed_texts / max(1, self.num_texts)
\ No newline at end of file
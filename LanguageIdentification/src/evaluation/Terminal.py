@@ -23,14 +23,7 @@
 #    SOFTWARE.
 
 
-from input import InputData
-from evaluation import RNNEvaluator
-from net import GRUModel
-try:
-    from tweet_retriever import TweetRetriever
-    can_use_tweets = True
-except ImportError:
-    can_use_tweets = False
+from evaluation import LanguageIdentifier, IncrementalClassifier
 
 
 class Terminal(object):
@@ -128,50 +121,46 @@ class Terminal(object):
         Args:
             can_use_live_tweets: True iff tweets can be retrieved from twitter
         """
-        input_data = InputData.InputData()
-        embed, num_classes = input_data.create_embed_from_weights_file(self.system_param_dict['trained_embed_weights_rel_path'])
-        gru_model = GRUModel.GRUModel(vocab_chars={},
-                                      vocab_lang={},
-                                      input_size=embed.weight.size()[1],    # equals embedding dimension
-                                      num_classes=num_classes,
-                                      system_param_dict=self.system_param_dict)
-        state = gru_model.load_model_checkpoint_from_file(self.system_param_dict['trained_model_checkpoint_rel_path'])
-        results_dict = state['results_dict']
-        if (self.system_param_dict['cuda_is_avail']):
-            gru_model.cuda()
+        # a slim inference artifact starts faster than the checkpoint and the embedding weights file
+        language_identifier = LanguageIdentifier.LanguageIdentifier(self.system_param_dict,
+                                                                    artifact_rel_path=self.system_param_dict['trained_inference_artifact_rel_path'])
+        self.__loop_input(language_identifier=language_identifier, can_use_live_tweets=can_use_live_tweets)
 
-        self.__loop_input(gru_model=gru_model, input_data=input_data, can_use_live_tweets=can_use_live_tweets, embed=embed, vocab_lang=results_dict['vocab_lang'], vocab_chars=results_dict['vocab_chars'])
-
-    def __loop_input(self, gru_model, input_data, can_use_live_tweets, embed, vocab_lang, vocab_chars):
+    def __loop_input(self, language_identifier, can_use_live_tweets):
         """
         Takes user input and evaluates the resulting 'tweet'
         
         Args:
-            gru_model: model which will evaluate
-            input_data: the input 'tweet'
+            language_identifier: loaded model which will evaluate
             can_use_live_tweets: True iff tweets can be retrieved from twitter
-            embed: embedding object
-            vocab_lang: dict for the language vocabulary
-            vocab_chars: dict for the character vocabulary
         """
-        tweet_retriever = TweetRetriever.TweetRetriever()
-        lang2index, index2lang = input_data.get_string2index_and_index2string(vocab_lang)
+        # the twitter client is only imported when live tweets are used
+        tweet_retriever = None
+        if (can_use_live_tweets):
+            from tweet_retriever import TweetRetriever
+            tweet_retriever = TweetRetriever.TweetRetriever()
+        index2lang = language_identifier.index2lang
+        # an entered text starts a new session and text starting with '+' continues it,
+        # only the appended characters are fed through the model
+        incremental_classifier = IncrementalClassifier.IncrementalClassifier(self.system_param_dict, language_identifier)
 
         input_text = ''
         while input_text != ['exit']:
-            input_text, input_text_lang_tuple, is_live_tweets = self.__retrieve_text(can_use_live_tweets, index2lang, tweet_retriever, vocab_lang)
+            input_text, input_text_lang_tuple, is_live_tweets = self.__retrieve_text(can_use_live_tweets, index2lang, tweet_retriever, language_identifier.vocab_lang)
             if input_text is None:
                 continue
-            input_text_embed_char_text_inp_tensors, _ = self.__prepare_data(input_data=input_data,
-                                                                            embed=embed,
-                                                                            input_text_lang_tuple=input_text_lang_tuple,
-                                                                            vocab_chars=vocab_chars,
-                                                                            vocab_lang=vocab_lang)
-            if (self.system_param_dict['cuda_is_avail']):
-                input_text_embed_char_text_inp_tensors = input_text_embed_char_text_inp_tensors.cuda()
             n_highest_probs = 5
-            self.__evaluate_and_print(gru_model=gru_model, input_text_embed_char_text_inp_tensors=input_text_embed_char_text_inp_tensors,
-                                      n_highest_probs=n_highest_probs, input_text=input_text, index2lang=index2lang, is_live_tweets=is_live_tweets)
+            if (not is_live_tweets and input_text[0].startswith('+')):
+                lang_prediction = incremental_classifier.append('terminal', input_text[0][1:], n_highest_probs)
+                self.__print_predictions([input_text[0][1:]], [lang_prediction], is_live_tweets)
+                continue
+            if (not is_live_tweets):
+                lang_prediction = incremental_classifier.update('terminal', input_text[0], n_highest_probs)
+                self.__print_predictions(input_text, [lang_prediction], is_live_tweets)
+                continue
+            incremental_classifier.end('terminal')
+            self.__evaluate_and_print(language_identifier=language_identifier, n_highest_probs=n_highest_probs,
+                                      input_text=input_text, is_live_tweets=is_live_tweets)
 
     def __str_to_int(self, string):
         """
@@ -235,7 +224,7 @@ class Terminal(object):
             sample_tweets = self.__sample_tweets(tweet_retriever, vocab_lang, amount_live_tweets)
             #print('sample_tweets',sample_tweets)
             if sample_tweets is None:
-                return None, None
+                return None, None, None
             input_text =  list(sample_tweets.values())
             input_text_lang_tuple = [(text, index2lang[0]) for text in input_text]
         else:
@@ -243,58 +232,42 @@ class Terminal(object):
             input_text_lang_tuple = [(input_text[0], index2lang[0])]  # language must be in vocab_lang
         return input_text, input_text_lang_tuple, is_live_tweets
 
-    def __prepare_data(self, input_data, embed, input_text_lang_tuple, vocab_chars, vocab_lang):
+    def __evaluate_and_print(self, language_identifier, n_highest_probs, input_text, is_live_tweets):
         """
-        prepares input data to be fed in the model
+        classifies all input texts in one batch and prints languages with highest probabilites
         
         Args:
-            input_data: instance of InputData class
-            embed: embedding needed to convert input data into character embedding
-            input_text_lang_tuple: actual input data
-            vocab_chars: dict of all characters learned
-            vocab_lang: dict of all languages
-
-        Returns:
-            input_text_embed_char_text_inp_tensors: the embedded input tensor
-            input_text_target_tensors: the embedded target tensor (not used)
+            language_identifier: loaded model used for evaluation
+            n_highest_probs: n highest probabilites of languages to return
+            input_text: list of actual input texts
+            is_live_tweets: True iff tweets from twitter are evaluated
         """
-        filtered_texts_and_lang = input_data.filter_out_irrelevant_tweet_parts(input_text_lang_tuple)
-        input_text_only_vocab_chars = input_data.get_texts_with_only_vocab_chars(filtered_texts_and_lang, vocab_chars)
-        input_text_indexed = input_data.get_indexed_texts_and_lang(input_text_only_vocab_chars, vocab_chars, vocab_lang)
-        input_text_embed_char_text_inp_tensors, input_text_target_tensors = input_data.create_embed_input_and_target_tensors \
-            (indexed_texts_and_lang=input_text_indexed,
-             embed_weights_rel_path=self.system_param_dict['trained_embed_weights_rel_path'],
-             embed=embed)
-        return input_text_embed_char_text_inp_tensors, input_text_target_tensors
+        lang_predictions = language_identifier.classify(input_text, n_highest_probs)
+        self.__print_predictions(input_text, lang_predictions, is_live_tweets)
 
-    def __evaluate_and_print(self, gru_model, input_text_embed_char_text_inp_tensors, n_highest_probs, input_text, index2lang, is_live_tweets):
+    def __print_predictions(self, input_text, lang_predictions, is_live_tweets):
         """
-        calls evaluator instance for prediction and prints languages with highest probabilites
+        prints languages with highest probabilites
         
         Args:
-            gru_model: model used for evaluation
-            input_text_embed_char_text_inp_tensors: input text as embedding for model
-            n_highest_probs: n highest probabilites of languages to return
-            input_text: actual input text
-            index2lang: lookup from unique index to language
+            input_text: list of actual input texts
+            lang_predictions: list of (language_tag, probability) lists of the input texts
             is_live_tweets: True iff tweets from twitter are evaluated
         """
-        rnn_evaluator = RNNEvaluator.RNNEvaluator(gru_model)
-        for i, input_tensor in enumerate(input_text_embed_char_text_inp_tensors):
-            lang_prediction, _ = rnn_evaluator.evaluate_single_date(input_tensor, n_highest_probs)
+        for text, lang_prediction in zip(input_text, lang_predictions):
             if (is_live_tweets):
-                print('====================\nTweet detected: \n\n%s\n' % input_text[i])
+                print('====================\nTweet detected: \n\n%s\n' % text)
 
             # print n_highest_probs for input
             print('Language:')
             for i in range(len(lang_prediction)):
-                lang_tag = index2lang[lang_prediction[i][1]]
+                lang_tag, prob = lang_prediction[i]
                 if (lang_tag in self.tag2language):
                     lang = self.tag2language[lang_tag]
                 else:
                     lang = 'Unknown'
                     
                 if (i == 0):
-                    print('{0:.2f}'.format(lang_prediction[i][0] * 100) + '%: ' + lang + ' (' + lang_tag + ')\n')
+                    print('{0:.2f}'.format(prob * 100) + '%: ' + lang + ' (' + lang_tag + ')\n')
                 else:
-                    print('{0:.2f}'.format(lang_prediction[i][0] * 100) + '%: ' + lang + ' (' + lang_tag + ')')
\ No newline at end of file
+                    print('{0:.2f}'.format(prob * 100) + '%: ' + lang + ' (' + lang_tag + ')')
\ No newline at end of file
@@ -27,6 +27,7 @@ import torch
 from torch.autograd import Variable
 import unicodecsv as csv
 import random
+import sys
 
 
 class InputData(object):
@@ -45,7 +46,20 @@ class InputData(object):
         Returns:
             texts_and_lang: List of tuples in the form: (tweet_text, language_tag).
         """
-        texts_and_lang = []
+        return list(self.__iter_tweet_texts_and_lang_from_file(relative_path_to_file, fetch_only_langs, fetch_only_first_x_tweets))
+
+    def __iter_tweet_texts_and_lang_from_file(self, relative_path_to_file, fetch_only_langs=None, fetch_only_first_x_tweets=float('inf')):
+        """
+        Lazily fetch tweets from file, row by row.
+        
+        Args:
+            relative_path_to_file: Relative path to tweet file.
+            fetch_only_langs: If not 'None', only the specified languages will be fetched from the file.
+            fetch_only_first_x_tweets: Fetches only the first x amounts of tweets from the file.
+
+        Yields:
+            Tuples in the form: (tweet_text, language_tag).
+        """
         with open(relative_path_to_file, 'rb') as file:
             reader = csv.reader(file, delimiter=';', encoding='utf-8')
             tweet_counter = 0
@@ -60,14 +74,59 @@ class InputData(object):
                 if (fetch_only_langs != None):
                     for lang in fetch_only_langs:
                         if (row[2] == lang):
-                            texts_and_lang.append((row[1], row[2]))
+                            yield (row[1], row[2])
                 else:
-                    texts_and_lang.append((row[1], row[2]))
-        return texts_and_lang
+                    yield (row[1], row[2])
+
+    def iter_filtered_data_batches(self, data_rel_path, batch_size, fetch_only_langs=None, fetch_only_first_x_tweets=float('inf')):
+        """
+        Lazily reads a data set file in batches and filters out the irrelevant tweet parts of each batch.
+        The tweets are not shuffled.
+        
+        Args:
+            data_rel_path: Relative path to the tweet file.
+            batch_size: Number of tweets read from the file for each batch
+                (batches may be smaller after the filtering).
+            fetch_only_langs: If not 'None', only the specified languages will be fetched from the file.
+            fetch_only_first_x_tweets: Fetches only the first x amounts of tweets from the file.
+
+        Yields:
+            Batches of filtered tweets as lists of tuples in the form: (tweet_text, language_tag).
+        """
+        texts_and_lang = []
+        for text_and_lang in self.__iter_tweet_texts_and_lang_from_file(data_rel_path, fetch_only_langs, fetch_only_first_x_tweets):
+            texts_and_lang.append(text_and_lang)
+            if (len(texts_and_lang) == batch_size):
+                yield self.filter_out_irrelevant_tweet_parts(texts_and_lang)
+                texts_and_lang = []
+        if (texts_and_lang != []):
+            yield self.filter_out_irrelevant_tweet_parts(texts_and_lang)
+
+    def iter_indexed_data_batches(self, data_rel_path, vocab_chars, vocab_lang, batch_size,
+                                  fetch_only_langs=None, fetch_only_first_x_tweets=float('inf')):
+        """
+        Lazily reads a data set file in batches and preprocesses each batch like get_indexed_data,
+        so data sets of any size can be evaluated with only one batch in memory.
+        The tweets are not shuffled.
+        
+        Args:
+            data_rel_path: Relative path to the tweet file.
+            vocab_chars: Dict for character vocabulary in the form: {character: (index, frequency)}.
+            vocab_lang: Dict for language vocabulary in the form: {language: (index, frequency)}.
+            batch_size: Number of tweets read from the file for each batch
+                (batches may be smaller after the filtering).
+            fetch_only_langs: If not 'None', only the specified languages will be fetched from the file.
+            fetch_only_first_x_tweets: Fetches only the first x amounts of tweets from the file.
+
+        Yields:
+            Batches of indexed tweets in the form of get_indexed_data.
+        """
+        for filtered_texts_and_lang in self.iter_filtered_data_batches(data_rel_path, batch_size, fetch_only_langs, fetch_only_first_x_tweets):
+            yield self.get_single_indexed_data(filtered_texts_and_lang, vocab_lang, vocab_chars)
     
     def filter_out_irrelevant_tweet_parts(self, texts_and_lang):
         """
-        Filters out irrelevant tweet parts.
+        Filters out irrelevant tweet parts (hashtags, @-names and URLs up to the next space within each tweet).
         
         Args:
             texts_and_lang: List of tuples in the form: (tweet_text, language_tag).
@@ -76,8 +135,9 @@ class InputData(object):
             filtered_texts_and_lang: List of tuples with the tweet texts filtered.
         """
         filtered_texts_and_lang = []
-        removal_mode = False
         for tweet_i in range(len(texts_and_lang)):
+            # every tweet is filtered on its own, so the result does not depend on the order or batching of the tweets
+            removal_mode = False
             filtered_tweet_text = []
             tweet_text_size = len(texts_and_lang[tweet_i][0])
             for char_j in range(tweet_text_size):
@@ -253,10 +313,10 @@ class InputData(object):
         val_filtered =  self.__get_filtered_data(validation_data_rel_path , fetch_only_langs, fetch_only_first_x_tweets)
         te_filtered =  self.__get_filtered_data(test_data_rel_path, fetch_only_langs, fetch_only_first_x_tweets)
         rt_filtered =  self.__get_filtered_data(real_test_data_rel_path, fetch_only_langs, fetch_only_first_x_tweets)
-        tr_indexed = self.__get_single_indexed_data(tr_filtered, vocab_lang, vocab_chars)
-        val_indexed = self.__get_single_indexed_data(val_filtered, vocab_lang, vocab_chars)
-        te_indexed = self.__get_single_indexed_data(te_filtered, vocab_lang, vocab_chars)
-        rt_indexed = self.__get_single_indexed_data(rt_filtered, vocab_lang, vocab_chars)
+        tr_indexed = self.get_single_indexed_data(tr_filtered, vocab_lang, vocab_chars)
+        val_indexed = self.get_single_indexed_data(val_filtered, vocab_lang, vocab_chars)
+        te_indexed = self.get_single_indexed_data(te_filtered, vocab_lang, vocab_chars)
+        rt_indexed = self.get_single_indexed_data(rt_filtered, vocab_lang, vocab_chars)
         return tr_indexed, val_indexed, te_indexed, rt_indexed, vocab_chars, vocab_lang
 
     def __get_filtered_data(self, data_path, fetch_only_langs=None, fetch_only_first_x_tweets=float('inf')):
@@ -276,7 +336,7 @@ class InputData(object):
         filtered_texts_and_lang = self.filter_out_irrelevant_tweet_parts(texts_and_lang)
         return filtered_texts_and_lang
 
-    def __get_single_indexed_data(self, filtered_texts_and_lang, vocab_lang, vocab_chars):
+    def get_single_indexed_data(self, filtered_texts_and_lang, vocab_lang, vocab_chars):
         """
         Get the tweets with texts only containing vocabulary characters replaced by their unique indices
         as well as the language-tags replaced by their unique indices.
@@ -311,6 +371,19 @@ class InputData(object):
             index2string[vocab_dict[string][0]] = string
         return string2index, index2string
     
+    def have_same_indices(self, vocab_dict, other_vocab_dict):
+        """
+        Checks whether two vocabularies map the same strings to the same indices (the frequencies are ignored).
+        
+        Args:
+            vocab_dict: The vocabulary dict.
+            other_vocab_dict: The vocabulary dict to compare with.
+
+        Returns:
+            True if both vocabularies have the same strings and indices.
+        """
+        return self.get_string2index_and_index2string(vocab_dict)[0] == self.get_string2index_and_index2string(other_vocab_dict)[0]
+    
     def get_only_indexed_texts(self, indexed_texts_and_lang):
         """
         Retrieves only the indexed tweet texts from indexed tweet text and language tuples.
@@ -405,7 +478,7 @@ class InputData(object):
             embed = torch.nn.Embedding(embed_dims[0], embed_dims[1])
             embed.weight = weights_tensor_param
             num_classes = embed_dims[2]     # embed_dims[2] is the number of classes
-        print('Embedding weights loaded from file:', relative_path_to_file)
+        print('Embedding weights loaded from file:', relative_path_to_file, file=sys.stderr)
         return embed, num_classes
     
     def create_embed_input_and_target_tensors(self, indexed_texts_and_lang, embed_weights_rel_path, embed=None):
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import atexit
+import collections
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+import torch
+
+
+# all writers of the process, flushed by one exit hook (a writer thread only runs while files are pending,
+# so the set does not keep idle writers alive)
+_writers = weakref.WeakSet()
+
+
+def _flush_writers():
+    """
+    Waits at the exit of the process until the files of all writers are written.
+    """
+    for writer in list(_writers):
+        try:
+            writer.flush()
+        except RuntimeError as e:
+            print('ERROR:', e, file=sys.stderr)
+
+
+atexit.register(_flush_writers)
+
+
+class CheckpointWriter(object):
+    """Class for writing checkpoint files atomically, optionally in a background thread.
+    
+    A save takes a snapshot of all tensors of the state (so the training may continue to update them)
+    and hands the writing over to the background thread. Every file is first written to a temporary file
+    in the same directory, synced to disk and then renamed, so a crash never leaves a half-written checkpoint.
+    Saves to the same file which are still waiting to be written are coalesced, only the latest one is written.
+    The background thread exits when no file is pending and is started again by the next save.
+    A failed background write is raised by the next flush.
+    """
+    
+    def __init__(self, is_async=True, keep_last_num_checkpoints=1):
+        """
+        Args:
+            is_async: If True: files are written in a background thread, otherwise in the calling thread.
+            keep_last_num_checkpoints: Number of versions kept of every file; older versions are renamed to
+                '<name>.1<ext>', '<name>.2<ext>', ... with '<name>.1<ext>' being the most recent one.
+        """
+        self.is_async = is_async
+        self.keep_last_num_checkpoints = max(1, keep_last_num_checkpoints)
+        self.__init_thread_state()
+
+    def __init_thread_state(self):
+        """
+        Initializes the synchronization objects; the writer thread itself is started on the first save.
+        """
+        self.__condition = threading.Condition()
+        self.__pending = collections.OrderedDict()     # path: write function, the oldest save first
+        self.__num_writing = 0
+        self.__failed_writes = []     # (path, exception) of the background writes since the last flush
+        self.__thread = None
+        self.__pid = os.getpid()
+        _writers.add(self)
+
+    def __getstate__(self):
+        # threads and locks can neither be pickled nor copied (e.g. when the model is deep-copied)
+        return {'is_async': self.is_async, 'keep_last_num_checkpoints': self.keep_last_num_checkpoints}
+
+    def __setstate__(self, state):
+        self.is_async = state['is_async']
+        self.keep_last_num_checkpoints = state['keep_last_num_checkpoints']
+        self.__init_thread_state()
+
+    def save(self, state, relative_path_to_file):
+        """
+        Saves a model state (checkpoint) with torch.save.
+        
+        Args:
+            state: Dict containing the model state to be saved.
+            relative_path_to_file: Relative path for the save file.
+        """
+        state_snapshot = self.__snapshot(state)
+        self.submit(lambda file: torch.save(state_snapshot, file), relative_path_to_file)
+
+    def submit(self, write_function, relative_path_to_file):
+        """
+        Writes a file with the given write function. The write function must only use data which
+        is not changed afterwards by the caller (i.e. a snapshot).
+        
+        Args:
+            write_function: Function writing the content to the passed binary file object.
+            relative_path_to_file: Relative path for the save file.
+        """
+        if (not self.is_async):
+            self.__write_atomically(write_function, relative_path_to_file)
+            return
+        # in a forked child process the thread and the locks of the parent cannot be used
+        if (os.getpid() != self.__pid):
+            self.__init_thread_state()
+        with self.__condition:
+            self.__start_thread_if_needed()
+            # coalesce with a save to the same file which has not been written yet (and queue it as the newest)
+            self.__pending[relative_path_to_file] = write_function
+            self.__pending.move_to_end(relative_path_to_file)
+            self.__condition.notify_all()
+
+    def flush(self):
+        """
+        Blocks until all submitted files are written.
+        
+        Raises:
+            RuntimeError: If a file could not be written in the background since the last flush.
+        """
+        if (os.getpid() != self.__pid):
+            return
+        with self.__condition:
+            while (self.__pending or self.__num_writing > 0):
+                self.__condition.wait()
+            failed_writes = self.__failed_writes
+            self.__failed_writes = []
+        if (failed_writes != []):
+            raise RuntimeError('Writing file failed: ' + ', '.join(['%s (%s)' % (path, e) for path, e in failed_writes])) from failed_writes[0][1]
+
+    def __start_thread_if_needed(self):
+        """
+        Starts the writer thread if it is not running yet. Has to be called with the condition acquired.
+        """
+        if (self.__thread is None or not self.__thread.is_alive()):
+            self.__thread = threading.Thread(target=self.__run, name='CheckpointWriter')
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def __run(self):
+        """
+        Loop of the writer thread, which ends when no file is pending (so an idle writer can be freed).
+        """
+        while True:
+            with self.__condition:
+                if (not self.__pending):
+                    self.__thread = None
+                    return
+                relative_path_to_file, write_function = self.__pending.popitem(last=False)
+                self.__num_writing += 1
+            try:
+                self.__write_atomically(write_function, relative_path_to_file)
+            except Exception as e:
+                print('ERROR: Writing file failed:', relative_path_to_file, e, file=sys.stderr)
+                with self.__condition:
+                    self.__failed_writes.append((relative_path_to_file, e))
+            with self.__condition:
+                self.__num_writing -= 1
+                self.__condition.notify_all()
+
+    def __write_atomically(self, write_function, relative_path_to_file):
+        """
+        Writes to a temporary file, syncs it to disk and renames it to the target file.
+        
+        Args:
+            write_function: Function writing the content to the passed binary file object.
+            relative_path_to_file: Relative path for the save file.
+        """
+        directory = os.path.dirname(os.path.abspath(relative_path_to_file))
+        file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(relative_path_to_file), suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file:
+                write_function(file)
+                file.flush()
+                os.fsync(file.fileno())
+            self.__rotate_old_versions(relative_path_to_file)
+            os.replace(temp_path, relative_path_to_file)
+        except BaseException:
+            if (os.path.exists(temp_path)):
+                os.remove(temp_path)
+            raise
+        # sync the directory, so the rename itself is persisted
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
+        print('File saved:', relative_path_to_file)
+
+    def __rotate_old_versions(self, relative_path_to_file):
+        """
+        Keeps the last keep_last_num_checkpoints - 1 versions of a file by renaming them.
+        The current version is hard-linked instead of renamed, so the file never disappears until it is replaced.
+        
+        Args:
+            relative_path_to_file: Relative path of the file.
+        """
+        if (self.keep_last_num_checkpoints <= 1 or not os.path.exists(relative_path_to_file)):
+            return
+        name, extension = os.path.splitext(relative_path_to_file)
+        for version in range(self.keep_last_num_checkpoints - 1, 1, -1):
+            older_path = '%s.%d%s' % (name, version - 1, extension)
+            if (os.path.exists(older_path)):
+                os.replace(older_path, '%s.%d%s' % (name, version, extension))
+        last_version_path = '%s.1%s' % (name, extension)
+        if (os.path.exists(last_version_path)):
+            os.remove(last_version_path)
+        try:
+            os.link(relative_path_to_file, last_version_path)
+        except OSError:
+            shutil.copy2(relative_path_to_file, last_version_path)
+
+    def __snapshot(self, obj):
+        """
+        Copies all tensors of a (nested) state to the CPU memory; other objects are kept as references.
+        
+        Args:
+            obj: The state or a part of it.
+
+        Returns:
+            The snapshot.
+        """
+        if (torch.is_tensor(obj)):
+            return obj.cpu().clone()
+        elif (isinstance(obj, dict)):
+            return type(obj)((key, self.__snapshot(value)) for key, value in obj.items())
+        elif (isinstance(obj, list)):
+            return [self.__snapshot(value) for value in obj]
+        elif (isinstance(obj, tuple)):
+            return tuple(self.__snapshot(value) for value in obj)
+        return obj
@@ -23,19 +23,23 @@
 #    SOFTWARE.
 
 
+import collections
+import copy
+import random
+import numpy as np
 import torch
 from torch import nn, optim
 from torch.autograd import Variable
+import torch.nn.functional as F
+from torch.nn.utils.rnn import pad_packed_sequence
 #import torch.nn.functional as F
-from . import BatchGenerator
-from evaluation import RNNEvaluator
 
 
 class GRUModel(nn.Module):
     """Class implementing the GRU model.
     """
     
-    def __init__(self, vocab_chars, vocab_lang, input_size, num_classes, system_param_dict):
+    def __init__(self, vocab_chars, vocab_lang, input_size, num_classes, system_param_dict, with_optimizer=True):
         """
         Args:
             vocab_chars: Every character occurence as a dict of {character: (index, occurrences)}.
@@ -43,6 +47,7 @@ class GRUModel(nn.Module):
             input_size: Input size of character embeddings (embedding dimension).
             num_classes: Number of languages.
             system_param_dict: Dict containing system parameters.
+            with_optimizer: If False, no optimizer is created (for models only used for inference).
         """
         super(GRUModel, self).__init__()
         self.vocab_chars = vocab_chars
@@ -64,12 +69,21 @@ class GRUModel(nn.Module):
         else:
             self.num_directions = 1
         self.output_layer = nn.Linear(self.hidden_size * self.num_directions, num_classes)
+        self.classification_head = system_param_dict['classification_head_rnn']
+        if (self.classification_head not in ['per_char', 'last_state', 'mean_pool']):
+            print('ERROR: Unknown classification_head_rnn', self.classification_head, '(per_char, last_state or mean_pool), using per_char instead.')
+            self.classification_head = 'per_char'
         self.log_softmax = nn.LogSoftmax()
         self.batch_size = 1     # unused dimension
         self.cuda_is_avail = system_param_dict['cuda_is_avail']
         
         self.criterion = torch.nn.NLLLoss()
-        self.optimizer = optim.Adam(params=self.parameters(), lr=self.lr, weight_decay=self.weight_decay)
+        self.optimizer = None
+        if (with_optimizer):
+            self.optimizer = optim.Adam(params=self.parameters(), lr=self.lr, weight_decay=self.weight_decay)
+        # the training stack (checkpoint writing, distributed training, evaluation) is imported on first use,
+        # so loading a model for classification does not import it
+        self.checkpoint_writer = None
 
     def initHidden(self):
         """
@@ -93,135 +107,500 @@ class GRUModel(nn.Module):
             hidden: The previous hidden RNN state.
 
         Returns:
-            output: Prediction for the input.
+            output: Prediction for the input, of size (seq_len, num_classes) for the per_char classification head
+                and (1, num_classes) for the tweet-level heads.
             next_hidden: The new hidden state.
         """
         output, next_hidden = self.gru_layer(inp, hidden)
-        output = self.output_layer(output)
+        output, _ = self.classify_states(output)
         output = output.view(-1, self.num_classes)
 #        # use tanh for output layer instead of linear
 #        for i in range(len(output)):
 #            output[i] = F.tanh(output.data[i])
-        output = self.log_softmax(output)
         return output, next_hidden
 
-    def train(self, train_inputs, train_targets, val_inputs, val_targets):
+    def forward_packed(self, packed_inp):
+        """
+        Forward propagation of a batch of tweets.
+        
+        Args:
+            packed_inp: Embedded tweets of a batch packed with pack_padded_sequence.
+
+        Returns:
+            output: Padded predictions of size (max_seq_len, batch_size, num_classes) for the per_char classification head
+                (the predictions for the padded positions have to be ignored) and (1, batch_size, num_classes)
+                for the tweet-level heads.
+            lengths: Number of valid predictions of each tweet.
+        """
+        packed_output, _ = self.gru_layer(packed_inp)
+        output, lengths = pad_packed_sequence(packed_output)
+        return self.classify_states(output, [int(length) for length in lengths])
+
+    def classify_states(self, states, lengths=None):
+        """
+        Applies the classification head to the (padded) output states of the GRU.
+        The per_char head projects every character's state, the tweet-level heads project
+        only one state per tweet: the final states (last_state; for a bidirectional model the
+        final states of both directions) or the mean of all states (mean_pool).
+        
+        Args:
+            states: GRU output of size (max_seq_len, batch_size, num_directions * hidden_size).
+            lengths: Number of characters of each tweet (None: all tweets have max_seq_len characters).
+
+        Returns:
+            output: Log probabilities of size (max_seq_len, batch_size, num_classes) for the per_char head
+                and (1, batch_size, num_classes) for the tweet-level heads.
+            lengths: Number of valid predictions of each tweet (1 for the tweet-level heads).
+        """
+        if (self.classification_head == 'per_char'):
+            return F.log_softmax(self.output_layer(states), dim=2), lengths
+        max_seq_len, batch_size = states.size()[0], states.size()[1]
+        if (lengths is None):
+            lengths = [max_seq_len] * batch_size
+        if (self.classification_head == 'mean_pool'):
+            mask = (torch.arange(max_seq_len).unsqueeze(1) < torch.LongTensor(lengths).unsqueeze(0)).unsqueeze(2).type_as(states)
+            pooled = (states * mask).sum(0) / mask.sum(0)
+        else:
+            # the forward direction ends at the last character, the reverse direction at the first one
+            last_indices = (torch.LongTensor(lengths) - 1).to(states.device)
+            pooled = states[last_indices, torch.arange(batch_size).to(states.device)]
+            if (self.is_bidirectional):
+                pooled = torch.cat([pooled[:, :self.hidden_size], states[0, :, self.hidden_size:]], 1)
+        output = F.log_softmax(self.output_layer(pooled), dim=1).unsqueeze(0)
+        return output, [1] * batch_size
+
+    def train(self, train_inputs, train_targets=None, val_inputs=None, val_targets=None, rank=0, world_size=1, training_state=None):
         """Model's training method.
         
+        Called with a bool only (as done by nn.Module.eval()), it sets the training/evaluation mode
+        of the module like nn.Module.train(mode), which this method overrides.
+        
         Iterates over epochs and batches and updates weights after each batch.
         Saves the best model to file and decays learning rate when learning stagnates.
         
+        For data-parallel training (world_size > 1) every worker process calls this method
+        with an initialized process group: each worker trains on its shard of every batch,
+        the gradients are all-reduced before the optimizer step, and only rank 0 does the
+        validation checks, the learning rate decay and the checkpoint saving.
+        
+        At every validation check the whole training state is saved to rnn_resume_checkpoint_rel_path,
+        so an interrupted training can be resumed with a training_state loaded via load_training_state_from_file.
+        
+        The validation checks may use a fixed stratified sample of the validation set (val_sample_size_rnn)
+        and may run asynchronously in a separate process on a snapshot of the weights (async_validation_rnn);
+        then the early stopping and checkpoint decisions are applied when the result comes back.
+        
         Args:
             train_inputs: Set of all tweets to be trained.
             train_targets: Set of all targets for input tweets.
             val_inputs: Set of all tweets to be used for validation checks.
             val_targets: Set of all targets for validation tweets.
+            rank: Rank of this worker process (0 if not data-parallel).
+            world_size: Number of worker processes (1 if not data-parallel).
+            training_state: If not 'None', the training continues from this training state
+                (the weights, optimizer and RNG states have to be already restored).
         """
+        if (isinstance(train_inputs, bool)):
+            return super(GRUModel, self).train(train_inputs)
+        super(GRUModel, self).train(True)
         batch_size = self.system_param_dict['batch_size_rnn']
-        max_eval_checks_not_improved = self.system_param_dict['max_eval_checks_not_improved_rnn']
         max_num_epochs = self.system_param_dict['max_num_epochs_rnn']
         eval_every_num_batches = self.system_param_dict['eval_every_num_batches_rnn']
         lr_decay_factor = self.system_param_dict['lr_decay_factor_rnn']
-        rnn_model_checkpoint_rel_path = self.system_param_dict['rnn_model_checkpoint_rel_path']
+        val_sample_size = self.system_param_dict['val_sample_size_rnn']
+        from . import BatchGenerator
+        from evaluation import RNNEvaluator
         batch_generator = BatchGenerator.Batches(train_inputs, train_targets, batch_size)
         num_train_batches_minus_one = batch_generator.num_batches - 1
-        max_eval_checks_not_improved_minus_one = max_eval_checks_not_improved - 1
-        best_val_mean_loss = float('inf')
-        cur_val_mean_loss = float('inf')
-        best_val_accuracy = -1.0
-        cur_val_accuracy = -1.0
+        # best values, counters and stopping decision of the early stopping
+        early_stopping_state = {
+                                'best_val_mean_loss': float('inf'),
+                                'best_val_accuracy': -1.0,
+                                'eval_checks_not_improved_counter': 0,
+                                'continue_training': True,
+                                }
         epoch = 0
         total_trained_batches_counter = 0
-        eval_checks_not_improved_counter = 0
-        max_eval_checks_not_improved_half = max_eval_checks_not_improved / 2
-        continue_training = True
+        is_data_parallel = world_size > 1
+        is_main_process = rank == 0
         rnn_evaluator = RNNEvaluator.RNNEvaluator(self)
         # increase the learning rate variable as in the first iteration it will be immediately decreased
         self.lr = self.lr * (1.0 / lr_decay_factor)
+        # batches before this one in the first epoch were already trained before the training was resumed
+        resume_batch_i = 0
+        if (training_state is not None):
+            if (training_state['num_train_batches'] != batch_generator.num_batches):
+                print('ERROR: The training set differs from the one of the resumed training, the data order cannot be restored!')
+            epoch = training_state['epoch']
+            resume_batch_i = training_state['next_batch_i']
+            total_trained_batches_counter = training_state['total_trained_batches_counter']
+            for key in early_stopping_state:
+                early_stopping_state[key] = training_state[key]
+            self.lr = training_state['lr']
+            if (is_main_process):
+                print('[RNN] Resuming training at epoch', epoch, '| Batch', resume_batch_i, '| Total batches trained:', total_trained_batches_counter)
+        
+        # use a fixed stratified sample of the validation set for the validation checks
+        is_val_sampled = val_sample_size != None and val_sample_size < len(val_inputs)
+        if (is_val_sampled):
+            val_sample_indices = rnn_evaluator.get_stratified_sample_indices(val_targets, val_sample_size, self.system_param_dict['val_sample_seed_rnn'])
+            val_population_size = len(val_inputs)
+            val_inputs = [val_inputs[i] for i in val_sample_indices]
+            val_targets = [val_targets[i] for i in val_sample_indices]
+            if (is_main_process):
+                print('[RNN] Validation checks on a stratified sample of', len(val_inputs), '/', val_population_size, 'tweets')
+        
+        def evaluate_validation_set():
+            # returns a dict with the mean loss and accuracy (and their confidence intervals when sampled)
+            if (is_val_sampled):
+                return rnn_evaluator.evaluate_data_set_with_confidence(val_inputs, val_targets, population_size=val_population_size)
+            cur_val_mean_loss, cur_val_accuracy = rnn_evaluator.evaluate_data_set(val_inputs, val_targets, n_highest_probs=1)
+            return {'mean_loss': cur_val_mean_loss, 'accuracy': cur_val_accuracy}
+        
+        # evaluate the validation checks in a separate process while the training continues (CPU only)
+        async_evaluator = None
+        if (self.system_param_dict['async_validation_rnn'] and is_main_process):
+            if (self.cuda_is_avail):
+                print('ERROR: Asynchronous validation is only supported on the CPU, validating synchronously instead.')
+            else:
+                from evaluation import AsyncEvaluator
+                async_evaluator = AsyncEvaluator.AsyncEvaluator(self, evaluate_validation_set)
+                async_evaluator.start()
+        
         # train until stopping criterium is satisfied or max_num_epochs is reached
-        while continue_training and epoch < max_num_epochs:
+        while early_stopping_state['continue_training'] and epoch < max_num_epochs:
             for batch_i, (input_batch, target_batch) in enumerate(batch_generator):
-                if (continue_training):  
+                if (batch_i < resume_batch_i):
+                    continue
+                if (early_stopping_state['continue_training']):
                     self.zero_grad()
                     batch_loss_acc = 0
-                    # for every tweet in the batch
-                    for tweet_input, tweet_target in zip(input_batch, target_batch):
-                        hidden = self.initHidden()
-                        output, hidden = self(tweet_input, hidden)
-                        # transform 3D to 2D tensor for the criterion function
-                        dims = list(tweet_input.size())
-                        output = output.view(dims[0], -1)
-                        
-                        loss = self.criterion(output, tweet_target)
-                        loss.backward()
-                        batch_loss_acc += loss.data[0]
+                    # for every tweet in the batch (data-parallel: only every world_size-th tweet, starting at rank)
+                    for tweet_input, tweet_target in zip(input_batch[rank::world_size], target_batch[rank::world_size]):
+                        batch_loss_acc += self.__train_tweet(tweet_input, tweet_target)
+                    # sum up the gradients and losses of all shards, so every worker does the same update
+                    # as a single process would do on the whole batch
+                    if (is_data_parallel):
+                        batch_loss_acc = self.__all_reduce_gradients_and_loss(batch_loss_acc)
                     batch_mean_loss = batch_loss_acc / batch_size
-                    if (batch_i % 10 == 0):
+                    if (batch_i % 10 == 0 and is_main_process):
                         print('[RNN] Epoch', epoch, '| Batch', batch_i, '/', num_train_batches_minus_one, '| Training mean loss: ', batch_mean_loss)
                     self.optimizer.step()
                     
-                    # evaluate validation set every eval_every_num_batches
-                    if (total_trained_batches_counter % eval_every_num_batches == 0):
-                        cur_val_mean_loss, cur_val_accuracy = rnn_evaluator.evaluate_data_set(val_inputs,
-                                                                                              val_targets,
-                                                                                              n_highest_probs=1)
-                        print('========================================')
-                        print('[RNN] Epoch', epoch, '| Batch', batch_i, '/', num_train_batches_minus_one, '| Validation mean loss: ', cur_val_mean_loss)
-                        print('========================================')
-                        print('[RNN] Epoch', epoch, '| Batch', batch_i, '/', num_train_batches_minus_one, '| Validation accuracy: ', cur_val_accuracy)
-                        print('========================================')
-                        
-                        # check if accuracy is better than the best accuracy observed so far
-                        if (best_val_accuracy < cur_val_accuracy):
-                            best_val_accuracy = cur_val_accuracy
-                            
-                        # check if loss improved, and if so, save model checkpoint to file
-                        # and reset eval_checks_not_improved_counter as model is improving (again)
-                        if (best_val_mean_loss > cur_val_mean_loss):
-                            best_val_mean_loss = cur_val_mean_loss
-                            eval_checks_not_improved_counter = 0
-                            self.save_model_checkpoint_to_file({
-                                                                'system_param_dict': self.system_param_dict,
-                                                                'results_dict': {
-                                                                                'start_epoch': epoch + 1,
-                                                                                'start_total_trained_batches_counter': total_trained_batches_counter + 1,
-                                                                                'best_val_mean_loss': best_val_mean_loss,
-                                                                                'best_val_accuracy': best_val_accuracy,
-                                                                                'state_dict': self.state_dict(),
-                                                                                'optimizer': self.optimizer.state_dict(),
-                                                                                'vocab_chars': self.vocab_chars,
-                                                                                'vocab_lang': self.vocab_lang,
-                                                                                },
-                                                                },
-                                                                rnn_model_checkpoint_rel_path)
-                        # as model is not improving: increment counter to stop, and eventually start decreasing the learning rate;
-                        # if counter equals max_eval_checks_not_improved then stop training
+                    # position of the training after this batch
+                    progress = {
+                                'epoch': epoch,
+                                'batch_i': batch_i,
+                                'num_train_batches': batch_generator.num_batches,
+                                'total_trained_batches_counter': total_trained_batches_counter,
+                                }
+                    # apply the result of an asynchronous validation check as soon as it is available
+                    # (data-parallel: only at the validation checks, where the decisions are sent to all workers)
+                    if (async_evaluator is not None and not is_data_parallel):
+                        result = async_evaluator.poll_result()
+                        if (result is not None):
+                            self.__apply_validation_result(result, early_stopping_state, progress)
+                    
+                    # evaluate validation set every eval_every_num_batches (data-parallel: only on rank 0)
+                    if (total_trained_batches_counter % eval_every_num_batches == 0 and is_main_process):
+                        if (async_evaluator is not None):
+                            # only one check at a time: wait for the previous one before submitting the next
+                            result = async_evaluator.wait_for_result()
+                            if (result is not None):
+                                self.__apply_validation_result(result, early_stopping_state, progress)
+                            async_evaluator.submit(self.__get_snapshot(progress))
                         else:
-                            print('Not improved evaluation checks:', eval_checks_not_improved_counter, '/', max_eval_checks_not_improved_minus_one)
-                            eval_checks_not_improved_counter += 1
-                            # when half of maximal not improved eval checks is reached:
-                            # decrease learning rate every eval check as long as there is no improvement
-                            if (eval_checks_not_improved_counter >= max_eval_checks_not_improved_half):
-                                self.lr = self.lr * lr_decay_factor
-                                for param_group in self.optimizer.param_groups:
-                                    param_group['lr'] = self.lr
-                                print('Learning rate decreased to:', self.lr)
-                            # stop training when maximum of not improved eval checks is reached
-                            if (eval_checks_not_improved_counter == max_eval_checks_not_improved):
-                                continue_training = False
+                            self.__apply_validation_result((evaluate_validation_set(), None), early_stopping_state, progress)
+                    # let all workers continue with the learning rate and stopping decision of rank 0
+                    if (total_trained_batches_counter % eval_every_num_batches == 0 and is_data_parallel):
+                        early_stopping_state['continue_training'] = self.__broadcast_lr_and_continue_training(early_stopping_state['continue_training'])
                 total_trained_batches_counter += 1
             epoch += 1
+            resume_batch_i = 0
+        # apply the last asynchronous validation check
+        if (async_evaluator is not None):
+            result = async_evaluator.wait_for_result()
+            if (result is not None):
+                self.__apply_validation_result(result, early_stopping_state, progress)
+            async_evaluator.stop()
+        self.flush_checkpoints()
+
+    def __train_tweet(self, tweet_input, tweet_target):
+        """
+        Forward and backward propagation of one tweet (the gradients are accumulated).
+        Tweets longer than max_train_seq_len_rnn are randomly cropped to that length, and for
+        unidirectional models tweets longer than tbptt_len_rnn are trained with truncated
+        backpropagation through time, so the memory does not grow with the tweet length.
+        
+        Args:
+            tweet_input: One tensor of input size, i.e. one tweet.
+            tweet_target: Target for each character of the tweet.
+
+        Returns:
+            The loss of the tweet.
+        """
+        max_train_seq_len = self.system_param_dict['max_train_seq_len_rnn']
+        tbptt_len = self.system_param_dict['tbptt_len_rnn']
+        seq_len = tweet_input.size()[0]
+        # random crop
+        if (max_train_seq_len != None and seq_len > max_train_seq_len):
+            crop_start = random.randint(0, seq_len - max_train_seq_len)
+            tweet_input = tweet_input[crop_start:crop_start + max_train_seq_len]
+            tweet_target = tweet_target[crop_start:crop_start + max_train_seq_len]
+            seq_len = max_train_seq_len
+        # a bidirectional model needs the whole sequence for its backward direction
+        if (tbptt_len == None or self.is_bidirectional):
+            tbptt_len = seq_len
+        tweet_loss = 0
+        hidden = self.initHidden()
+        for chunk_start in range(0, seq_len, tbptt_len):
+            chunk_input = tweet_input[chunk_start:chunk_start + tbptt_len]
+            chunk_target = tweet_target[chunk_start:chunk_start + tbptt_len]
+            output, hidden = self(chunk_input, hidden)
+            dims = list(chunk_input.size())
+            # a tweet-level classification head predicts once per chunk
+            if (self.classification_head != 'per_char'):
+                chunk_target = chunk_target[:1]
+            
+            # weight the chunk's mean loss with its share of the tweet, so the chunk losses sum up to the tweet's mean loss
+            loss = self.criterion(output, chunk_target) * (dims[0] / float(seq_len))
+            loss.backward()
+            tweet_loss += loss.item()
+            # truncate the backpropagation at the chunk border
+            hidden = hidden.detach()
+        return tweet_loss
+
+    def forward_chunks(self, inp):
+        """
+        Forward propagation of a tweet in chunks of max_eval_chunk_len_rnn characters, so the memory and
+        latency of a single forward pass are bounded. A unidirectional model carries the hidden state
+        from one chunk to the next; a bidirectional model processes every chunk on its own
+        (the predictions of the chunks are aggregated by the caller).
+        
+        Args:
+            inp: One tensor of input size, i.e. one tweet.
+
+        Yields:
+            output: Prediction for the chunk.
+            chunk_start: Index of the first character of the chunk.
+            chunk_end: Index after the last character of the chunk.
+        """
+        chunk_len = self.system_param_dict['max_eval_chunk_len_rnn']
+        seq_len = inp.size()[0]
+        if (chunk_len == None):
+            chunk_len = seq_len
+        hidden = self.initHidden()
+        for chunk_start in range(0, seq_len, chunk_len):
+            chunk_end = min(chunk_start + chunk_len, seq_len)
+            if (self.is_bidirectional):
+                hidden = self.initHidden()
+            output, hidden = self(inp[chunk_start:chunk_end], hidden)
+            yield output, chunk_start, chunk_end
+
+    def __get_snapshot(self, progress):
+        """
+        Copies the model weights and the optimizer state, e.g. to evaluate them asynchronously
+        while the training continues.
+        
+        Args:
+            progress: Position of the training at which the snapshot is taken.
+
+        Returns:
+            snapshot: Dict containing the copied state_dict and optimizer state as well as the progress.
+        """
+        return {
+                'progress': progress,
+                'state_dict': collections.OrderedDict((key, value.clone()) for key, value in self.state_dict().items()),
+                'optimizer': copy.deepcopy(self.optimizer.state_dict()),
+                }
+
+    def __apply_validation_result(self, result, early_stopping_state, progress):
+        """
+        Applies the result of a validation check: saves the model checkpoint if the loss improved,
+        otherwise counts the not improved checks, decays the learning rate and stops the training.
+        Afterwards the whole training state is saved to be able to resume from here.
+        
+        Args:
+            result: Tuple of the validation result dict (mean_loss, accuracy and optionally their confidence intervals)
+                and the evaluated snapshot ('None' if the current weights were evaluated).
+            early_stopping_state: Dict containing the best values, counters and stopping decision (updated in place).
+            progress: Current position of the training.
+        """
+        max_eval_checks_not_improved = self.system_param_dict['max_eval_checks_not_improved_rnn']
+        max_eval_checks_not_improved_minus_one = max_eval_checks_not_improved - 1
+        max_eval_checks_not_improved_half = max_eval_checks_not_improved / 2
+        lr_decay_factor = self.system_param_dict['lr_decay_factor_rnn']
+        val_result, snapshot = result
+        cur_val_mean_loss = val_result['mean_loss']
+        cur_val_accuracy = val_result['accuracy']
+        # the evaluated weights may be older than the current ones
+        if (snapshot is None):
+            evaluated_progress = progress
+            evaluated_state_dict = self.state_dict()
+            evaluated_optimizer = self.optimizer.state_dict()
+        else:
+            evaluated_progress = snapshot['progress']
+            evaluated_state_dict = snapshot['state_dict']
+            evaluated_optimizer = snapshot['optimizer']
+        epoch = evaluated_progress['epoch']
+        batch_i = evaluated_progress['batch_i']
+        num_train_batches_minus_one = evaluated_progress['num_train_batches'] - 1
+        if ('mean_loss_ci' in val_result):
+            loss_string = '%s (+/- %s)' % (cur_val_mean_loss, val_result['mean_loss_ci'])
+            accuracy_string = '%s (+/- %s)' % (cur_val_accuracy, val_result['accuracy_ci'])
+        else:
+            loss_string = cur_val_mean_loss
+            accuracy_string = cur_val_accuracy
+        print('========================================')
+        print('[RNN] Epoch', epoch, '| Batch', batch_i, '/', num_train_batches_minus_one, '| Validation mean loss: ', loss_string)
+        print('========================================')
+        print('[RNN] Epoch', epoch, '| Batch', batch_i, '/', num_train_batches_minus_one, '| Validation accuracy: ', accuracy_string)
+        print('========================================')
+        
+        # check if accuracy is better than the best accuracy observed so far
+        if (early_stopping_state['best_val_accuracy'] < cur_val_accuracy):
+            early_stopping_state['best_val_accuracy'] = cur_val_accuracy
+            
+        # check if loss improved, and if so, save model checkpoint to file
+        # and reset eval_checks_not_improved_counter as model is improving (again)
+        if (early_stopping_state['best_val_mean_loss'] > cur_val_mean_loss):
+            early_stopping_state['best_val_mean_loss'] = cur_val_mean_loss
+            early_stopping_state['eval_checks_not_improved_counter'] = 0
+            self.save_model_checkpoint_to_file({
+                                                'system_param_dict': self.system_param_dict,
+                                                'results_dict': {
+                                                                'start_epoch': epoch + 1,
+                                                                'start_total_trained_batches_counter': evaluated_progress['total_trained_batches_counter'] + 1,
+                                                                'best_val_mean_loss': early_stopping_state['best_val_mean_loss'],
+                                                                'best_val_accuracy': early_stopping_state['best_val_accuracy'],
+                                                                'state_dict': evaluated_state_dict,
+                                                                'optimizer': evaluated_optimizer,
+                                                                'vocab_chars': self.vocab_chars,
+                                                                'vocab_lang': self.vocab_lang,
+                                                                },
+                                                },
+                                                self.system_param_dict['rnn_model_checkpoint_rel_path'])
+        # as model is not improving: increment counter to stop, and eventually start decreasing the learning rate;
+        # if counter equals max_eval_checks_not_improved then stop training
+        else:
+            print('Not improved evaluation checks:', early_stopping_state['eval_checks_not_improved_counter'], '/', max_eval_checks_not_improved_minus_one)
+            early_stopping_state['eval_checks_not_improved_counter'] += 1
+            # when half of maximal not improved eval checks is reached:
+            # decrease learning rate every eval check as long as there is no improvement
+            if (early_stopping_state['eval_checks_not_improved_counter'] >= max_eval_checks_not_improved_half):
+                self.lr = self.lr * lr_decay_factor
+                for param_group in self.optimizer.param_groups:
+                    param_group['lr'] = self.lr
+                print('Learning rate decreased to:', self.lr)
+            # stop training when maximum of not improved eval checks is reached
+            if (early_stopping_state['eval_checks_not_improved_counter'] == max_eval_checks_not_improved):
+                early_stopping_state['continue_training'] = False
+        
+        # save the whole training state to be able to resume from here
+        training_state = {
+                          'epoch': progress['epoch'],
+                          'next_batch_i': progress['batch_i'] + 1,
+                          'num_train_batches': progress['num_train_batches'],
+                          'total_trained_batches_counter': progress['total_trained_batches_counter'] + 1,
+                          'lr': self.lr,
+                          'rng_states': self.__get_rng_states(),
+                          'state_dict': self.state_dict(),
+                          'optimizer': self.optimizer.state_dict(),
+                          'vocab_chars': self.vocab_chars,
+                          'vocab_lang': self.vocab_lang,
+                          }
+        training_state.update(early_stopping_state)
+        self.save_model_checkpoint_to_file({
+                                            'system_param_dict': self.system_param_dict,
+                                            'training_state': training_state,
+                                            },
+                                            self.system_param_dict['rnn_resume_checkpoint_rel_path'])
+
+    def broadcast_parameters(self):
+        """
+        Overwrites the model parameters of every worker process with the ones of rank 0,
+        so all workers of a data-parallel training start from the same weights.
+        """
+        import torch.distributed as dist
+        for param in self.parameters():
+            dist.broadcast(param.data, src=0)
+
+    def __all_reduce_gradients_and_loss(self, batch_loss_acc):
+        """
+        Sums up the gradients and the accumulated loss of all worker processes.
+        All gradients are flattened into one buffer so only one collective call is needed.
+        
+        Args:
+            batch_loss_acc: Accumulated loss of the tweets of this worker's shard.
+
+        Returns:
+            The accumulated loss of the whole batch.
+        """
+        import torch.distributed as dist
+        params = [param for param in self.parameters() if param.requires_grad]
+        grads = []
+        for param in params:
+            # a worker without any tweet in its shard has no gradients yet
+            if (param.grad is None):
+                grads.append(torch.zeros(param.data.numel()).type_as(param.data))
+            else:
+                grads.append(param.grad.data.view(-1))
+        grads.append(torch.FloatTensor([batch_loss_acc]).type_as(grads[0]))
+        flat_buffer = torch.cat(grads)
+        dist.all_reduce(flat_buffer, op=dist.ReduceOp.SUM)
+        offset = 0
+        for param in params:
+            numel = param.data.numel()
+            reduced_grad = flat_buffer[offset:offset + numel].view_as(param.data)
+            if (param.grad is None):
+                param.grad = reduced_grad.clone()
+            else:
+                param.grad.data.copy_(reduced_grad)
+            offset += numel
+        return float(flat_buffer[offset])
+
+    def __broadcast_lr_and_continue_training(self, continue_training):
+        """
+        Sends the learning rate and the stopping decision of rank 0 to all worker processes
+        and applies the learning rate to their optimizers.
+        
+        Args:
+            continue_training: Stopping decision of this worker (only used on rank 0).
+
+        Returns:
+            continue_training: Stopping decision of rank 0.
+        """
+        # self.lr is not necessarily the learning rate of the optimizer (it is increased before the first decay)
+        import torch.distributed as dist
+        control = torch.DoubleTensor([self.lr, self.optimizer.param_groups[0]['lr'], float(continue_training)])
+        dist.broadcast(control, src=0)
+        self.lr = float(control[0])
+        for param_group in self.optimizer.param_groups:
+            param_group['lr'] = float(control[1])
+        return bool(control[2] > 0.5)
             
     def save_model_checkpoint_to_file(self, state, relative_path_to_file):
         """
         Saves a model state (checkpoint) to file.
+        With async_checkpoint_writing, the state is snapshotted and written in the background;
+        call flush_checkpoints to wait until it is on disk.
         
         Args:
             state: Dict containing the model state to be saved.
             relative_path_to_file: Relative path for the save file.
         """
-        torch.save(state, relative_path_to_file)
-        print('Model checkpoint saved to file:', relative_path_to_file)
+        if (self.checkpoint_writer is None):
+            from . import CheckpointWriter
+            self.checkpoint_writer = CheckpointWriter.CheckpointWriter(is_async=self.system_param_dict['async_checkpoint_writing'],
+                                                                       keep_last_num_checkpoints=self.system_param_dict['keep_last_num_checkpoints'])
+        self.checkpoint_writer.save(state, relative_path_to_file)
+        
+    def flush_checkpoints(self):
+        """
+        Blocks until all saved model states (checkpoints) are written to file.
+        """
+        if (self.checkpoint_writer is not None):
+            self.checkpoint_writer.flush()
         
     def load_model_checkpoint_from_file(self, relative_path_to_file):
         """
@@ -235,11 +614,66 @@ class GRUModel(nn.Module):
             state: The loaded model state.
         """
         state = torch.load(relative_path_to_file)
+        self.load_model_checkpoint(state)
+        print('Model checkpoint loaded from file:', relative_path_to_file)
+        return state
+
+    def load_model_checkpoint(self, state):
+        """
+        Initializes some model parameters with an already loaded model state (checkpoint).
+        
+        Args:
+            state: The loaded model state.
+        """
         results_dict = state['results_dict']
         self.load_state_dict(results_dict['state_dict'])
-        self.optimizer.load_state_dict(results_dict['optimizer'])
+        if (self.optimizer is not None):
+            self.optimizer.load_state_dict(results_dict['optimizer'])
         self.vocab_chars = results_dict['vocab_chars']
         self.vocab_lang = results_dict['vocab_lang']
 #        self.eval() # set model to evaluation mode (instead of default initialized train mode)
-        print('Model checkpoint loaded from file:', relative_path_to_file)
-        return state
\ No newline at end of file
+
+    def load_training_state_from_file(self, relative_path_to_file):
+        """
+        Loads a training state saved during the training from file, restores the model, the optimizer
+        and the RNG states with it and returns it to be passed to the train method.
+        
+        Args:
+            relative_path_to_file: Relative path to the resume checkpoint file.
+
+        Returns:
+            training_state: The loaded training state.
+        """
+        training_state = torch.load(relative_path_to_file)['training_state']
+        self.load_state_dict(training_state['state_dict'])
+        self.optimizer.load_state_dict(training_state['optimizer'])
+        self.vocab_chars = training_state['vocab_chars']
+        self.vocab_lang = training_state['vocab_lang']
+        self.__set_rng_states(training_state['rng_states'])
+        print('Training state loaded from file:', relative_path_to_file)
+        return training_state
+
+    def __get_rng_states(self):
+        """
+        Returns:
+            rng_states: The states of all random number generators used in the training.
+        """
+        rng_states = {
+                      'python': random.getstate(),
+                      'numpy': np.random.get_state(),
+                      'torch': torch.get_rng_state(),
+                      }
+        if (self.cuda_is_avail):
+            rng_states['torch_cuda'] = torch.cuda.get_rng_state()
+        return rng_states
+
+    def __set_rng_states(self, rng_states):
+        """
+        Args:
+            rng_states: The states of all random number generators used in the training.
+        """
+        random.setstate(rng_states['python'])
+        np.random.set_state(rng_states['numpy'])
+        torch.set_rng_state(rng_states['torch'])
+        if (self.cuda_is_avail and 'torch_cuda' in rng_states):
+            torch.cuda.set_rng_state(rng_states['torch_cuda'])
\ No newline at end of file
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import json
+import struct
+import sys
+import warnings
+import numpy as np
+import torch
+
+
+ARTIFACT_MAGIC = b'NNLANGID'
+ARTIFACT_FORMAT_VERSION = 1
+ARRAY_ALIGNMENT = 64    # bytes; every array starts at a multiple of this offset
+
+
+class InferenceArtifact(object):
+    """Class for writing and reading the slim inference artifact of a trained model.
+    
+    The artifact is one file with everything needed for the classification: the model weights, the embedding table
+    and the index -> character and index -> language arrays, without the optimizer state and the training results.
+    Layout: magic bytes, the header length as little-endian uint64, a JSON header (architecture, vocabularies and
+    dtype, shape and offset of every array) and the raw arrays, each aligned to ARRAY_ALIGNMENT bytes.
+    The file is read with np.memmap, so the float32 arrays are used without copying them;
+    float16 and int8 (one float32 scale per row of each matrix) arrays are converted to float32 when loaded.
+    """
+    
+    def export(self, language_identifier, relative_path_to_file, weights_dtype='float32'):
+        """
+        Writes the artifact of a loaded float32 model (atomically).
+        
+        Args:
+            language_identifier: LanguageIdentifier with the model to export.
+            relative_path_to_file: Relative path for the artifact file.
+            weights_dtype: 'float32', 'float16' or 'int8' for the weight matrices and the embedding table
+                (biases always stay float32).
+        """
+        if (weights_dtype not in ['float32', 'float16', 'int8']):
+            print('ERROR: Unknown artifact weights dtype', weights_dtype, '(float32, float16 or int8)!')
+            return
+        model = language_identifier.model
+        named_arrays = [('embed.weight', language_identifier.embed.weight.data.float().cpu().numpy())]
+        for name, tensor in model.state_dict().items():
+            named_arrays.append((name, tensor.float().cpu().numpy()))
+        
+        arrays = []
+        array_infos = {}
+        offset = 0
+        for name, array in named_arrays:
+            for stored_name, stored_array in self.__convert_array(name, array, weights_dtype):
+                stored_array = np.ascontiguousarray(stored_array)
+                array_infos[stored_name] = {'dtype': stored_array.dtype.str,
+                                            'shape': list(stored_array.shape),
+                                            'offset': offset}
+                arrays.append(stored_array)
+                offset = self.__align(offset + stored_array.nbytes)
+        header = {'format_version': ARTIFACT_FORMAT_VERSION,
+                  'weights_dtype': weights_dtype,
+                  'model': {'hidden_size_rnn': model.hidden_size,
+                            'num_layers_rnn': model.num_layers,
+                            'is_bidirectional': model.is_bidirectional,
+                            'classification_head_rnn': model.classification_head,
+                            'num_classes': model.num_classes},
+                  'index2char': self.__index2string_list(language_identifier.vocab_chars),
+                  'index2lang': self.__index2string_list(language_identifier.vocab_lang),
+                  'source_checkpoint': language_identifier.model_checkpoint_rel_path,
+                  'arrays': array_infos}
+        header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        
+        def write_artifact(file):
+            file.write(ARTIFACT_MAGIC)
+            file.write(struct.pack('<Q', len(header_bytes)))
+            file.write(header_bytes)
+            data_start = self.__align(len(ARTIFACT_MAGIC) + 8 + len(header_bytes))
+            file.write(b'\0' * (data_start - (len(ARTIFACT_MAGIC) + 8 + len(header_bytes))))
+            position = 0
+            for array in arrays:
+                file.write(array.tobytes())
+                position += array.nbytes
+                file.write(b'\0' * (self.__align(position) - position))
+                position = self.__align(position)
+        
+        # the writer is only imported by the export, loading an artifact does not need it
+        from . import CheckpointWriter
+        CheckpointWriter.CheckpointWriter(is_async=False).submit(write_artifact, relative_path_to_file)
+
+    def load(self, relative_path_to_file):
+        """
+        Reads an artifact.
+        
+        Args:
+            relative_path_to_file: Relative path to the artifact file.
+
+        Returns:
+            header: Dict with the header of the artifact ('None' if the file is no artifact).
+            tensors: Dict of {name: float32 tensor} with the embedding table ('embed.weight') and the model's state_dict.
+        """
+        data = np.memmap(relative_path_to_file, dtype=np.uint8, mode='r')
+        if (bytes(data[:len(ARTIFACT_MAGIC)]) != ARTIFACT_MAGIC):
+            print('ERROR: The file is no inference artifact:', relative_path_to_file, file=sys.stderr)
+            return None, None
+        header_len = struct.unpack('<Q', bytes(data[len(ARTIFACT_MAGIC):len(ARTIFACT_MAGIC) + 8]))[0]
+        header = json.loads(bytes(data[len(ARTIFACT_MAGIC) + 8:len(ARTIFACT_MAGIC) + 8 + header_len]).decode('utf-8'))
+        if (header['format_version'] != ARTIFACT_FORMAT_VERSION):
+            print('ERROR: Unsupported inference artifact format version', header['format_version'], file=sys.stderr)
+            return None, None
+        data_start = self.__align(len(ARTIFACT_MAGIC) + 8 + header_len)
+        arrays = {}
+        for name, info in header['arrays'].items():
+            dtype = np.dtype(info['dtype'])
+            count = int(np.prod(info['shape']))
+            # a view into the memory mapped file, nothing is read until it is used
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=data_start + info['offset']).reshape(info['shape'])
+        
+        tensors = {}
+        for name, array in arrays.items():
+            if (name.endswith('.scale')):
+                continue
+            if (array.dtype == np.int8):
+                array = array.astype(np.float32) * arrays[name + '.scale'][:, np.newaxis]
+            elif (array.dtype != np.float32):
+                array = array.astype(np.float32)
+            with warnings.catch_warnings():
+                # the memory mapped arrays are read-only, the tensors are only read as well
+                warnings.simplefilter('ignore')
+                tensors[name] = torch.from_numpy(array)
+        return header, tensors
+
+    def __convert_array(self, name, array, weights_dtype):
+        """
+        Converts an array to the stored dtype.
+        
+        Args:
+            name: Name of the array.
+            array: float32 array.
+            weights_dtype: 'float32', 'float16' or 'int8'.
+
+        Returns:
+            List of (name, array) tuples to store (int8 matrices come with a '<name>.scale' array).
+        """
+        if (array.ndim < 2 or weights_dtype == 'float32'):
+            return [(name, array.astype(np.float32))]
+        if (weights_dtype == 'float16'):
+            return [(name, array.astype(np.float16))]
+        # symmetric int8 quantization with one scale per row
+        scale = np.abs(array).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        quantized = np.clip(np.round(array / scale[:, np.newaxis]), -127, 127).astype(np.int8)
+        return [(name, quantized), (name + '.scale', scale.astype(np.float32))]
+
+    def __index2string_list(self, vocab_dict):
+        """
+        Args:
+            vocab_dict: Vocabulary in the form: {string: (index, frequency)}.
+
+        Returns:
+            List with the string of each index.
+        """
+        index2string = [None] * len(vocab_dict)
+        for string, (index, _) in vocab_dict.items():
+            index2string[index] = string
+        return index2string
+
+    def __align(self, offset):
+        """
+        Args:
+            offset: Byte offset.
+
+        Returns:
+            The next multiple of ARRAY_ALIGNMENT.
+        """
+        return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
\ No newline at end of file
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import os
+import sys
+import torch
+
+
+# multiplier of the rolling n-gram hash and the number of texts hashed at once
+HASH_MULTIPLIER = 1000003
+TEXTS_PER_CHUNK = 4096
+
+
+class NgramClassifier(object):
+    """Class for a multinomial naive Bayes classifier on hashed character n-grams.
+    
+    Every character n-gram (n = 1 .. ngram_max_order) of an indexed tweet is hashed into one of ngram_num_buckets
+    buckets, and the language is the one with the highest prior times product of its bucket probabilities
+    (Laplace smoothed counts). The counting for the training and the scoring are vectorized over all n-grams of
+    a chunk of tweets, so the classifier is trained in one pass over the training set and classifies far cheaper
+    than the GRU. It is used as the first stage of a cascade in front of the GRU (see ngram_cascade).
+    """
+    
+    def __init__(self, vocab_chars, vocab_lang, system_param_dict):
+        """
+        Args:
+            vocab_chars: Every character occurence as a dict of {character: (index, occurrences)}.
+            vocab_lang: Every language occurence as a dict of {language: (index, occurences)}.
+            system_param_dict: Dict containing the system parameters.
+        """
+        self.vocab_chars = vocab_chars
+        self.vocab_lang = vocab_lang
+        self.max_order = system_param_dict['ngram_max_order']
+        self.num_buckets = system_param_dict['ngram_num_buckets']
+        self.smoothing = 1.0
+        self.bucket_log_probs = None    # (num_buckets, num_classes)
+        self.log_priors = None          # (num_classes)
+
+    @staticmethod
+    def rel_path_for(model_rel_path):
+        """
+        Returns:
+            The path of the n-gram classifier stored alongside a model checkpoint or inference artifact.
+        """
+        return os.path.splitext(model_rel_path)[0] + '_ngram.pth'
+
+    def train(self, train_set_indexed):
+        """
+        Counts the n-grams of every language.
+        
+        Args:
+            train_set_indexed: Indexed tweets as list of (character indices, language index) (see InputData.get_indexed_data).
+        """
+        num_classes = len(self.vocab_lang)
+        counts = torch.zeros(self.num_buckets * num_classes)
+        class_counts = torch.zeros(num_classes)
+        for chunk_start in range(0, len(train_set_indexed), TEXTS_PER_CHUNK):
+            chunk = train_set_indexed[chunk_start:chunk_start + TEXTS_PER_CHUNK]
+            targets = torch.LongTensor([lang_index for _, lang_index in chunk])
+            class_counts.index_add_(0, targets, torch.ones(len(chunk)))
+            text_ids, buckets = self.__hash_ngrams([indexed_text for indexed_text, _ in chunk])
+            counts.index_add_(0, buckets * num_classes + targets[text_ids], torch.ones(len(buckets)))
+        counts = counts.view(self.num_buckets, num_classes)
+        self.bucket_log_probs = ((counts + self.smoothing) / (counts.sum(0) + self.smoothing * self.num_buckets)).log()
+        self.log_priors = ((class_counts + 1) / (class_counts.sum() + num_classes)).log()
+
+    def predict(self, indexed_texts):
+        """
+        Args:
+            indexed_texts: List of character index lists.
+
+        Returns:
+            probs: Tensor of size (num_texts, num_classes) with the posterior probability of each language.
+        """
+        probs = []
+        for chunk_start in range(0, len(indexed_texts), TEXTS_PER_CHUNK):
+            chunk = indexed_texts[chunk_start:chunk_start + TEXTS_PER_CHUNK]
+            scores = self.log_priors.unsqueeze(0).repeat(len(chunk), 1)
+            text_ids, buckets = self.__hash_ngrams(chunk)
+            if (len(buckets) > 0):
+                scores.index_add_(0, text_ids, self.bucket_log_probs[buckets])
+            probs.append(torch.softmax(scores, dim=1))
+        if (probs == []):
+            return torch.zeros(0, len(self.vocab_lang))
+        return torch.cat(probs)
+
+    def evaluate(self, data_set_indexed):
+        """
+        Returns:
+            The accuracy on indexed tweets.
+        """
+        if (data_set_indexed == []):
+            return 0.0
+        predictions = self.predict([indexed_text for indexed_text, _ in data_set_indexed]).max(1)[1]
+        targets = torch.LongTensor([lang_index for _, lang_index in data_set_indexed])
+        return float((predictions == targets).sum()) / len(data_set_indexed)
+
+    def __hash_ngrams(self, indexed_texts):
+        """
+        Hashes all n-grams of the texts into buckets.
+        
+        Args:
+            indexed_texts: List of character index lists.
+
+        Returns:
+            text_ids: LongTensor with the index of the text of every n-gram.
+            buckets: LongTensor with the bucket of every n-gram.
+        """
+        lengths = torch.LongTensor([len(indexed_text) for indexed_text in indexed_texts])
+        flat = torch.LongTensor([char_index for indexed_text in indexed_texts for char_index in indexed_text])
+        num_chars = len(flat)
+        all_text_ids = torch.arange(len(indexed_texts)).repeat_interleave(lengths)
+        starts = torch.cumsum(lengths, 0) - lengths
+        positions = torch.arange(num_chars) - starts[all_text_ids]
+        text_ids = []
+        buckets = []
+        hashes = torch.zeros(num_chars).long()
+        for order in range(1, self.max_order + 1):
+            # the hash of the n-gram starting at every position, extended by one character per order
+            if (num_chars >= order):
+                hashes[:num_chars - order + 1] = (hashes[:num_chars - order + 1] * HASH_MULTIPLIER + flat[order - 1:] + 1) % self.num_buckets
+            is_valid = positions + order <= lengths[all_text_ids]
+            text_ids.append(all_text_ids[is_valid])
+            # the order is mixed in, so n-grams of different orders with the same hash do not collide systematically
+            buckets.append((hashes[is_valid] + order * 7919) % self.num_buckets)
+        return torch.cat(text_ids), torch.cat(buckets)
+
+    def save(self, relative_path_to_file):
+        """
+        Writes the classifier file (atomically).
+        """
+        from . import CheckpointWriter
+        CheckpointWriter.CheckpointWriter(is_async=False).save({'vocab_chars': self.vocab_chars,
+                                                                'vocab_lang': self.vocab_lang,
+                                                                'max_order': self.max_order,
+                                                                'num_buckets': self.num_buckets,
+                                                                'bucket_log_probs': self.bucket_log_probs,
+                                                                'log_priors': self.log_priors},
+                                                              relative_path_to_file)
+        print('N-gram classifier saved to file:', relative_path_to_file)
+
+    def load(self, relative_path_to_file):
+        """
+        Reads a classifier file.
+        """
+        state = torch.load(relative_path_to_file, map_location=lambda storage, location: storage)
+        self.vocab_chars = state['vocab_chars']
+        self.vocab_lang = state['vocab_lang']
+        self.max_order = state['max_order']
+        self.num_buckets = state['num_buckets']
+        self.bucket_log_probs = state['bucket_log_probs']
+        self.log_priors = state['log_priors']
+        print('N-gram classifier loaded from file:', relative_path_to_file, file=sys.stderr)
\ No newline at end of file
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import os
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+class ParallelTraining(object):
+    """Class for the data-parallel training of the GRU model on the CPU.
+    
+    Launches one worker process per training worker. Every worker trains on a shard of each batch
+    and the gradients are all-reduced over the local CPU collective backend (gloo)
+    before the optimizer step. Rank 0 does the validation checks, the learning rate decay
+    and the checkpoint saving.
+    """
+    
+    def __init__(self, system_param_dict):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+        """
+        self.system_param_dict = system_param_dict
+        self.num_workers = system_param_dict['num_train_workers_rnn']
+        self.master_port = system_param_dict['dist_master_port_rnn']
+
+    def train(self, gru_model, train_inputs, train_targets, val_inputs, val_targets, training_state=None):
+        """
+        Trains the model with num_train_workers_rnn worker processes and waits until all have finished.
+        The worker processes are forked, so the model and the data sets are not copied upfront.
+        
+        Args:
+            gru_model: The model to be trained.
+            train_inputs: Set of all tweets to be trained.
+            train_targets: Set of all targets for input tweets.
+            val_inputs: Set of all tweets to be used for validation checks.
+            val_targets: Set of all targets for validation tweets.
+            training_state: If not 'None', the training continues from this training state.
+        """
+        if (self.system_param_dict['batch_size_rnn'] < self.num_workers):
+            print('ERROR: batch_size_rnn has to be at least num_train_workers_rnn!')
+            return
+        # share the threads of the machine between the workers, so they do not oversubscribe the cores
+        num_threads_per_worker = max(1, torch.get_num_threads() // self.num_workers)
+        context = mp.get_context('fork')
+        workers = []
+        for rank in range(self.num_workers):
+            worker = context.Process(target=self.__run_worker,
+                                     args=(rank, num_threads_per_worker, gru_model,
+                                           train_inputs, train_targets, val_inputs, val_targets, training_state))
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        failed_ranks = [rank for rank, worker in enumerate(workers) if worker.exitcode != 0]
+        if (failed_ranks != []):
+            print('ERROR: Training worker processes failed:', failed_ranks)
+
+    def __run_worker(self, rank, num_threads, gru_model, train_inputs, train_targets, val_inputs, val_targets, training_state):
+        """
+        Entry point of one worker process.
+        
+        Args:
+            rank: Rank of the worker process.
+            num_threads: Number of threads the worker may use for intra-op parallelism.
+            gru_model: The model to be trained (the forked copy of the parent's model).
+            train_inputs: Set of all tweets to be trained.
+            train_targets: Set of all targets for input tweets.
+            val_inputs: Set of all tweets to be used for validation checks.
+            val_targets: Set of all targets for validation tweets.
+            training_state: If not 'None', the training continues from this training state.
+        """
+        os.environ['MASTER_ADDR'] = '127.0.0.1'
+        os.environ['MASTER_PORT'] = str(self.master_port)
+        torch.set_num_threads(num_threads)
+        dist.init_process_group(backend='gloo', rank=rank, world_size=self.num_workers)
+        gru_model.broadcast_parameters()
+        gru_model.train(train_inputs=train_inputs,
+                        train_targets=train_targets,
+                        val_inputs=val_inputs,
+                        val_targets=val_targets,
+                        rank=rank,
+                        world_size=self.num_workers,
+                        training_state=training_state)
+        dist.destroy_process_group()
\ No newline at end of file
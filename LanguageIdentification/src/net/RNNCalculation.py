@@ -24,10 +24,11 @@
 
 
 import pprint
+from pathlib import Path
 from input import InputData
 from embedding import SkipGramModel
-from net import GRUModel
-from evaluation import RNNEvaluator
+from net import GRUModel, ParallelTraining
+from evaluation import RNNEvaluator, ParallelEvaluator
 
 
 class RNNCalculation(object):
@@ -51,18 +52,50 @@ class RNNCalculation(object):
             vocab_chars: Every character occurence as a dict of {character: (index, occurrences)}.
             vocab_lang: Every language occurence as a dict of {language: (index, occurences)}.
         """
-        input_and_target_tensors, gru_model = self.__get_model_and_data(data_sets, vocab_chars, vocab_lang, self.system_param_dict['embed_weights_rel_path'], True)
+        input_and_target_tensors, gru_model, _ = self.__get_model_and_data(data_sets, vocab_chars, vocab_lang, self.system_param_dict['embed_weights_rel_path'], True)
         if (len(data_sets) < 2):
             print("ERROR: Two data sets (training, validation) are needed!")
             return
         print('Model:\n', gru_model)
         
+        # continue an interrupted training from the last saved training state
+        training_state = None
+        if (self.system_param_dict['resume_training_rnn']):
+            if (Path(self.system_param_dict['rnn_resume_checkpoint_rel_path']).is_file()):
+                # without a fixed seed the shuffled data (and the char and language indices built from it) differ
+                if (self.system_param_dict['data_shuffle_seed'] == None):
+                    print('ERROR: Resuming the RNN training needs a fixed data_shuffle_seed (the vocabulary indices depend on the data order)!')
+                    return
+                training_state = gru_model.load_training_state_from_file(self.system_param_dict['rnn_resume_checkpoint_rel_path'])
+                input_data = InputData.InputData()
+                if (not input_data.have_same_indices(training_state['vocab_chars'], vocab_chars)
+                    or not input_data.have_same_indices(training_state['vocab_lang'], vocab_lang)):
+                    print('ERROR: The vocabularies of the resumed RNN training differ from the current ones, the training is not resumed!')
+                    return
+            else:
+                print('No RNN training state to resume from found, starting a new training.')
+        
+        # data-parallel training with several worker processes (CPU only)
+        if (self.system_param_dict['num_train_workers_rnn'] > 1):
+            if (self.system_param_dict['cuda_is_avail']):
+                print('ERROR: Data-parallel training is only supported on the CPU, training in a single process instead.')
+            else:
+                parallel_training = ParallelTraining.ParallelTraining(self.system_param_dict)
+                parallel_training.train(gru_model=gru_model,
+                                        train_inputs=input_and_target_tensors[0][0],
+                                        train_targets=input_and_target_tensors[0][1],
+                                        val_inputs=input_and_target_tensors[1][0],
+                                        val_targets=input_and_target_tensors[1][1],
+                                        training_state=training_state)
+                return
+
         # inputs: whole data set, every date contains the embedding of one char in one dimension
         # targets: whole target set, target is set for each character embedding
         gru_model.train(train_inputs=input_and_target_tensors[0][0],
                         train_targets=input_and_target_tensors[0][1],
                         val_inputs=input_and_target_tensors[1][0],
-                        val_targets=input_and_target_tensors[1][1])
+                        val_targets=input_and_target_tensors[1][1],
+                        training_state=training_state)
 
     def test_rnn(self, data_sets, vocab_chars, vocab_lang):
         """
@@ -74,14 +107,39 @@ class RNNCalculation(object):
             vocab_chars: Every character occurence as a dict of {character: (index, occurrences)}.
             vocab_lang: Every language occurence as a dict of {language: (index, occurences)}.
         """
-        input_and_target_tensors, gru_model = self.__get_model_and_data(data_sets, vocab_chars, vocab_lang, self.system_param_dict['embed_weights_rel_path'], True)
+        # the test set is embedded lazily batch by batch instead of up front
+        _, gru_model, embed = self.__get_model_and_data([], vocab_chars, vocab_lang, self.system_param_dict['embed_weights_rel_path'], True)
         state = gru_model.load_model_checkpoint_from_file(self.system_param_dict['rnn_model_checkpoint_rel_path'])
         results_dict = state['results_dict']
         rnn_evaluator = RNNEvaluator.RNNEvaluator(gru_model)
+        input_data = InputData.InputData()
+        test_batch_size = self.system_param_dict['test_batch_size_rnn']
+        if (self.system_param_dict['stream_test_set_rnn']):
+            # read the test set file lazily, preprocessed with the vocabularies of the checkpoint
+            vocab_chars = gru_model.vocab_chars
+            vocab_lang = gru_model.vocab_lang
+            indexed_batches = input_data.iter_indexed_data_batches(data_rel_path=self.system_param_dict['out_te_data_rel_path'],
+                                                                   vocab_chars=vocab_chars,
+                                                                   vocab_lang=vocab_lang,
+                                                                   batch_size=test_batch_size,
+                                                                   fetch_only_langs=self.system_param_dict['fetch_only_langs'],
+                                                                   fetch_only_first_x_tweets=self.system_param_dict['fetch_only_first_x_tweets'])
+        else:
+            indexed_batches = (data_sets[0][batch_start:batch_start + test_batch_size] for batch_start in range(0, len(data_sets[0]), test_batch_size))
 
-        test_mean_loss, test_accuracy, confusion_matrix, precision, recall, f1_score = rnn_evaluator.all_metrics(input_and_target_tensors[0][0],
-                                                                                                                 input_and_target_tensors[0][1],
-                                                                                                                 vocab_lang)
+        # sharded evaluation with several worker processes (CPU only)
+        metrics_accumulator = None
+        if (self.system_param_dict['num_eval_workers_rnn'] > 1):
+            if (self.system_param_dict['cuda_is_avail']):
+                print('ERROR: Parallel evaluation is only supported on the CPU, evaluating in a single process instead.')
+            else:
+                parallel_evaluator = ParallelEvaluator.ParallelEvaluator(self.system_param_dict)
+                metrics_accumulator = parallel_evaluator.accumulate_metrics(gru_model, embed, indexed_batches, len(vocab_lang))
+                if (metrics_accumulator is None):
+                    return
+        if (metrics_accumulator is None):
+            metrics_accumulator = rnn_evaluator.accumulate_metrics(self.__iter_embedded_batches(input_data, indexed_batches, embed), len(vocab_lang))
+        test_mean_loss, test_accuracy, confusion_matrix, precision, recall, f1_score = metrics_accumulator.all_metrics()
         confusion_matrix = rnn_evaluator.to_string_confusion_matrix(confusion_matrix, vocab_lang, 5)
         
         print('Test results:')
@@ -107,6 +165,7 @@ class RNNCalculation(object):
         results_dict['f1_score'] = f1_score
         state['results_dict'] = results_dict
         gru_model.save_model_checkpoint_to_file(state, self.system_param_dict['rnn_model_checkpoint_rel_path'])
+        gru_model.flush_checkpoints()
 
     def print_model_checkpoint(self, vocab_chars, vocab_lang, is_rnn_model):
         """
@@ -118,7 +177,7 @@ class RNNCalculation(object):
             vocab_chars: Every character occurence as a dict of {character: (index, occurrences)}.
             vocab_lang: Every language occurence as a dict of {language: (index, occurences)}.
         """
-        _, model = self.__get_model_and_data([], vocab_chars, vocab_lang, self.system_param_dict['print_model_checkpoint_embed_weights'], is_rnn_model)
+        _, model, _ = self.__get_model_and_data([], vocab_chars, vocab_lang, self.system_param_dict['print_model_checkpoint_embed_weights'], is_rnn_model)
         # check which model shall be printed
         if (is_rnn_model):
             model_checkpoint = self.system_param_dict['print_rnn_model_checkpoint']
@@ -152,6 +211,11 @@ class RNNCalculation(object):
             vocab_chars: Every character occurence as a dict of {character: (index, occurrences)}.
             vocab_lang: Every language occurence as a dict of {language: (index, occurences)}.
             embed_weights_rel_path: Relative path to the used embedding weights.
+
+        Returns:
+            input_and_target_tensors: (inputs, targets) tensor lists of each data set.
+            model: The created model.
+            embed: The embedding object.
         """
         input_data = InputData.InputData()
         embed, num_classes = input_data.create_embed_from_weights_file(embed_weights_rel_path)
@@ -179,7 +243,28 @@ class RNNCalculation(object):
                                                 system_param_dict=self.system_param_dict)
         if (self.system_param_dict['cuda_is_avail']):
             model.cuda()
-        return input_and_target_tensors, model
+        return input_and_target_tensors, model, embed
+
+    def __iter_embedded_batches(self, input_data, indexed_batches, embed):
+        """
+        Lazily create the tensors of batches of indexed tweets.
+        
+        Args:
+            input_data: InputData object.
+            indexed_batches: Iterable of batches of indexed tweets.
+            embed: The embedding object.
+
+        Yields:
+            (inputs, targets) tensor lists of each batch.
+        """
+        for indexed_batch in indexed_batches:
+            inputs, targets = input_data.create_embed_input_and_target_tensors(indexed_texts_and_lang=indexed_batch,
+                                                                               embed_weights_rel_path=None,
+                                                                               embed=embed)
+            if (self.system_param_dict['cuda_is_avail']):
+                inputs = [tensor.cuda() for tensor in inputs]
+                targets = [tensor.cuda() for tensor in targets]
+            yield inputs, targets
 
     def __print_out(self, string_date_tuple):
         """
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import json
+from concurrent.futures import TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from service import MicroBatcher
+
+
+# maximum size of a request body and maximum time a request waits for its result
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+REQUEST_TIMEOUT_SECONDS = 60
+
+
+class ClassificationServer(object):
+    """Class for serving the language identification over HTTP on the local machine.
+    
+    Every connection is handled by its own thread, which submits the texts of a request to a shared MicroBatcher
+    and waits for their result, so concurrent requests are classified together in one batched forward pass.
+    
+    Endpoints:
+        POST /classify with the JSON body {"texts": [...], "top": k} (or {"text": "..."}) answers
+            {"predictions": [[{"lang": ..., "prob": ...}, ...], ...]} with the k most probable languages of every text
+            (an empty list for a text without any known character).
+        GET /health answers {"status": "ok", "queued_texts": ...} (and the statistics of the prediction cache, if used).
+    If the texts of a request do not fit in the queue of max_queue_size texts, /classify answers 503 with a Retry-After header
+    (a request with more than max_queue_size texts is accepted if the queue is empty).
+    """
+    
+    def __init__(self, system_param_dict, language_identifier):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+            language_identifier: LanguageIdentifier used for the classification.
+        """
+        self.host = system_param_dict['service_host']
+        self.port = system_param_dict['service_port']
+        self.micro_batcher = MicroBatcher.MicroBatcher(language_identifier,
+                                                       max_batch_size=system_param_dict['service_max_batch_size'],
+                                                       max_wait_ms=system_param_dict['service_max_wait_ms'],
+                                                       max_queue_size=system_param_dict['service_max_queue_size'],
+                                                       num_workers=system_param_dict['num_service_workers'])
+        self.http_server = None
+
+    def start(self):
+        """
+        Starts the worker threads and binds the server socket (port 0 binds a free port, see self.port).
+        """
+        self.micro_batcher.start()
+        self.http_server = ThreadingHTTPServer((self.host, self.port), self.__create_handler_class())
+        self.http_server.daemon_threads = True
+        self.port = self.http_server.server_address[1]
+
+    def serve_forever(self):
+        """
+        Handles requests until shutdown() is called (from another thread) or the process is interrupted.
+        """
+        print('Serving on http://%s:%d' % (self.host, self.port))
+        try:
+            self.http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.http_server.server_close()
+            self.micro_batcher.stop()
+
+    def shutdown(self):
+        """
+        Stops serve_forever().
+        """
+        self.http_server.shutdown()
+
+    def __create_handler_class(self):
+        """
+        Returns:
+            The request handler class bound to the MicroBatcher of this server.
+        """
+        micro_batcher = self.micro_batcher
+        
+        class ClassificationRequestHandler(BaseHTTPRequestHandler):
+            # keep-alive connections save a TCP handshake per request
+            protocol_version = 'HTTP/1.1'
+            
+            def do_GET(self):
+                if (self.path != '/health'):
+                    self.__send_json(404, {'error': 'unknown path'})
+                    return
+                health = {'status': 'ok', 'queued_texts': micro_batcher.num_queued_texts()}
+                if (micro_batcher.language_identifier.prediction_cache is not None):
+                    health['prediction_cache'] = micro_batcher.language_identifier.prediction_cache.stats()
+                self.__send_json(200, health)
+            
+            def do_POST(self):
+                if (self.path != '/classify'):
+                    self.__send_json(404, {'error': 'unknown path'})
+                    return
+                try:
+                    content_length = int(self.headers['Content-Length'])
+                    if (content_length < 0):
+                        raise ValueError('negative length')
+                except (ValueError, TypeError) as e:
+                    # the body can not be delimited, so the connection can not be reused
+                    self.close_connection = True
+                    self.__send_json(400, {'error': 'invalid Content-Length: %s' % e})
+                    return
+                if (content_length > MAX_REQUEST_BYTES):
+                    self.close_connection = True
+                    self.__send_json(413, {'error': 'request body too large'})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(content_length).decode('utf-8'))
+                    if ('text' in request):
+                        texts = [request['text']]
+                    else:
+                        texts = request['texts']
+                    n_highest_probs = int(request.get('top', 1))
+                    if (not isinstance(texts, list) or not all([isinstance(text, str) for text in texts])
+                        or n_highest_probs < 1):
+                        raise ValueError('texts must be a list of strings and top must be positive')
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    self.__send_json(400, {'error': 'invalid request: %s' % e})
+                    return
+                future = micro_batcher.submit(texts, n_highest_probs)
+                if (future is None):
+                    self.__send_json(503, {'error': 'queue full'}, extra_headers={'Retry-After': '1'})
+                    return
+                try:
+                    lang_predictions = future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+                except TimeoutError:
+                    self.__send_json(504, {'error': 'classification timed out'})
+                    return
+                except Exception as e:
+                    self.__send_json(500, {'error': 'classification failed: %s' % e})
+                    return
+                self.__send_json(200, {'predictions': [[{'lang': lang, 'prob': prob} for lang, prob in lang_prediction]
+                                                       for lang_prediction in lang_predictions]})
+            
+            def __send_json(self, status, body, extra_headers={}):
+                encoded_body = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded_body)))
+                for header, value in extra_headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(encoded_body)
+            
+            def log_message(self, format, *args):
+                # one log line per request would cost more than the classification of a short text
+                pass
+        
+        return ClassificationRequestHandler
\ No newline at end of file
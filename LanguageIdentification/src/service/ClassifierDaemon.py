@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import os
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import TimeoutError
+from evaluation import PredictionCache, IncrementalClassifier
+from service import FramedConnection, MicroBatcher, ModelRegistry
+
+
+# maximum time a request waits for its result
+REQUEST_TIMEOUT_SECONDS = 60
+DEFAULT_MODEL_NAME = 'default'
+
+
+class ClassifierDaemon(object):
+    """Class for keeping loaded models resident and serving classify requests over a local Unix domain socket.
+    
+    Short-lived callers (shell pipelines, cron jobs) only pay for connecting to the socket instead of importing torch
+    and loading a model. Every connection is handled by its own thread and may send any number of requests, each as one
+    frame of a FramedConnection. The models are managed by a ModelRegistry (loaded on first use, evicted under the memory
+    budget, swapped when their files change), and the texts of concurrent requests for the same model are classified
+    together by the model's MicroBatcher, which takes the current model from the registry for every batch.
+    
+    Request: {"texts": [...], "top": k, "model": name} ("model" is optional) or {"command": "models"}.
+    Session request (incremental classification of a growing text, see IncrementalClassifier):
+        {"session": id, "append": fragment} or {"session": id, "text": whole text}, with optional "top" and "model",
+        or {"session": id, "end": true}.
+    Response: {"predictions": [[[lang, prob], ...], ...]} (one list for a session request), {"models": [...]} or {"error": ...}.
+    """
+    
+    def __init__(self, system_param_dict):
+        """
+        Registers the models: the trained model of the terminal as 'default' and one per entry of the daemon_models dict
+        {name: inference artifact path or {"checkpoint": path, "embed_weights": path}}.
+        
+        Args:
+            system_param_dict: Dict containing the system parameters.
+        """
+        self.system_param_dict = system_param_dict
+        self.socket_path = system_param_dict['daemon_socket_path']
+        model_specs = {DEFAULT_MODEL_NAME: ModelRegistry.ModelRegistry.default_model_spec(system_param_dict)}
+        if (system_param_dict['daemon_models'] != None):
+            model_specs.update(system_param_dict['daemon_models'])
+        # one cache for all models (the key contains the model identity), so its size and file are shared
+        prediction_cache = None
+        if (system_param_dict['prediction_cache_size'] > 0):
+            prediction_cache = PredictionCache.PredictionCache(system_param_dict['prediction_cache_size'],
+                                                               system_param_dict['prediction_cache_rel_path'])
+        self.model_registry = ModelRegistry.ModelRegistry(system_param_dict, model_specs, prediction_cache,
+                                                          on_release=self.__release_incremental_classifier)
+        self.micro_batchers = {}
+        # (model, incremental classifier) per model name; dropped when the model is evicted or swapped,
+        # so the sessions start over and the old model can be freed
+        self.incremental_classifiers = {}
+        self.__lock = threading.Lock()
+        self.unix_server = None
+
+    def serve_forever(self):
+        """
+        Binds the socket (only accessible by the current user) and handles requests until the process is interrupted.
+        
+        Returns:
+            False if another daemon is already listening on the socket, else True.
+        """
+        if (os.path.exists(self.socket_path)):
+            if (self.__is_socket_in_use()):
+                print('ERROR: Another daemon is already listening on', self.socket_path, file=sys.stderr)
+                return False
+            # left behind by a daemon that was killed
+            os.unlink(self.socket_path)
+        self.unix_server = socketserver.ThreadingUnixStreamServer(self.socket_path, self.__create_handler_class())
+        self.unix_server.daemon_threads = True
+        os.chmod(self.socket_path, 0o600)
+        print('Serving models', self.model_registry.names(), 'on', self.socket_path, file=sys.stderr)
+        try:
+            self.unix_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.unix_server.server_close()
+            os.unlink(self.socket_path)
+            with self.__lock:
+                micro_batchers = list(self.micro_batchers.values())
+            for micro_batcher in micro_batchers:
+                micro_batcher.stop()
+        return True
+
+    def shutdown(self):
+        """
+        Stops serve_forever() (from another thread).
+        """
+        self.unix_server.shutdown()
+
+    def __is_socket_in_use(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            return True
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+        finally:
+            sock.close()
+
+    def handle_request(self, request):
+        """
+        Answers one request.
+        
+        Args:
+            request: The decoded request message.
+
+        Returns:
+            response: The response message.
+        """
+        if (not isinstance(request, dict)):
+            return {'error': 'request must be an object'}
+        if (request.get('command') == 'models'):
+            return {'models': self.model_registry.names(), 'registry': self.model_registry.stats()}
+        model_name = request.get('model', DEFAULT_MODEL_NAME)
+        if (model_name not in self.model_registry.model_specs):
+            return {'error': 'unknown model "%s"' % model_name}
+        if ('session' in request):
+            return self.__handle_session_request(request, model_name)
+        texts = request.get('texts')
+        n_highest_probs = request.get('top', 1)
+        if (not isinstance(texts, list) or not all([isinstance(text, str) for text in texts])
+            or not isinstance(n_highest_probs, int) or n_highest_probs < 1):
+            return {'error': 'texts must be a list of strings and top a positive integer'}
+        future = self.__get_micro_batcher(model_name).submit(texts, n_highest_probs)
+        if (future is None):
+            return {'error': 'queue full'}
+        try:
+            lang_predictions = future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+        except TimeoutError:
+            return {'error': 'classification timed out'}
+        except Exception as e:
+            return {'error': 'classification failed: %s' % e}
+        return {'predictions': [[[lang, prob] for lang, prob in lang_prediction] for lang_prediction in lang_predictions]}
+
+    def __handle_session_request(self, request, model_name):
+        """
+        Answers one session request (the GRU steps of a session run in the connection's thread, without batching).
+        """
+        incremental_classifier = self.__get_incremental_classifier(model_name)
+        if (incremental_classifier is None):
+            return {'error': 'model "%s" could not be loaded' % model_name}
+        session_id = (model_name, str(request['session']))
+        if (request.get('end')):
+            incremental_classifier.end(session_id)
+            return {'predictions': []}
+        n_highest_probs = request.get('top', 1)
+        if (not isinstance(n_highest_probs, int) or n_highest_probs < 1):
+            return {'error': 'top must be a positive integer'}
+        try:
+            if (isinstance(request.get('append'), str)):
+                lang_prediction = incremental_classifier.append(session_id, request['append'], n_highest_probs)
+            elif (isinstance(request.get('text'), str)):
+                lang_prediction = incremental_classifier.update(session_id, request['text'], n_highest_probs)
+            else:
+                return {'error': 'a session request needs "append", "text" or "end"'}
+        except Exception as e:
+            return {'error': 'classification failed: %s' % e}
+        return {'predictions': [[lang, prob] for lang, prob in lang_prediction]}
+
+    def __get_micro_batcher(self, model_name):
+        """
+        Returns:
+            The MicroBatcher of a model (created and started on first use).
+        """
+        with self.__lock:
+            if (model_name not in self.micro_batchers):
+                micro_batcher = MicroBatcher.MicroBatcher(lambda: self.model_registry.get(model_name),
+                                                          max_batch_size=self.system_param_dict['service_max_batch_size'],
+                                                          max_wait_ms=self.system_param_dict['service_max_wait_ms'],
+                                                          max_queue_size=self.system_param_dict['service_max_queue_size'],
+                                                          num_workers=self.system_param_dict['num_service_workers'])
+                micro_batcher.start()
+                self.micro_batchers[model_name] = micro_batcher
+            return self.micro_batchers[model_name]
+
+    def __get_incremental_classifier(self, model_name):
+        """
+        Returns:
+            The IncrementalClassifier of the current model of a name ('None' if the model can not be loaded).
+        """
+        language_identifier = self.model_registry.get(model_name)
+        if (language_identifier is None):
+            return None
+        with self.__lock:
+            current = self.incremental_classifiers.get(model_name)
+            if (current is None or current[0] is not language_identifier):
+                current = (language_identifier, IncrementalClassifier.IncrementalClassifier(self.system_param_dict, language_identifier))
+                # a model released meanwhile is not kept alive (its release callback waits for the daemon lock)
+                if (self.model_registry.is_current(model_name, language_identifier)):
+                    self.incremental_classifiers[model_name] = current
+            return current[1]
+
+    def __release_incremental_classifier(self, model_name, language_identifier):
+        """
+        Drops the IncrementalClassifier (and its sessions) of an evicted or replaced model.
+        """
+        with self.__lock:
+            current = self.incremental_classifiers.get(model_name)
+            if (current is not None and current[0] is language_identifier):
+                del self.incremental_classifiers[model_name]
+
+    def __create_handler_class(self):
+        """
+        Returns:
+            The request handler class bound to this daemon.
+        """
+        daemon = self
+        
+        class ClassifierRequestHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                connection = FramedConnection.FramedConnection(self.request)
+                try:
+                    request = connection.receive()
+                    while (request is not None):
+                        connection.send(daemon.handle_request(request))
+                        request = connection.receive()
+                except (ValueError, ConnectionError) as e:
+                    # malformed frame or client gone; the connection is dropped
+                    try:
+                        connection.send({'error': 'invalid frame: %s' % e})
+                    except OSError:
+                        pass
+        
+        return ClassifierRequestHandler
\ No newline at end of file
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import argparse
+import socket
+import sys
+from service import FramedConnection
+
+
+# number of texts sent in one request, so neither side holds all of stdin in memory
+TEXTS_PER_REQUEST = 1000
+
+
+class DaemonClient(object):
+    """Thin client of the ClassifierDaemon.
+    
+    Imports only the standard library (no torch), so a call costs the Python startup and one round trip per
+    TEXTS_PER_REQUEST texts instead of loading a model.
+    """
+    
+    def __init__(self, socket_path):
+        """
+        Args:
+            socket_path: Path of the Unix domain socket the daemon listens on.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(socket_path)
+        self.connection = FramedConnection.FramedConnection(sock)
+
+    def classify(self, texts, n_highest_probs=1, model_name=None):
+        """
+        Args:
+            texts: List of texts.
+            n_highest_probs: Number of most probable languages returned for each text.
+            model_name: Name of the daemon's model ('None' for the default model).
+
+        Returns:
+            List of the n most probable [language_tag, probability] pairs for each text.
+
+        Raises:
+            RuntimeError: If the daemon answers with an error.
+        """
+        request = {'texts': texts, 'top': n_highest_probs}
+        if (model_name is not None):
+            request['model'] = model_name
+        self.connection.send(request)
+        response = self.connection.receive()
+        if (response is None):
+            raise RuntimeError('daemon closed the connection')
+        if ('error' in response):
+            raise RuntimeError(response['error'])
+        return response['predictions']
+
+    def models(self):
+        """
+        Returns:
+            The names of the models of the daemon.
+        """
+        self.connection.send({'command': 'models'})
+        return self.connection.receive()['models']
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    """
+    Classifies the lines of stdin with a running daemon and prints 'lang prob<TAB>...<TAB>text' per line.
+    Run from the src directory: python -m service.DaemonClient --socket /tmp/nnlangid.sock < texts.txt
+    """
+    parser = argparse.ArgumentParser(description='Classify the lines of stdin with a running classifier daemon.')
+    parser.add_argument('--socket', default='/tmp/nnlangid.sock', help='socket path of the daemon (daemon_socket_path)')
+    parser.add_argument('--model', default=None, help='name of the model (default model of the daemon if not given)')
+    parser.add_argument('--top', type=int, default=1, help='number of most probable languages printed per text')
+    args = parser.parse_args(argv)
+    try:
+        daemon_client = DaemonClient(args.socket)
+    except OSError as e:
+        print('ERROR: Can not connect to the daemon on %s: %s' % (args.socket, e), file=sys.stderr)
+        return 1
+    
+    def classify_and_print(texts):
+        lang_predictions = daemon_client.classify(texts, args.top, args.model)
+        for text, text_predictions in zip(texts, lang_predictions):
+            sys.stdout.write('\t'.join(['%s %.4f' % (lang, prob) for lang, prob in text_predictions] + [text]) + '\n')
+    
+    try:
+        texts = []
+        for line in sys.stdin:
+            texts.append(line.rstrip('\n'))
+            if (len(texts) == TEXTS_PER_REQUEST):
+                classify_and_print(texts)
+                texts = []
+        if (texts != []):
+            classify_and_print(texts)
+    except RuntimeError as e:
+        print('ERROR: %s' % e, file=sys.stderr)
+        return 1
+    finally:
+        daemon_client.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import json
+import struct
+
+
+# big-endian length of the JSON payload in front of every frame
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+class FramedConnection(object):
+    """Class for exchanging JSON messages over a stream socket.
+    
+    Every message is sent as one frame: a 4 byte big-endian payload length followed by the compact UTF-8 JSON payload.
+    Only the standard library is imported, so clients start without torch.
+    """
+    
+    def __init__(self, sock):
+        """
+        Args:
+            sock: Connected stream socket.
+        """
+        self.sock = sock
+
+    def send(self, message):
+        """
+        Sends one message.
+        
+        Args:
+            message: JSON-serializable object.
+        """
+        payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+        self.sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+    def receive(self):
+        """
+        Receives one message.
+        
+        Returns:
+            message: The decoded object, or 'None' if the peer closed the connection between two frames.
+        """
+        header = self.__receive_exactly(FRAME_HEADER.size)
+        if (header is None):
+            return None
+        payload_length = FRAME_HEADER.unpack(header)[0]
+        if (payload_length > MAX_FRAME_BYTES):
+            raise ValueError('frame of %d bytes exceeds the maximum of %d bytes' % (payload_length, MAX_FRAME_BYTES))
+        payload = self.__receive_exactly(payload_length)
+        if (payload is None):
+            raise ConnectionError('connection closed within a frame')
+        return json.loads(payload.decode('utf-8'))
+
+    def close(self):
+        self.sock.close()
+
+    def __receive_exactly(self, num_bytes):
+        """
+        Returns:
+            The next num_bytes bytes, or 'None' if the connection is closed before the first byte.
+        """
+        chunks = []
+        num_received = 0
+        while (num_received < num_bytes):
+            chunk = self.sock.recv(min(num_bytes - num_received, 1024 * 1024))
+            if (not chunk):
+                if (num_received == 0):
+                    return None
+                raise ConnectionError('connection closed within a frame')
+            chunks.append(chunk)
+            num_received += len(chunk)
+        return b''.join(chunks)
\ No newline at end of file
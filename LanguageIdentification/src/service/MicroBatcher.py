@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher(object):
+    """Class for classifying the texts of concurrent requests together in one batched forward pass.
+    
+    Requests are put into a queue. A worker thread takes the oldest request and keeps adding queued requests to its
+    batch until the batch holds max_batch_size texts or max_wait_ms have passed since the oldest request was queued,
+    and then classifies the whole batch with one LanguageIdentifier.classify call. A request is never split, so a
+    single request with more than max_batch_size texts forms a batch of its own. A request whose texts do not fit
+    into the max_queue_size queued texts is rejected, so an overloaded service answers immediately instead of building
+    up latency; a request with more than max_queue_size texts is accepted if the queue is empty.
+    """
+    
+    def __init__(self, language_identifier, max_batch_size, max_wait_ms, max_queue_size, num_workers=1):
+        """
+        Args:
+            language_identifier: LanguageIdentifier used for the classification (shared by all worker threads),
+                or a function returning the one to use for each batch (e.g. a ModelRegistry lookup, so a swapped
+                model is used from the next batch on and an evicted one is not kept alive by the batcher).
+            max_batch_size: Maximum number of texts classified in one batch.
+            max_wait_ms: Maximum time in milliseconds a request waits for further requests to fill its batch.
+            max_queue_size: Maximum number of queued texts; further requests are rejected.
+            num_workers: Number of worker threads classifying batches concurrently.
+        """
+        self.language_identifier = language_identifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.num_workers = num_workers
+        self.__queue = collections.deque()
+        self.__num_queued_texts = 0
+        self.__condition = threading.Condition()
+        self.__is_stopped = False
+        self.__threads = []
+        self.num_batches = 0
+        self.num_batched_texts = 0
+
+    def start(self):
+        """
+        Starts the worker threads.
+        """
+        for worker_i in range(self.num_workers):
+            thread = threading.Thread(target=self.__run, name='MicroBatcher-%d' % worker_i)
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        """
+        Stops the worker threads after the queued requests are classified.
+        """
+        with self.__condition:
+            self.__is_stopped = True
+            self.__condition.notify_all()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def submit(self, texts, n_highest_probs=1):
+        """
+        Queues the texts of one request.
+        
+        Args:
+            texts: List of texts.
+            n_highest_probs: Number of most probable languages returned for each text.
+
+        Returns:
+            future: Future of the list of the n most probable (language_tag, probability) pairs for each text
+                ('None' if the queue is full or the batcher is stopped; a request larger than max_queue_size
+                is accepted if the queue is empty).
+        """
+        future = Future()
+        if (texts == []):
+            future.set_result([])
+            return future
+        with self.__condition:
+            if (self.__is_stopped):
+                return None
+            # a request with more than max_queue_size texts is only taken into an empty queue, so it is not rejected forever
+            if (self.__num_queued_texts > 0 and self.__num_queued_texts + len(texts) > self.max_queue_size):
+                return None
+            self.__queue.append((time.time(), texts, n_highest_probs, future))
+            self.__num_queued_texts += len(texts)
+            self.__condition.notify()
+        return future
+
+    def num_queued_texts(self):
+        """
+        Returns:
+            Number of texts waiting for a worker thread.
+        """
+        with self.__condition:
+            return self.__num_queued_texts
+
+    def __take_batch(self):
+        """
+        Waits for requests and takes a batch of them from the queue.
+        
+        Returns:
+            requests: List of (texts, n_highest_probs, future), or 'None' if the batcher is stopped and the queue is empty.
+        """
+        with self.__condition:
+            while (not self.__queue and not self.__is_stopped):
+                self.__condition.wait()
+            if (not self.__queue):
+                return None
+            # wait for the batch to fill up until the oldest request has waited max_wait_ms
+            while (self.__num_queued_texts < self.max_batch_size and not self.__is_stopped):
+                remaining = self.__queue[0][0] + self.max_wait - time.time()
+                if (remaining <= 0):
+                    break
+                self.__condition.wait(remaining)
+                # another worker thread may have taken the requests in the meantime
+                if (not self.__queue):
+                    return []
+            requests = []
+            num_texts = 0
+            while (self.__queue and (requests == [] or num_texts + len(self.__queue[0][1]) <= self.max_batch_size)):
+                _, texts, n_highest_probs, future = self.__queue.popleft()
+                requests.append((texts, n_highest_probs, future))
+                num_texts += len(texts)
+            self.__num_queued_texts -= num_texts
+            return requests
+
+    def __run(self):
+        """
+        Loop of one worker thread.
+        """
+        requests = self.__take_batch()
+        while (requests is not None):
+            if (requests != []):
+                self.__classify_batch(requests)
+            requests = self.__take_batch()
+
+    def __classify_batch(self, requests):
+        """
+        Classifies the texts of all requests in one call and resolves their futures.
+        
+        Args:
+            requests: List of (texts, n_highest_probs, future).
+        """
+        texts = []
+        for request_texts, _, _ in requests:
+            texts += request_texts
+        try:
+            language_identifier = self.language_identifier
+            if (callable(language_identifier)):
+                language_identifier = language_identifier()
+            if (language_identifier is None):
+                raise RuntimeError('model could not be loaded')
+            lang_predictions = language_identifier.classify(texts, max([n_highest_probs for _, n_highest_probs, _ in requests]))
+        except Exception as e:
+            for _, _, future in requests:
+                future.set_exception(e)
+            return
+        with self.__condition:
+            self.num_batches += 1
+            self.num_batched_texts += len(texts)
+        offset = 0
+        for request_texts, n_highest_probs, future in requests:
+            future.set_result([lang_prediction[:n_highest_probs] for lang_prediction in lang_predictions[offset:offset + len(request_texts)]])
+            offset += len(request_texts)
\ No newline at end of file
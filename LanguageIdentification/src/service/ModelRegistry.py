@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+#    MIT License
+#    
+#    Copyright (c) 2018 Alexander Heilig, Dominik Sauter, Tabea Kiupel
+#    
+#    Permission is hereby granted, free of charge, to any person obtaining a copy
+#    of this software and associated documentation files (the "Software"), to deal
+#    in the Software without restriction, including without limitation the rights
+#    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#    copies of the Software, and to permit persons to whom the Software is
+#    furnished to do so, subject to the following conditions:
+#    
+#    The above copyright notice and this permission notice shall be included in all
+#    copies or substantial portions of the Software.
+#    
+#    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#    SOFTWARE.
+
+
+
+import collections
+import copy
+import os
+import sys
+import threading
+import time
+import torch
+from input import InputData
+from evaluation import LanguageIdentifier
+
+
+class ModelRegistry(object):
+    """Class for serving several models from one process, loaded on first use.
+    
+    A model is specified as an inference artifact path or as a dict {"checkpoint": path, "embed_weights": path}.
+    Models of checkpoints with the same embedding weights file share one embedding. If the loaded models (and shared
+    embeddings) take more than registry_memory_budget_mb, the least recently used models are evicted; they are loaded
+    again on their next use. The model files are checked for changes at most every registry_check_interval_seconds;
+    a changed model is loaded in the background of the requesting thread while the old one keeps serving, and is then
+    swapped in atomically. Requests already holding the old model finish with it, it is freed afterwards.
+    The optional release callback is called with the name and the LanguageIdentifier of every evicted or replaced
+    model, so holders of objects built on a model (e.g. an IncrementalClassifier) can drop them.
+    Files should be replaced atomically (written to a temporary file and renamed, as the artifact export does);
+    a file that can not be loaded keeps the old model in service and is tried again at the next check.
+    """
+    
+    def __init__(self, system_param_dict, model_specs, prediction_cache=None, on_release=None):
+        """
+        Args:
+            system_param_dict: Dict containing the system parameters.
+            model_specs: Dict {name: inference artifact path or {"checkpoint": path, "embed_weights": path}}.
+            prediction_cache: If not 'None', the PredictionCache shared by all models.
+            on_release: If not 'None', function(name, language_identifier) called (without the registry lock held)
+                for every model that is evicted or replaced by a changed version.
+        """
+        self.system_param_dict = system_param_dict
+        self.model_specs = {}
+        for name, model_spec in model_specs.items():
+            if (isinstance(model_spec, dict)):
+                self.model_specs[name] = {'checkpoint': model_spec['checkpoint'], 'embed_weights': model_spec['embed_weights']}
+            else:
+                self.model_specs[name] = {'artifact': model_spec}
+        self.prediction_cache = prediction_cache
+        self.on_release = on_release
+        budget_mb = system_param_dict['registry_memory_budget_mb']
+        self.memory_budget = budget_mb * 1024 * 1024 if budget_mb is not None else float('inf')
+        self.check_interval = system_param_dict['registry_check_interval_seconds']
+        self.input_data = InputData.InputData()
+        self.__entries = collections.OrderedDict()     # name: loaded model, in least recently used order
+        self.__shared_embeds = {}                       # embedding key: shared embedding and the names of its models
+        self.__lock = threading.Lock()
+        self.__load_locks = {name: threading.Lock() for name in self.model_specs}
+        self.num_loads = 0
+        self.num_evictions = 0
+        self.num_swaps = 0
+
+    @staticmethod
+    def default_model_spec(system_param_dict):
+        """
+        Returns:
+            The spec of the trained model used by the terminal (the artifact if trained_inference_artifact_rel_path is set).
+        """
+        if (system_param_dict['trained_inference_artifact_rel_path'] is not None):
+            return system_param_dict['trained_inference_artifact_rel_path']
+        return {'checkpoint': system_param_dict['trained_model_checkpoint_rel_path'],
+                'embed_weights': system_param_dict['trained_embed_weights_rel_path']}
+
+    def names(self):
+        return sorted(self.model_specs.keys())
+
+    def get(self, name):
+        """
+        Returns the model, loading it on first use and swapping it if its files changed.
+        
+        Args:
+            name: Name of the model.
+
+        Returns:
+            language_identifier: The LanguageIdentifier of the model ('None' for an unknown name or if it can not be loaded).
+        """
+        if (name not in self.model_specs):
+            return None
+        with self.__lock:
+            entry = self.__entries.get(name)
+            is_check_due = False
+            if (entry is not None):
+                self.__entries.move_to_end(name)
+                now = time.time()
+                is_check_due = now - entry['last_check'] >= self.check_interval
+                if (is_check_due):
+                    entry['last_check'] = now
+        if (entry is not None):
+            if (not is_check_due or self.__file_stamp(name) == entry['file_stamp']):
+                return entry['language_identifier']
+            # another thread is already loading the changed files, the old model keeps serving meanwhile
+            if (not self.__load_locks[name].acquire(blocking=False)):
+                return entry['language_identifier']
+            try:
+                print('Model files of', name, 'changed, reloading', file=sys.stderr)
+                new_entry = self.__load(name)
+                if (new_entry is None):
+                    return entry['language_identifier']
+                self.__insert(name, new_entry)
+                return new_entry['language_identifier']
+            finally:
+                self.__load_locks[name].release()
+        
+        with self.__load_locks[name]:
+            # loaded by another thread while this one waited for the lock
+            with self.__lock:
+                entry = self.__entries.get(name)
+            if (entry is not None):
+                return entry['language_identifier']
+            new_entry = self.__load(name)
+            if (new_entry is None):
+                return None
+            self.__insert(name, new_entry)
+            return new_entry['language_identifier']
+
+    def is_current(self, name, language_identifier):
+        """
+        Returns:
+            True if the LanguageIdentifier is the currently loaded model of the name (not evicted or replaced).
+        """
+        with self.__lock:
+            entry = self.__entries.get(name)
+            return entry is not None and entry['language_identifier'] is language_identifier
+
+    def stats(self):
+        """
+        Returns:
+            Dict with the loaded models, their estimated memory and the numbers of loads, evictions and swaps.
+        """
+        with self.__lock:
+            return {'loaded_models': list(self.__entries.keys()),
+                    'memory_mb': self.__num_bytes() / (1024 * 1024),
+                    'loads': self.num_loads, 'evictions': self.num_evictions, 'swaps': self.num_swaps}
+
+    def __file_stamp(self, name):
+        """
+        Returns:
+            The modification times and sizes of the files of a model ('None' if a file is missing).
+        """
+        try:
+            return tuple([(os.path.getmtime(rel_path), os.path.getsize(rel_path)) for rel_path in sorted(self.model_specs[name].values())])
+        except OSError:
+            return None
+
+    def __load(self, name):
+        """
+        Loads a model (without holding the registry lock, so the other models keep serving).
+        
+        Returns:
+            entry: Dict of the loaded model, or 'None' if it can not be loaded.
+        """
+        model_spec = self.model_specs[name]
+        file_stamp = self.__file_stamp(name)
+        embed_key = None
+        try:
+            if ('artifact' in model_spec):
+                language_identifier = LanguageIdentifier.LanguageIdentifier(copy.deepcopy(self.system_param_dict),
+                                                                            artifact_rel_path=model_spec['artifact'],
+                                                                            prediction_cache=self.prediction_cache)
+            else:
+                embed_key = (os.path.abspath(model_spec['embed_weights']), os.path.getmtime(model_spec['embed_weights']))
+                with self.__lock:
+                    shared_embed = self.__shared_embeds.get(embed_key)
+                if (shared_embed is None):
+                    embed_and_num_classes = self.input_data.create_embed_from_weights_file(model_spec['embed_weights'])
+                else:
+                    embed_and_num_classes = shared_embed['embed_and_num_classes']
+                language_identifier = LanguageIdentifier.LanguageIdentifier(copy.deepcopy(self.system_param_dict),
+                                                                            model_checkpoint_rel_path=model_spec['checkpoint'],
+                                                                            embed_weights_rel_path=model_spec['embed_weights'],
+                                                                            embed_and_num_classes=embed_and_num_classes,
+                                                                            prediction_cache=self.prediction_cache)
+        except Exception as e:
+            print('ERROR: Model', name, 'could not be loaded:', e, file=sys.stderr)
+            return None
+        entry = {'language_identifier': language_identifier,
+                 'file_stamp': file_stamp,
+                 'last_check': time.time(),
+                 'embed_key': embed_key,
+                 'num_bytes': self.__estimate_num_bytes(language_identifier, with_embed=embed_key is None)}
+        if (embed_key is not None):
+            entry['embed_and_num_classes'] = embed_and_num_classes
+        return entry
+
+    def __insert(self, name, entry):
+        """
+        Puts a loaded model into the registry (replacing its old version) and evicts the least recently used
+        models while the memory budget is exceeded (the inserted model is never evicted).
+        The release callback is called for the replaced and evicted models after the registry lock is released.
+        """
+        released = []
+        with self.__lock:
+            self.num_loads += 1
+            old_entry = self.__entries.pop(name, None)
+            if (old_entry is not None):
+                self.__release_embed(name, old_entry)
+                released.append((name, old_entry['language_identifier']))
+                self.num_swaps += 1
+            embed_key = entry['embed_key']
+            if (embed_key is not None):
+                if (embed_key not in self.__shared_embeds):
+                    embed = entry['embed_and_num_classes'][0]
+                    self.__shared_embeds[embed_key] = {'embed_and_num_classes': entry['embed_and_num_classes'],
+                                                       'num_bytes': embed.weight.numel() * embed.weight.element_size(),
+                                                       'names': set()}
+                self.__shared_embeds[embed_key]['names'].add(name)
+            self.__entries[name] = entry
+            while (self.__num_bytes() > self.memory_budget and len(self.__entries) > 1):
+                evicted_name, evicted_entry = self.__entries.popitem(last=False)
+                self.__release_embed(evicted_name, evicted_entry)
+                released.append((evicted_name, evicted_entry['language_identifier']))
+                self.num_evictions += 1
+                print('Model', evicted_name, 'evicted', file=sys.stderr)
+        if (self.on_release is not None):
+            for released_name, language_identifier in released:
+                self.on_release(released_name, language_identifier)
+
+    def __release_embed(self, name, entry):
+        """
+        Removes a model from the users of its shared embedding, which is dropped without users (registry lock held).
+        """
+        embed_key = entry['embed_key']
+        if (embed_key is None or embed_key not in self.__shared_embeds):
+            return
+        shared_embed = self.__shared_embeds[embed_key]
+        shared_embed['names'].discard(name)
+        if (not shared_embed['names']):
+            del self.__shared_embeds[embed_key]
+
+    def __num_bytes(self):
+        """
+        Returns:
+            The estimated memory of the loaded models and shared embeddings (registry lock held).
+        """
+        return (sum([entry['num_bytes'] for entry in self.__entries.values()])
+                + sum([shared_embed['num_bytes'] for shared_embed in self.__shared_embeds.values()]))
+
+    def __estimate_num_bytes(self, language_identifier, with_embed):
+        """
+        Returns:
+            The memory of the tensors of a model (and of its own embedding).
+        """
+        tensors = [tensor for tensor in language_identifier.model.state_dict().values() if torch.is_tensor(tensor)]
+        if (with_embed):
+            tensors.append(language_identifier.embed.weight.data)
+        return sum([tensor.numel() * tensor.element_size() for tensor in tensors])
\ No newline at end of file